@@ -0,0 +1,67 @@
+"""Compare the etree and lxml backends of the Python XML converter.
+
+The test SPL sample is scaled up by repeating its product section and
+ingredients, then every field map from the XML tests is timed on both
+backends.
+
+    python benchmarks/bench_xml_backends.py --sections 200 --ingredients 20
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from jsonifyer.converter.python_converter import get_extraction_plan
+from corpus import scale_sample
+
+FIELD_MAP = {
+    'id': './/id/@root',
+    'code_code': './/code/@code',
+    'code_codeSystem': './/code/@codeSystem',
+    'code_displayName': './/formCode/@displayName',
+    'organization': './/author/assignedEntity/representedOrganization/name',
+    'name': './/component/structuredBody/component/section/subject/manufacturedProduct/manufacturedProduct/name',
+    'effectiveTime': './/effectiveTime/@value',
+    'ingredient_name': './/component/structuredBody/component/section/subject/manufacturedProduct/manufacturedProduct/ingredient/ingredientSubstance/name'
+}
+
+
+def time_backend(xml_file, backend, repeat):
+    plan = get_extraction_plan(field_map=FIELD_MAP, root_tag='document', backend=backend)
+    result = plan.run(xml_file)
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        plan.run(xml_file)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sections', type=int, default=200)
+    parser.add_argument('--ingredients', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        xml_file = os.path.join(temp_dir, 'scaled.xml')
+        with open(xml_file, 'w', encoding='utf-8') as f:
+            f.write(scale_sample(args.sections, args.ingredients))
+        size = os.path.getsize(xml_file)
+
+        etree_time, etree_result = time_backend(xml_file, 'etree', args.repeat)
+        lxml_time, lxml_result = time_backend(xml_file, 'lxml', args.repeat)
+
+    print(f"Document size: {size / 1024:.0f} KiB")
+    print(f"etree: {etree_time * 1000:.1f} ms")
+    print(f"lxml:  {lxml_time * 1000:.1f} ms")
+    print(f"Speedup: {etree_time / lxml_time:.2f}x")
+    print(f"Same results: {etree_result == lxml_result}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Compare the old and the block-wise XML loading of the XSLT converter.
+
+The test SPL sample is scaled up and given the FDA stylesheet processing
+instruction, like real labels. The old loader read the file into a str,
+removed the instruction with str.replace, encoded the text again and parsed
+it with etree.fromstring; parse_xml_file feeds the file to a per-thread
+parser in blocks. Both are timed, and their peak of Python allocations is
+measured with tracemalloc (the parsed tree itself is held by libxml2 and is
+the same for both).
+
+    python benchmarks/bench_xslt_loading.py --sections 200 --ingredients 50
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from lxml import etree
+from jsonifyer.converter.xslt_converter import FDA_STYLESHEET_PI, get_transform, parse_xml_file
+from corpus import INPUT_DIR, scale_sample
+
+XSLT_PATH = os.path.join(INPUT_DIR, 'sample_transform.xsl')
+
+
+def legacy_parse(xml_file):
+    # The loader used before parse_xml_file
+    parser = etree.XMLParser(load_dtd=False, no_network=True, resolve_entities=False)
+    with open(xml_file, 'r', encoding='utf-8') as f:
+        xml_content = f.read()
+    xml_content = xml_content.replace(FDA_STYLESHEET_PI.decode('ascii'), '')
+    return etree.fromstring(xml_content.encode('utf-8'), parser)
+
+
+def measure(load, xml_file, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        load(xml_file)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        root = load(xml_file)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best, peak, root
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sections', type=int, default=200)
+    parser.add_argument('--ingredients', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        xml_file = os.path.join(temp_dir, 'label.xml')
+        declaration, body = scale_sample(args.sections, args.ingredients).split('\n', 1)
+        with open(xml_file, 'w', encoding='utf-8') as f:
+            f.write(f"{declaration}\n{FDA_STYLESHEET_PI.decode('ascii')}\n{body}")
+        size = os.path.getsize(xml_file)
+
+        legacy_time, legacy_peak, legacy_root = measure(legacy_parse, xml_file, args.repeat)
+        block_time, block_peak, block_root = measure(parse_xml_file, xml_file, args.repeat)
+        transform = get_transform(XSLT_PATH)
+        same = str(transform(legacy_root)) == str(transform(block_root))
+
+    print(f"Document size: {size / 2 ** 20:.1f} MiB")
+    print(f"{'':<10}{'time':>10}{'peak':>12}")
+    print(f"{'legacy':<10}{legacy_time * 1000:>8.1f} ms{legacy_peak / 2 ** 20:>8.1f} MiB")
+    print(f"{'blocks':<10}{block_time * 1000:>8.1f} ms{block_peak / 2 ** 20:>8.1f} MiB")
+    print(f"Same transform output: {same}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""Synthetic corpora for the benchmarks, built from the test samples.
+
+SPL labels are the test label with its ingredient list and product section
+repeated, and a distinct id and product name per label. CSV and TXT tables
+repeat the sample rows with varied values and extra numeric and text columns.
+
+    python benchmarks/corpus.py /tmp/corpus --labels 100 --rows 100000
+"""
+import argparse
+import os
+
+INPUT_DIR = os.path.join(os.path.dirname(__file__), '..', 'test', 'input')
+SAMPLE_XML = os.path.join(INPUT_DIR, 'sample_data.xml')
+SAMPLE_CSV = os.path.join(INPUT_DIR, 'sample_data.csv')
+
+
+def scale_sample(sections, ingredients):
+    # Repeat the ingredient list and the product section of the sample label
+    with open(SAMPLE_XML, 'r', encoding='utf-8') as f:
+        content = f.read()
+    head, rest = content.split('<ingredient classCode="ACTIB">', 1)
+    ingredient_block, tail = rest.split('</manufacturedProduct>', 1)
+    ingredient_block = '<ingredient classCode="ACTIB">' + ingredient_block
+    scaled = head + ''.join(
+        ingredient_block.replace('<name>LACTOSE</name>', f'<name>EXCIPIENT {i}</name>')
+        for i in range(ingredients)
+    ) + '</manufacturedProduct>' + tail
+
+    start = scaled.index('<component>', scaled.index('<structuredBody>'))
+    end = scaled.index('</structuredBody>')
+    section = scaled[start:end]
+    return scaled[:start] + section * sections + scaled[end:]
+
+
+def spl_label(number, sections=1, ingredients=1, template=None):
+    # One label with its own id and product name
+    if template is None:
+        template = scale_sample(sections, ingredients)
+    return (
+        template
+        .replace('test-123-456-789', f'label-{number:08d}')
+        .replace('<name>TestMed</name>', f'<name>Product {number}</name>')
+    )
+
+
+def write_xml_corpus(directory, labels, sections=1, ingredients=1):
+    # Write labels as label_NNNNNN.xml files; returns the paths
+    os.makedirs(directory, exist_ok=True)
+    template = scale_sample(sections, ingredients)
+    paths = []
+    for number in range(labels):
+        path = os.path.join(directory, f'label_{number:06d}.xml')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(spl_label(number, template=template))
+        paths.append(path)
+    return paths
+
+
+def table_rows(rows, extra_columns=0, delimiter=','):
+    # Header and data lines of a table based on the sample CSV
+    with open(SAMPLE_CSV, 'r', encoding='utf-8') as f:
+        header, *samples = f.read().splitlines()
+    columns = header.split(',') + [f'Extra{i}' for i in range(extra_columns)]
+    yield delimiter.join(columns)
+    for number in range(rows):
+        name, age, city, occupation, skills = samples[number % len(samples)].split(',', 4)
+        if delimiter != ',':
+            # Only the CSV sample needs its Skills column quoted
+            skills = skills.strip('"')
+        values = [f'{name} {number}', str(int(age) + number % 40), city, occupation, skills]
+        values.extend(str(number * (i + 1)) if i % 2 else f'value {number % 97}' for i in range(extra_columns))
+        yield delimiter.join(values)
+
+
+def write_table(path, rows, extra_columns=0, delimiter=','):
+    # Write a CSV (or, with delimiter='~', a TXT) table; returns the path
+    with open(path, 'w', encoding='utf-8') as f:
+        for line in table_rows(rows, extra_columns, delimiter):
+            f.write(line + '\n')
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('directory')
+    parser.add_argument('--labels', type=int, default=100)
+    parser.add_argument('--sections', type=int, default=1)
+    parser.add_argument('--ingredients', type=int, default=1)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--columns', type=int, default=0, help='extra table columns')
+    args = parser.parse_args()
+
+    write_xml_corpus(os.path.join(args.directory, 'xml'), args.labels, args.sections, args.ingredients)
+    write_table(os.path.join(args.directory, 'table.csv'), args.rows, args.columns)
+    write_table(os.path.join(args.directory, 'table.txt'), args.rows, args.columns, delimiter='~')
+
+
+if __name__ == '__main__':
+    main()
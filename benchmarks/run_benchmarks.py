@@ -0,0 +1,201 @@
+"""Time every converter path on a synthetic corpus and store the results.
+
+Each case converts the whole corpus through the public API into a fresh
+output directory. The best wall time of --repeat runs gives the throughput;
+one extra run under tracemalloc gives the peak of Python allocations (memory
+held by lxml or the pandas parser itself is not counted). Results are written
+as JSON, and --compare reports the change against an earlier results file.
+
+    python benchmarks/run_benchmarks.py --labels 200 --rows 50000 -o results.json
+    python benchmarks/run_benchmarks.py --compare results.json
+"""
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from jsonifyer import __version__, convert_csv, convert_txt, convert_xml
+from corpus import INPUT_DIR, write_table, write_xml_corpus
+
+XSLT_PATH = os.path.join(INPUT_DIR, 'sample_transform.xsl')
+
+NAMESPACES = {'ns': 'urn:hl7-org:v3'}
+
+FIELDS = ['id', 'title', 'effectiveTime']
+
+FIELD_MAP = {
+    'id': './/id/@root',
+    'code_code': './/code/@code',
+    'code_displayName': './/formCode/@displayName',
+    'organization': './/author/assignedEntity/representedOrganization/name',
+    'name': './/component/structuredBody/component/section/subject/manufacturedProduct/manufacturedProduct/name',
+    'effectiveTime': './/effectiveTime/@value',
+    'ingredient_name': './/component/structuredBody/component/section/subject/manufacturedProduct/manufacturedProduct/ingredient/ingredientSubstance/name'
+}
+
+TABLE_FIELDS = ['Name', 'City', 'Skills']
+
+
+def xml_case(**options):
+    def run(corpus, output_dir, workers):
+        convert_xml(directory_path=corpus['xml'], output_path=output_dir, workers=workers, **options)
+    return run
+
+
+def table_case(convert, kind, **options):
+    def run(corpus, output_dir, workers):
+        convert(file_path=corpus[kind], output_path=output_dir, **options)
+    return run
+
+
+# name -> (input kind, runner)
+CASES = {
+    'xml_python_full': ('xml', xml_case(root_tag='document')),
+    'xml_python_fields': ('xml', xml_case(fields=FIELDS, namespaces=NAMESPACES, root_tag='document')),
+    'xml_python_field_map': ('xml', xml_case(field_map=FIELD_MAP, root_tag='document')),
+    'xml_python_field_map_lxml': ('xml', xml_case(field_map=FIELD_MAP, root_tag='document', backend='lxml')),
+    'xml_xslt': ('xml', xml_case(converter='xslt', xslt_path=XSLT_PATH)),
+    'csv': ('csv', table_case(convert_csv, 'csv')),
+    'csv_fields': ('csv', table_case(convert_csv, 'csv', fields=TABLE_FIELDS)),
+    'csv_ndjson': ('csv', table_case(convert_csv, 'csv', output_format='ndjson')),
+    'txt': ('txt', table_case(convert_txt, 'txt')),
+}
+
+
+def build_corpus(directory, args):
+    xml_dir = os.path.join(directory, 'xml')
+    write_xml_corpus(xml_dir, args.labels, args.sections, args.ingredients)
+    return {
+        'xml': xml_dir,
+        'csv': write_table(os.path.join(directory, 'table.csv'), args.rows, args.columns),
+        'txt': write_table(os.path.join(directory, 'table.txt'), args.rows, args.columns, delimiter='~'),
+    }
+
+
+def input_size(path):
+    # Bytes and items (files or table rows) of a case's input
+    if os.path.isdir(path):
+        files = [os.path.join(path, name) for name in os.listdir(path)]
+        return sum(os.path.getsize(name) for name in files), len(files)
+    with open(path, 'rb') as f:
+        rows = sum(1 for _ in f) - 1
+    return os.path.getsize(path), rows
+
+
+def run_once(run, corpus, work_dir, workers):
+    output_dir = os.path.join(work_dir, 'output')
+    shutil.rmtree(output_dir, ignore_errors=True)
+    # Keep any converter output out of the report
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        run(corpus, output_dir, workers)
+        return time.perf_counter() - start
+
+
+def measure(name, corpus, work_dir, args):
+    kind, run = CASES[name]
+    size, items = input_size(corpus[kind])
+    times = [run_once(run, corpus, work_dir, args.workers) for _ in range(args.repeat)]
+
+    tracemalloc.start()
+    try:
+        run_once(run, corpus, work_dir, args.workers)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    best = min(times)
+    return {
+        'name': name,
+        'input': kind,
+        'input_bytes': size,
+        'items': items,
+        'seconds': best,
+        'seconds_all': times,
+        'items_per_second': items / best,
+        'mib_per_second': size / best / 2 ** 20,
+        'peak_python_bytes': peak,
+    }
+
+
+def compare(results, baseline, threshold):
+    # Print the change of each case against a baseline; returns the names of
+    # cases that got slower by more than threshold
+    previous = {result['name']: result for result in baseline['results']}
+    slower = []
+    print(f"{'case':<28}{'before':>10}{'after':>10}{'change':>9}")
+    for result in results:
+        before = previous.get(result['name'])
+        if before is None:
+            continue
+        change = result['seconds'] / before['seconds'] - 1
+        print(f"{result['name']:<28}{before['seconds']:>10.3f}{result['seconds']:>10.3f}{change:>+9.1%}")
+        if change > threshold:
+            slower.append(result['name'])
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--labels', type=int, default=200, help='number of SPL label files')
+    parser.add_argument('--sections', type=int, default=1, help='product sections per label')
+    parser.add_argument('--ingredients', type=int, default=5, help='ingredient lists per product')
+    parser.add_argument('--rows', type=int, default=20000, help='CSV/TXT rows')
+    parser.add_argument('--columns', type=int, default=5, help='extra CSV/TXT columns')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes for XML cases')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--cases', nargs='+', choices=sorted(CASES), default=list(CASES))
+    parser.add_argument('-o', '--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='fail when a case is slower than the baseline by more than this fraction')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        corpus = build_corpus(os.path.join(work_dir, 'corpus'), args)
+        for name in args.cases:
+            result = measure(name, corpus, work_dir, args)
+            results.append(result)
+            print(
+                f"{name:<28}{result['seconds']:>9.3f} s{result['items_per_second']:>12.0f} items/s"
+                f"{result['mib_per_second']:>9.1f} MiB/s{result['peak_python_bytes'] / 2 ** 20:>9.1f} MiB peak"
+            )
+
+    report = {
+        'jsonifyer': __version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'parameters': {
+            name: getattr(args, name)
+            for name in ('labels', 'sections', 'ingredients', 'rows', 'columns', 'workers', 'repeat')
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=4)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('parameters') != report['parameters']:
+            print("Warning: the baseline was measured with different parameters")
+        slower = compare(results, baseline, args.threshold)
+        if slower:
+            print(f"Slower than the baseline: {', '.join(slower)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -9,11 +9,19 @@ Currently supported formats:
 - XML files (with Python or XSLT conversion)
 """
 
-from .api import (
-    convert_csv,
-    convert_xml,
-    convert_txt
-)
-
 __version__ = '0.1.7'
 __all__ = ['convert_csv', 'convert_xml', 'convert_txt']
+
+
+def __getattr__(name):
+    # The conversion functions are loaded from .api on first access
+    if name in __all__:
+        from . import api
+        value = getattr(api, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,10 +1,125 @@
-from typing import Any, Dict, List, Optional, Union
-import json
+from typing import Any, Callable, Dict, List, Optional, Union
 import os
+import json
+from collections import deque
+from functools import partial
+from itertools import islice
 from pathlib import Path
-from .converter.csv_converter import convert_file_to_json as convert_csv_file
-from .converter.python_converter import parse_xml_to_json as convert_xml_python
-from .converter.xslt_converter import apply_xslt_to_xml as convert_xml_xslt
+from .cache import ConversionCache, file_digest, output_fingerprints, outputs_unchanged
+from .dedup import dedup_session, defer_until_written
+from .sinks import open_sink, completion_message
+from .stats import ConversionStats
+
+# The converters are imported by the functions that use them, so importing the
+# package stays cheap and XML conversions never load pandas
+
+def _convert_xml_file(file_path, converter, plan=None, xslt=None, passthrough=False, validate_output=False,
+                      thread_transform=False, stream=False):
+    # Convert a single XML file; module level so it can run in worker processes.
+    # Returns the result and the time spent in each stage. With passthrough
+    # the result is the raw XSLT output (bytes), or None when it failed. With
+    # thread_transform each thread applies its own copy of the transform. With
+    # stream the result is a DocumentJSON, written to JSON without a dict.
+    timings = {}
+    if converter == 'python':
+        if stream:
+            return plan.run_document(file_path, timings), timings
+        from .converter.python_converter import parse_xml_to_json as convert_xml_python
+        return convert_xml_python(file_path, plan=plan, timings=timings), timings
+    elif converter == 'xslt':
+        if not xslt:
+            raise ValueError("XSLT converter requires an XSLT file path")
+        if thread_transform:
+            from .converter.xslt_converter import get_thread_transform
+            try:
+                xslt = get_thread_transform(xslt)
+            except Exception:
+                pass
+        if passthrough:
+            from .converter.xslt_converter import apply_xslt_raw
+            return apply_xslt_raw(file_path, xslt, timings=timings, validate=validate_output), timings
+        from .converter.xslt_converter import apply_xslt_to_xml as convert_xml_xslt
+        return convert_xml_xslt(file_path, None, xslt, timings=timings), timings
+    else:
+        raise ValueError(f"Unsupported XML converter: {converter}")
+
+def _add_file_timings(stats, file_path, timings):
+    if stats is not None:
+        stats.add_timings(timings)
+        stats.add_input_time(Path(file_path).name, sum(timings.values()))
+
+def _iter_thread_results(xml_files, convert_one, threads, stats=None):
+    # Yield (file_path, [result]) pairs in the order of xml_files, converted
+    # by a thread pool with a few files per thread in flight
+    from concurrent.futures import ThreadPoolExecutor
+    files = iter(xml_files)
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        pending = deque(
+            (file_path, executor.submit(convert_one, file_path))
+            for file_path in islice(files, threads * 4)
+        )
+        while pending:
+            file_path, future = pending.popleft()
+            for next_path in islice(files, 1):
+                pending.append((next_path, executor.submit(convert_one, next_path)))
+            result, timings = future.result()
+            _add_file_timings(stats, file_path, timings)
+            yield file_path, [result]
+
+def _iter_xml_results(xml_files, convert_one, workers=None, chunksize=None, stats=None, threads=None):
+    # Yield (file_path, [result]) pairs in the order of xml_files
+    if threads and threads > 1 and len(xml_files) > 1:
+        yield from _iter_thread_results(xml_files, convert_one, threads, stats)
+        return
+    if not workers or workers <= 1 or len(xml_files) <= 1:
+        for file_path in xml_files:
+            result, timings = convert_one(file_path)
+            _add_file_timings(stats, file_path, timings)
+            yield file_path, [result]
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+    if not chunksize:
+        # A few chunks per worker balances the load without flooding the pool
+        chunksize = max(1, min(64, len(xml_files) // (workers * 4)))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(convert_one, xml_files, chunksize=chunksize)
+        for file_path, (result, timings) in zip(xml_files, results):
+            _add_file_timings(stats, file_path, timings)
+            yield file_path, [result]
+
+def _iter_file_records(file_path, record_tag, plan, stats=None):
+    from .converter.python_converter import iter_xml_records
+    timings = {}
+    yield from iter_xml_records(file_path, record_tag, plan=plan, timings=timings)
+    _add_file_timings(stats, file_path, timings)
+
+def _iter_xml_record_results(xml_files, record_tag, plan, stats=None):
+    # Yield (file_path, records) pairs; the records of each file are streamed
+    for file_path in xml_files:
+        yield file_path, _iter_file_records(file_path, record_tag, plan, stats)
+
+def _xml_cache_config(converter, xslt_path, fields, namespaces, root_tag, field_map, extra_fields, pairs, record_tag,
+                      passthrough=False, validate_output=False):
+    # Settings that determine the converted documents, or None when they
+    # cannot be fingerprinted (such as an already compiled stylesheet)
+    config = {"converter": converter, "record_tag": record_tag}
+    if passthrough:
+        config.update(passthrough=True, validate_output=validate_output)
+    if converter == 'python':
+        config.update(
+            fields=fields,
+            namespaces=namespaces,
+            root_tag=root_tag,
+            field_map=field_map,
+            extra_fields=extra_fields,
+            pairs=pairs,
+        )
+    elif isinstance(xslt_path, (str, os.PathLike)) and os.path.isfile(xslt_path):
+        config["xslt"] = file_digest(xslt_path)
+    else:
+        return None
+    return config
 
 def convert_xml(
     directory_path: str,
@@ -19,79 +134,234 @@ def convert_xml(
     field_map: Optional[Dict[str, str]] = None,
     extra_fields: Optional[Dict[str, str]] = None,
     pairs: Optional[Dict[str, str]] = None,
+    workers: Optional[int] = None,
+    chunksize: Optional[int] = None,
+    record_tag: Optional[str] = None,
+    backend: str = "etree",
+    dedup_backend: str = "sqlite",
+    output_format: str = "files",
+    max_records_per_shard: Optional[int] = None,
+    max_bytes_per_shard: Optional[int] = None,
+    indent: Optional[int] = 4,
+    json_backend: str = "auto",
+    cache_dir: Optional[str] = None,
+    writer_queue_size: Optional[int] = None,
+    progress: Optional[Callable[[ConversionStats], None]] = None,
+    verbose: bool = False,
+    passthrough: bool = False,
+    validate_output: bool = False,
+    threads: Optional[int] = None,
     **kwargs
 ):
     # Validate input directory exists
     if not os.path.exists(directory_path):
         raise FileNotFoundError(f"Input directory not found: {directory_path}")
 
-    # Load previously processed IDs to avoid duplicates
-    dumped_ids = set()
-    if repeated_path and os.path.exists(repeated_path):
-        with open(repeated_path, "r", encoding="utf-8") as f:
-            dumped_ids = set(line.strip() for line in f if line.strip())
+    # Streaming mode splits each file into records with the Python converter
+    if record_tag and converter != 'python':
+        raise ValueError("record_tag streaming requires the python converter")
+    if record_tag and workers and workers > 1:
+        raise ValueError("record_tag streaming does not support workers")
+    # Pass-through writes the XSLT output as it is, for stylesheets that emit JSON
+    if passthrough and converter != 'xslt':
+        raise ValueError("passthrough requires the xslt converter")
+    # Threads only help the XSLT converter, whose transforms release the GIL
+    threaded = bool(threads and threads > 1)
+    if threaded and converter != 'xslt':
+        raise ValueError("threads requires the xslt converter")
+    if threaded and workers and workers > 1:
+        raise ValueError("threads and workers cannot be combined")
 
-    file_count = 0
-    new_ids = []
     result = None
-    
-    # Process each XML file in the directory
-    for file_name in os.listdir(directory_path):
-        if file_name.lower().endswith('.xml'):
-            file_path = os.path.join(directory_path, file_name)
-
-            # Convert XML using selected converter
-            if converter == 'python':
-                result = convert_xml_python(
-                    file_path,
-                    repeated_path,
-                    fields=fields,
-                    namespaces=namespaces,
-                    root_tag=root_tag,
-                    field_map=field_map,
-                    extra_fields=extra_fields,
-                    pairs=pairs,
-                )
-            elif converter == 'xslt':
-                if not xslt_path:
-                    raise ValueError("XSLT converter requires an XSLT file path")
-                result = convert_xml_xslt(file_path, repeated_path, xslt_path)
-            else:
-                raise ValueError(f"Unsupported XML converter: {converter}")
-            
-            print(result)
-            
-            # Handle duplicate checking if repeated_item is specified
-            if repeated_path and repeated_item and result[repeated_item] is not None:
-                unique_attr = result[repeated_item]
-                # Extract name from list of dictionaries or single dictionary
-                if isinstance(unique_attr, list) and len(unique_attr) > 0 and isinstance(unique_attr[0], dict):
-                    unique_attr = unique_attr[0].get('name', '')
-                elif isinstance(unique_attr, dict) and 'name' in unique_attr:
-                    unique_attr = unique_attr['name']
-                
-                if unique_attr in dumped_ids or unique_attr in new_ids:
-                    continue
-                
-            # Save converted JSON if output path is specified
-            if output_path:
-                output_dir = Path(output_path)
-                output_dir.mkdir(parents=True, exist_ok=True)
-                output_file = output_dir / f"{Path(file_path).stem}.json"
-                with open(output_file, 'w', encoding='utf-8') as f:
-                    json.dump(result, f, indent=4, ensure_ascii=False)            
-                file_count += 1
-
-                if repeated_path:
-                    new_ids.append(str(unique_attr))
-                
-    # Update processed IDs file
-    if new_ids and repeated_path:
-        with open(repeated_path, 'a', encoding='utf-8') as f:
-            for new_id in new_ids:
-                f.write(f"{new_id}\n")
-
-    return {"message": f"Conversion completed: {file_count} files created in {output_path}"}
+    parallel = bool(workers and workers > 1)
+
+    # Compile the field specifications once for the whole directory
+    plan = None
+    xslt = xslt_path
+    if converter == 'python':
+        from .converter.python_converter import get_extraction_plan
+        plan = get_extraction_plan(
+            field_map=field_map,
+            fields=fields,
+            namespaces=namespaces,
+            root_tag=root_tag,
+            extra_fields=extra_fields,
+            pairs=pairs,
+            backend=backend,
+        )
+    elif converter == 'xslt' and xslt_path:
+        if parallel:
+            # Compiled transforms cannot be pickled; each worker process caches its own
+            if not isinstance(xslt_path, (str, os.PathLike)):
+                raise ValueError("Parallel XSLT conversion requires an XSLT file path")
+        else:
+            # Compile the stylesheet once; on failure each file reports it as before
+            from .converter.xslt_converter import get_transform
+            try:
+                xslt = get_transform(xslt_path)
+            except Exception:
+                pass
+
+    # Whole documents written to per-document files are streamed from their
+    # element tree to JSON, unless the converted dicts are needed (dedup, the
+    # cache, verbose output) or would be sent back from worker processes
+    stream = bool(
+        plan is not None and plan.whole_document and output_path and output_format == 'files'
+        and not record_tag and not parallel and not cache_dir and not verbose
+        and not (repeated_path and repeated_item)
+    )
+
+    # Files are handled in directory listing order, so dedup keeps the first
+    # occurrence in the same order whether or not workers are used
+    xml_files = [
+        os.path.join(directory_path, file_name)
+        for file_name in os.listdir(directory_path)
+        if file_name.lower().endswith('.xml')
+    ]
+    # Counts and timings of the run; the number of records per file is not known
+    stats = ConversionStats(total=None if record_tag else len(xml_files))
+    if record_tag:
+        convert_files = partial(_iter_xml_record_results, record_tag=record_tag, plan=plan, stats=stats)
+    else:
+        convert_one = partial(
+            _convert_xml_file, converter=converter, plan=plan, xslt=xslt,
+            passthrough=passthrough, validate_output=validate_output, thread_transform=threaded, stream=stream
+        )
+        convert_files = partial(
+            _iter_xml_results, convert_one=convert_one, workers=workers, chunksize=chunksize, stats=stats, threads=threads
+        )
+
+    # With a cache directory, files converted before with the same settings
+    # are read back from the cache instead of being parsed again
+    cache = None
+    if cache_dir:
+        config = _xml_cache_config(
+            converter, xslt_path, fields, namespaces, root_tag, field_map, extra_fields, pairs, record_tag,
+            passthrough, validate_output
+        )
+        if config is not None:
+            cache = ConversionCache(str(cache_dir), config)
+    results = cache.cached_results(xml_files, convert_files) if cache else convert_files(xml_files)
+
+    # Converted documents go to the output sink when an output path is given
+    sink = None
+    if output_path:
+        sink = open_sink(
+            output_format,
+            str(output_path),
+            max_records=max_records_per_shard,
+            max_bytes=max_bytes_per_shard,
+            prefix="documents",
+            indent=indent,
+            json_backend=json_backend,
+            writer_queue_size=writer_queue_size,
+        )
+
+    # Previously processed IDs are kept in a dedup store to avoid duplicates.
+    # Ids are only stored once their documents are written, so documents lost
+    # to a failed write are converted again by the next run.
+    with dedup_session(repeated_path, backend=dedup_backend) as store:
+        dedup = defer_until_written(store, sink)
+        try:
+            # Process each XML file (or record) in the directory
+            for file_path, file_results in results:
+                stem = Path(file_path).stem
+                stats.bytes_in += os.path.getsize(file_path)
+                for record_number, result in enumerate(file_results, start=1):
+                    output_name = f"{stem}_{record_number}" if record_tag else stem
+                    stats.seen += 1
+                    raw = None
+                    if passthrough:
+                        # Raw output is only parsed when dedup needs a field;
+                        # failed documents are handled as {} like parsed ones
+                        raw, result = result, {}
+                        if raw is not None and dedup is not None and repeated_item:
+                            try:
+                                result = json.loads(raw)
+                            except ValueError:
+                                pass
+                    if result or raw is not None:
+                        stats.converted += 1
+                    else:
+                        stats.failed += 1
+                    if verbose:
+                        print(raw.decode('utf-8', 'replace') if raw is not None else result)
+
+                    # Handle duplicate checking if repeated_item is specified
+                    unique_attr = None
+                    duplicate = False
+                    if dedup is not None and repeated_item and result[repeated_item] is not None:
+                        unique_attr = result[repeated_item]
+                        # Extract name from list of dictionaries or single dictionary
+                        if isinstance(unique_attr, list) and len(unique_attr) > 0 and isinstance(unique_attr[0], dict):
+                            unique_attr = unique_attr[0].get('name', '')
+                        elif isinstance(unique_attr, dict) and 'name' in unique_attr:
+                            unique_attr = unique_attr['name']
+                        unique_attr = str(unique_attr)
+                        duplicate = unique_attr in dedup
+
+                    if duplicate:
+                        stats.duplicates += 1
+                    elif sink is not None:
+                        # Save converted JSON if output path is specified
+                        if raw is not None:
+                            sink.write_raw(output_name, raw)
+                        elif stream:
+                            sink.write_chunks(output_name, result.iter_json(indent))
+                        else:
+                            sink.write(output_name, result)
+                        stats.written += 1
+
+                        if unique_attr is not None:
+                            dedup.add(unique_attr)
+
+                    if progress is not None:
+                        progress(stats)
+        finally:
+            if cache is not None:
+                cache.close()
+            if sink is not None:
+                try:
+                    sink.close()
+                finally:
+                    if dedup is not None:
+                        dedup.flush()
+                stats.add_timings(sink.seconds)
+                stats.bytes_out += sink.bytes_written
+            stats.finish()
+
+    response = {"message": completion_message(stats.written, output_path, output_format), "stats": stats}
+    if cache is not None:
+        response["cache"] = cache.report()
+    return response
+
+def _convert_table_file(file_path, repeated_path, repeated_item, output_dir, cache_dir=None, **options):
+    # Convert a CSV or TXT file. With a cache directory the conversion is
+    # skipped when the same contents were already converted with the same
+    # settings into the same output directory, and the files written then are
+    # all still there unchanged. Returns the message and the cache report
+    # (None without a cache).
+    from .converter.csv_converter import convert_file_to_json as convert_csv_file
+    if not cache_dir:
+        return convert_csv_file(file_path, repeated_path, repeated_item, output_dir, **options), None
+
+    # These options do not change what is written
+    ignored = ("chunksize", "workers", "dedup_backend", "writer_queue_size", "stats", "progress")
+    config = {name: value for name, value in options.items() if name not in ignored}
+    config.update(
+        output_dir=os.path.abspath(output_dir),
+        repeated_path=os.path.abspath(repeated_path) if repeated_path else None,
+        repeated_item=repeated_item,
+    )
+    with ConversionCache(str(cache_dir), config) as cache:
+        key = cache.key(file_path)
+        if cache.lookup(key, valid=lambda entry: outputs_unchanged(entry.get("outputs"))) is not None:
+            message = f"Conversion skipped: {file_path} is unchanged since it was converted to {output_dir}"
+        else:
+            outputs = []
+            message = convert_csv_file(file_path, repeated_path, repeated_item, output_dir, outputs=outputs, **options)
+            cache.put(key, {"message": message, "outputs": output_fingerprints(outputs)})
+        return message, cache.report()
 
 def convert_csv(
     file_path: str,
@@ -101,6 +371,19 @@ def convert_csv(
     fields: Optional[List[str]] = None,
     delimiter: str = ",",
     skiprows: int = 0,
+    dedup_backend: str = "sqlite",
+    chunksize: Optional[int] = None,
+    output_format: str = "files",
+    max_records_per_shard: Optional[int] = None,
+    max_bytes_per_shard: Optional[int] = None,
+    indent: Optional[int] = 4,
+    json_backend: str = "auto",
+    dtypes: Optional[Dict[str, Any]] = None,
+    engine: str = "c",
+    cache_dir: Optional[str] = None,
+    writer_queue_size: Optional[int] = None,
+    progress: Optional[Callable[[ConversionStats], None]] = None,
+    verbose: bool = False,
 ):
     # Validate input file exists
     if not os.path.exists(file_path):
@@ -111,17 +394,36 @@ def convert_csv(
     os.makedirs(output_dir, exist_ok=True)
     
     # Convert CSV to JSON
-    result_msg = convert_csv_file(
+    stats = ConversionStats()
+    result_msg, cache_report = _convert_table_file(
         file_path,
         repeated_path,
         repeated_item,
         str(output_dir),
-        fields,
-        delimiter,
-        skiprows
+        cache_dir,
+        fields=fields,
+        delimiter=delimiter,
+        skiprows=skiprows,
+        dedup_backend=dedup_backend,
+        chunksize=chunksize,
+        output_format=output_format,
+        max_records_per_shard=max_records_per_shard,
+        max_bytes_per_shard=max_bytes_per_shard,
+        indent=indent,
+        json_backend=json_backend,
+        dtypes=dtypes,
+        engine=engine,
+        writer_queue_size=writer_queue_size,
+        stats=stats,
+        progress=progress,
     )
-    print(result_msg)
-    return {"message": result_msg}
+    stats.finish()
+    if verbose:
+        print(result_msg)
+    response = {"message": result_msg, "stats": stats}
+    if cache_report is not None:
+        response["cache"] = cache_report
+    return response
 
 def convert_txt(
     file_path: str,
@@ -130,7 +432,21 @@ def convert_txt(
     output_path: Optional[str] = None,
     fields: Optional[List[str]] = None,
     delimiter: str = "~",
-    skiprows: int = 0
+    skiprows: int = 0,
+    dedup_backend: str = "sqlite",
+    chunksize: Optional[int] = None,
+    output_format: str = "files",
+    max_records_per_shard: Optional[int] = None,
+    max_bytes_per_shard: Optional[int] = None,
+    indent: Optional[int] = 4,
+    json_backend: str = "auto",
+    dtypes: Optional[Dict[str, Any]] = None,
+    engine: str = "c",
+    cache_dir: Optional[str] = None,
+    writer_queue_size: Optional[int] = None,
+    progress: Optional[Callable[[ConversionStats], None]] = None,
+    verbose: bool = False,
+    workers: Optional[int] = None,
 ):
     # Validate input file exists
     if not os.path.exists(file_path):
@@ -141,14 +457,34 @@ def convert_txt(
     os.makedirs(output_dir, exist_ok=True)
     
     # Convert TXT to JSON using CSV converter with custom delimiter
-    result_msg = convert_csv_file(
+    stats = ConversionStats()
+    result_msg, cache_report = _convert_table_file(
         file_path,
         repeated_path,
         repeated_item,
         str(output_dir),
-        fields,
-        delimiter,
-        skiprows
+        cache_dir,
+        fields=fields,
+        delimiter=delimiter,
+        skiprows=skiprows,
+        dedup_backend=dedup_backend,
+        chunksize=chunksize,
+        output_format=output_format,
+        max_records_per_shard=max_records_per_shard,
+        max_bytes_per_shard=max_bytes_per_shard,
+        indent=indent,
+        json_backend=json_backend,
+        dtypes=dtypes,
+        engine=engine,
+        writer_queue_size=writer_queue_size,
+        stats=stats,
+        progress=progress,
+        workers=workers,
     )
-    print(result_msg)
-    return {"message": result_msg}
+    stats.finish()
+    if verbose:
+        print(result_msg)
+    response = {"message": result_msg, "stats": stats}
+    if cache_report is not None:
+        response["cache"] = cache_report
+    return response
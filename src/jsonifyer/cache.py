@@ -0,0 +1,176 @@
+import hashlib
+import json
+import os
+import sqlite3
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+# Bump when converter output changes, so older cache entries stop matching
+CACHE_VERSION = 1
+
+# Name of the cache database inside the cache directory
+CACHE_FILE_NAME = 'jsonifyer-cache.sqlite'
+
+# Block size used when hashing input files
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def file_digest(path) -> str:
+    # SHA-256 of the file contents
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def output_fingerprints(paths: Iterable[str]) -> List[List[Any]]:
+    # [path, size, mtime_ns] of each written output file
+    fingerprints = []
+    for path in paths:
+        stat = os.stat(path)
+        fingerprints.append([os.path.abspath(path), stat.st_size, stat.st_mtime_ns])
+    return fingerprints
+
+
+def outputs_unchanged(fingerprints: Optional[List[List[Any]]]) -> bool:
+    # Whether every output file recorded by output_fingerprints is still there
+    # with the same size and modification time
+    if fingerprints is None:
+        return False
+    for path, size, mtime_ns in fingerprints:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        if stat.st_size != size or stat.st_mtime_ns != mtime_ns:
+            return False
+    return True
+
+
+def config_digest(config: Dict[str, Any]) -> str:
+    # Stable hash of a conversion configuration made of JSON-like values
+    text = json.dumps([CACHE_VERSION, config], sort_keys=True, default=str)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class ConversionCache:
+    # Content-addressed cache of conversion results, kept in a SQLite file.
+    # Entries are keyed by the hash of an input file's contents together with
+    # the hash of the conversion configuration, so a renamed or touched but
+    # unchanged file still hits, and any change to the file or the settings
+    # misses. File hashes are remembered by path, size and modification time,
+    # so unchanged files are not read again to be hashed.
+
+    def __init__(self, cache_dir: str, config: Dict[str, Any]):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, CACHE_FILE_NAME)
+        self.config = config_digest(config)
+        self.hits = 0
+        self.misses = 0
+
+        self._conn = sqlite3.connect(self.path)
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS files "
+                "(path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, digest TEXT)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS results "
+                "(key TEXT, seq INTEGER, data TEXT, PRIMARY KEY (key, seq)) WITHOUT ROWID"
+            )
+
+    def digest(self, path) -> str:
+        # Content hash of a file, recomputed only when its size or mtime changed
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        row = self._conn.execute(
+            "SELECT digest FROM files WHERE path = ? AND size = ? AND mtime_ns = ?",
+            (path, stat.st_size, stat.st_mtime_ns)
+        ).fetchone()
+        if row:
+            return row[0]
+        digest = file_digest(path)
+        # Committed with the next entry written
+        self._conn.execute(
+            "INSERT OR REPLACE INTO files (path, size, mtime_ns, digest) VALUES (?, ?, ?, ?)",
+            (path, stat.st_size, stat.st_mtime_ns, digest)
+        )
+        return digest
+
+    def key(self, path) -> str:
+        return hashlib.sha256(f"{self.config}:{self.digest(path)}".encode('ascii')).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        # Value stored for key, or None
+        row = self._conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def lookup(self, key: str, valid: Optional[Callable[[Any], bool]] = None) -> Optional[Any]:
+        # Like get, counting the lookup as a hit or a miss. A value that valid
+        # rejects counts as a miss and gives None.
+        value = self.get(key)
+        if value is not None and valid is not None and not valid(value):
+            value = None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value) VALUES (?, ?)",
+                (key, json.dumps(value, ensure_ascii=False))
+            )
+
+    def load_results(self, key: str) -> Iterator[Any]:
+        # Results stored for key, in the order they were produced. Raw JSON
+        # results (bytes) are stored as blobs and come back as bytes.
+        rows = self._conn.execute("SELECT data FROM results WHERE key = ? ORDER BY seq", (key,))
+        for (data,) in rows:
+            yield data if isinstance(data, bytes) else json.loads(data)
+
+    def store_results(self, key: str, results: Iterable[Any]) -> Iterator[Any]:
+        # Pass results through while storing them. Rows are written in one
+        # transaction that is committed together with the entry, once the
+        # results were consumed to the end.
+        self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+        count = 0
+        for result in results:
+            data = result if isinstance(result, bytes) else json.dumps(result, ensure_ascii=False)
+            self._conn.execute("INSERT INTO results (key, seq, data) VALUES (?, ?, ?)", (key, count, data))
+            count += 1
+            yield result
+        self.put(key, {'results': count})
+
+    def cached_results(self, paths, convert) -> Iterator:
+        # Yield (path, results) for each path in order. Files with a complete
+        # entry are served from the cache; the others are passed, in order,
+        # to convert, which yields (path, results) for them.
+        keys = [self.key(path) for path in paths]
+        self._conn.commit()
+        hit = [self.lookup(key) is not None for key in keys]
+        converted = iter(convert([path for path, cached in zip(paths, hit) if not cached]))
+        for path, key, cached in zip(paths, keys, hit):
+            if cached:
+                yield path, self.load_results(key)
+            else:
+                _, results = next(converted)
+                yield path, self.store_results(key, results)
+
+    def report(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses}
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
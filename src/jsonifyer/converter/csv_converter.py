@@ -1,60 +1,358 @@
-import json
+import importlib.util
+import io
+import mmap
+import time
 import pandas as pd
 import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from ..dedup import dedup_session, defer_until_written
+from ..sinks import open_sink, completion_message
+from ..stats import ConversionStats, add_time
 
-def convert_file_to_json(input_file, repeated_path, repeated_item, output_directory, fields=None, delimiter=",", skiprows=0):
+# Parser engines accepted by convert_file_to_json. 'auto' uses pyarrow when it
+# is installed and the file is read in one go, and the C parser otherwise.
+CSV_ENGINES = ("auto", "c", "python", "pyarrow")
+
+# Target size of the byte ranges parsed by worker processes
+PARALLEL_RANGE_BYTES = 32 * 1024 * 1024
+
+def _column_kind(series):
+    # Coarse type of one column in one chunk, used to reconcile chunk dtypes
+    if series.isna().all():
+        return "empty"
+    if pd.api.types.is_bool_dtype(series):
+        return "boolean"
+    if pd.api.types.is_integer_dtype(series):
+        return "integer"
+    if pd.api.types.is_float_dtype(series):
+        return "floating"
+    if pd.api.types.infer_dtype(series, skipna=True) == "boolean":
+        return "boolean"
+    return "string"
+
+def _unify_dtypes(column_kinds):
+    # Chunks infer their dtypes independently. Work out the dtype a single
+    # read of the whole file would have given each column whose chunks disagree:
+    # returns dtypes to read with and columns to hold as objects after reading.
+    dtypes = {}
+    object_columns = []
+    for column, kinds in column_kinds.items():
+        seen = kinds - {"empty"}
+        if len(kinds) <= 1 or not seen:
+            continue
+        if seen <= {"integer", "floating"}:
+            # Integers next to floats or missing values become floats
+            if "integer" in seen:
+                dtypes[column] = "float64"
+        elif seen == {"boolean"}:
+            # Booleans with missing values are objects, not floats
+            object_columns.append(column)
+        elif seen != {"string"}:
+            # Numbers or booleans mixed with text are all kept as text
+            dtypes[column] = str
+    return dtypes, object_columns
+
+def _resolve_engine(engine, chunksize):
+    if engine not in CSV_ENGINES:
+        raise ValueError(f"Unsupported CSV engine: {engine}")
+    if engine == "auto":
+        return "pyarrow" if not chunksize and importlib.util.find_spec("pyarrow") else "c"
+    if engine == "pyarrow" and chunksize:
+        raise ValueError("The pyarrow engine cannot read a file in chunks")
+    return engine
+
+def _read_options(fields, delimiter, skiprows, dtypes, engine):
+    # Keyword arguments for read_csv. Only the requested fields are parsed.
+    options = dict(delimiter=delimiter, skiprows=skiprows, engine=engine)
+    if fields:
+        options["usecols"] = fields
+    if dtypes:
+        options["dtype"] = dtypes
+    return options
+
+def _project(df, fields):
+    # usecols keeps the file's column order; put the fields in the order asked for
+    if fields and list(df.columns) != list(fields):
+        df = df[fields]
+    return df
+
+def _clean_frame(df, columns=None):
+    # Clean data by removing empty columns and rows. Columns that are empty
+    # in the whole file can be found beforehand and passed in. The frame is
+    # only sliced when something is actually dropped.
+    present = df.notna()
+    if columns is None:
+        columns = df.columns[present.any()]
+    if len(columns) != len(df.columns):
+        df = df[columns]
+        present = present[columns]
+    rows = present.any(axis=1)
+    if not rows.all():
+        df = df[rows]
+    return df
+
+def _frame_records(df):
+    # Convert a cleaned frame to record dictionaries. NaN values become None
+    # for proper JSON serialization, only in the columns that have any.
+    names = list(df.columns)
+    columns = []
+    for position in range(len(names)):
+        series = df.iloc[:, position]
+        values = series.tolist()
+        if series.hasnans:
+            values = [None if missing else value for value, missing in zip(values, series.isna().tolist())]
+        columns.append(values)
+    return [dict(zip(names, row)) for row in zip(*columns)]
+
+def _read_frame(input_file, fields=None, delimiter=",", skiprows=0, dtypes=None, engine="c"):
+    # Read and clean a whole file in one go
+    df = pd.read_csv(input_file, **_read_options(fields, delimiter, skiprows, dtypes, engine))
+    return _clean_frame(_project(df, fields))
+
+def _chunk_kinds(chunk):
+    return [(column, _column_kind(chunk[column])) for column in chunk.columns]
+
+def _reconcile_chunks(chunk_kinds, dtypes=None):
+    # From the column kinds of every chunk, find the columns that hold any
+    # value and the dtypes that make each chunk read like the whole file.
+    # Only per-column summaries are kept, so memory stays bounded.
+    non_empty = {}
+    column_kinds = {}
+    for kinds in chunk_kinds:
+        for column, kind in kinds:
+            column_kinds.setdefault(column, set()).add(kind)
+            non_empty[column] = non_empty.get(column, False) or kind != "empty"
+    columns = [column for column, has_values in non_empty.items() if has_values]
+    # Columns with a dtype given by the caller already agree across chunks
+    given = set(dtypes or ())
+    unified, object_columns = _unify_dtypes(
+        {column: kinds for column, kinds in column_kinds.items() if column not in given}
+    )
+    return columns, {**unified, **(dtypes or {})} or None, object_columns
+
+def _finish_chunk(chunk, fields, columns, object_columns):
+    chunk = _project(chunk, fields)
+    for column in object_columns:
+        chunk[column] = chunk[column].astype(object)
+    return _clean_frame(chunk, columns)
+
+def _iter_chunked_frames(input_file, fields, delimiter, skiprows, chunksize, dtypes=None, engine="c"):
+    options = _read_options(fields, delimiter, skiprows, dtypes, engine)
+
+    # First pass: find the columns that hold any value and reconcile dtypes
+    columns, options["dtype"], object_columns = _reconcile_chunks(
+        (_chunk_kinds(_project(chunk, fields)) for chunk in pd.read_csv(input_file, chunksize=chunksize, **options)),
+        dtypes,
+    )
+
+    # Second pass: clean one chunk at a time
+    for chunk in pd.read_csv(input_file, chunksize=chunksize, **options):
+        yield _finish_chunk(chunk, fields, columns, object_columns)
+
+def _split_ranges(input_file, skiprows, parts, range_bytes):
+    # Return the header line and the (start, end) byte ranges of the data
+    # rows, split on line boundaries. Like read_csv, skiprows lines and then
+    # blank lines are skipped before the header. A quoted value spanning
+    # lines may be cut at a range boundary (see _iter_parallel_frames).
+    if os.path.getsize(input_file) == 0:
+        return None, []
+    with open(input_file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        size = len(mm)
+        position = 0
+        skipped = 0
+        while position < size:
+            end = mm.find(b"\n", position)
+            end = size if end == -1 else end + 1
+            line = mm[position:end]
+            position = end
+            if skipped < skiprows:
+                skipped += 1
+            elif line.strip(b"\r\n"):
+                header = line
+                break
+        else:
+            return None, []
+
+        parts = max(parts, -(-(size - position) // range_bytes))
+        step = max(1, (size - position) // parts)
+        ranges = []
+        while position < size:
+            end = mm.find(b"\n", min(position + step, size - 1))
+            end = size if end == -1 else end + 1
+            ranges.append((position, end))
+            position = end
+    if not header.endswith(b"\n"):
+        header += b"\n"
+    return header, ranges
+
+def _read_range(input_file, header, start, end, options):
+    # Parse the rows between two byte offsets, with the header line prepended
+    with open(input_file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        data = header + mm[start:end]
+    return pd.read_csv(io.BytesIO(data), **options)
+
+def _scan_range(input_file, header, start, end, options, fields):
+    return _chunk_kinds(_project(_read_range(input_file, header, start, end, options), fields))
+
+def _parse_range(input_file, header, start, end, options, fields, columns, object_columns):
+    return _finish_chunk(_read_range(input_file, header, start, end, options), fields, columns, object_columns)
+
+def _iter_parallel_frames(input_file, fields, delimiter, skiprows, workers, dtypes=None, engine="c"):
+    # Split the file into line-aligned byte ranges and parse them in worker
+    # processes, in the same two passes as chunked reading. Frames are yielded
+    # in file order, with a few ranges in flight per worker.
+    header, ranges = _split_ranges(input_file, skiprows, workers, PARALLEL_RANGE_BYTES)
+    if len(ranges) <= 1:
+        yield _read_frame(input_file, fields, delimiter, skiprows, dtypes, engine)
+        return
+
+    options = _read_options(fields, delimiter, 0, dtypes, engine)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # First pass: find the columns that hold any value and reconcile dtypes.
+        # A range cut inside a quoted value that spans lines ends inside it,
+        # which the parser rejects (pyarrow errors are ValueErrors); the file is
+        # then read in one go, which also reports errors of the file itself.
+        scans = [executor.submit(_scan_range, input_file, header, start, end, options, fields) for start, end in ranges]
+        try:
+            columns, options["dtype"], object_columns = _reconcile_chunks((scan.result() for scan in scans), dtypes)
+        except (pd.errors.ParserError, ValueError):
+            for scan in scans:
+                scan.cancel()
+            ranges = None
+
+        # Second pass: parse and clean the ranges, keeping their order
+        pending = deque()
+        for start, end in ranges or ():
+            pending.append(executor.submit(
+                _parse_range, input_file, header, start, end, options, fields, columns, object_columns
+            ))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    if ranges is None:
+        yield _read_frame(input_file, fields, delimiter, skiprows, dtypes, engine)
+
+def _timed(iterator, timings, stage):
+    # Yield from iterator, adding the time spent producing each item to timings
+    iterator = iter(iterator)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            add_time(timings, stage, time.perf_counter() - start)
+        yield item
+
+def _drop_processed_rows(df, repeated_item, dedup):
+    # Keep the rows whose repeated_item value is present, not yet in the dedup
+    # store and not seen earlier in this frame. Returns the kept rows and their ids.
+    if repeated_item not in df.columns:
+        return df.iloc[0:0], []
+    values = df[repeated_item]
+    present = values.notna()
+    if not present.all():
+        df = df[present]
+        values = values[present]
+    # Ids are compared as the text of the values the records hold
+    ids = values.astype(str)
+    known = dedup.contains_many(ids.unique())
+    keep = ~ids.duplicated(keep="first")
+    if known:
+        keep &= ~ids.isin(known)
+    if not keep.all():
+        df = df[keep]
+        ids = ids[keep]
+    return df, ids.tolist()
+
+def convert_file_to_json(input_file, repeated_path, repeated_item, output_directory, fields=None, delimiter=",", skiprows=0, dedup_backend="sqlite", chunksize=None,
+                         output_format="files", max_records_per_shard=None, max_bytes_per_shard=None, indent=4, json_backend="auto",
+                         dtypes=None, engine="c", writer_queue_size=None, stats=None, progress=None, workers=None, outputs=None):
+    # Counts and stage timings are added to stats when given; progress is
+    # called with the stats after each chunk of rows. With workers, byte
+    # ranges of the file are parsed in that many processes. The paths of the
+    # files written are appended to outputs when given.
+    engine = _resolve_engine(engine, chunksize)
+    parallel = bool(workers and workers > 1)
+    if parallel and chunksize:
+        raise ValueError("workers and chunksize cannot be combined")
+    if stats is None:
+        stats = ConversionStats()
     try:
         # Create output directory if it doesn't exist
         os.makedirs(output_directory, exist_ok=True)
+        stats.bytes_in += os.path.getsize(input_file)
 
-        # Load previously processed IDs to avoid duplicates
-        dumped_ids = set()
-        if repeated_path and os.path.exists(repeated_path):
-            with open(repeated_path, "r", encoding="utf-8") as f:
-                dumped_ids = set(line.strip() for line in f if line.strip())
-
-        # Read CSV file using pandas for efficient data handling
-        df = pd.read_csv(input_file, delimiter=delimiter, skiprows=skiprows)
-        
-        # Filter columns if specific fields are requested
-        if fields:
-            df = df[fields]
-        
-        # Clean data by removing empty rows and columns
-        df.dropna(axis=1, how="all", inplace=True)  # Remove columns that are all empty
-        df.dropna(how="all", inplace=True)  # Remove rows that are all empty
-        # Convert NaN values to None for proper JSON serialization
-        df = df.where(pd.notna(df), None)
-        
-        # Convert DataFrame to list of dictionaries for easier processing
-        data = df.to_dict(orient="records")
-        
-        # Process each record and create individual JSON files
+        if parallel:
+            # Parse line-aligned byte ranges of the file in worker processes
+            frames = _timed(_iter_parallel_frames(input_file, fields, delimiter, skiprows, workers, dtypes, engine), stats.seconds, "parse")
+        elif chunksize:
+            # Stream the file in chunks of rows to keep memory bounded
+            frames = _timed(_iter_chunked_frames(input_file, fields, delimiter, skiprows, chunksize, dtypes, engine), stats.seconds, "parse")
+        else:
+            # Read CSV file using pandas for efficient data handling
+            start = time.perf_counter()
+            frames = [_read_frame(input_file, fields, delimiter, skiprows, dtypes, engine)]
+            add_time(stats.seconds, "parse", time.perf_counter() - start)
+
+        # Process each record and hand it to the output sink
         file_count = 0
-        new_ids = []
-        for record in data:
-            # Skip records that have already been processed
-            if repeated_path and repeated_item:
-                unique_attr = record.get(repeated_item)
-                if unique_attr is None or str(unique_attr) in new_ids or str(unique_attr) in dumped_ids:
-                    continue
-
-            # Create JSON file for current record
-            output_file = os.path.join(output_directory, f"record_{file_count+1}.json")
-            with open(output_file, "w", encoding="utf-8") as json_file:
-                json.dump(record, json_file, indent=4, ensure_ascii=False)
-            file_count += 1
-
-            # Track processed IDs for duplicate prevention
-            if repeated_path:
-                new_ids.append(str(unique_attr))
-
-        # Update the file containing processed IDs
-        if new_ids and repeated_path:
-            with open(repeated_path, "a", encoding="utf-8") as f:
-                for new_id in new_ids:
-                    f.write(f"{new_id}\n")
-        
-        return f"Conversion completed: {file_count} files created in {output_directory}"
+        sink = open_sink(
+            output_format,
+            output_directory,
+            max_records=max_records_per_shard,
+            max_bytes=max_bytes_per_shard,
+            prefix="records",
+            indent=indent,
+            json_backend=json_backend,
+            writer_queue_size=writer_queue_size,
+        )
+        # Previously processed IDs are kept in a dedup store to avoid duplicates.
+        # Ids are only stored once their records are written, so records lost
+        # to a failed write are converted again by the next run.
+        try:
+            with dedup_session(repeated_path, backend=dedup_backend) as store:
+                dedup = defer_until_written(store, sink)
+                try:
+                    with sink:
+                        for df in frames:
+                            stats.seen += len(df)
+
+                            # Skip records that have already been processed, before any
+                            # record dictionaries are built
+                            new_ids = []
+                            if dedup is not None and repeated_item:
+                                rows = len(df)
+                                df, new_ids = _drop_processed_rows(df, repeated_item, dedup)
+                                stats.duplicates += rows - len(df)
+
+                            # Convert DataFrame to list of dictionaries and write each record
+                            start = time.perf_counter()
+                            records = _frame_records(df)
+                            add_time(stats.seconds, "extract", time.perf_counter() - start)
+                            stats.converted += len(records)
+                            for record in records:
+                                sink.write(f"record_{file_count+1}", record)
+                                file_count += 1
+                            stats.written += len(records)
+
+                            # Track processed IDs for duplicate prevention
+                            if new_ids:
+                                dedup.add_many(new_ids)
+                            if progress is not None:
+                                progress(stats)
+                finally:
+                    if dedup is not None:
+                        dedup.flush()
+        finally:
+            stats.add_timings(sink.seconds)
+            stats.bytes_out += sink.bytes_written
+
+        if outputs is not None:
+            outputs.extend(sink.paths)
+        return completion_message(file_count, output_directory, output_format)
     except Exception as e:
-        raise Exception(f"Error converting {input_file}: {str(e)}")
\ No newline at end of file
+        raise Exception(f"Error converting {input_file}: {str(e)}")
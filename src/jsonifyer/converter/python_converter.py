@@ -2,15 +2,30 @@ import os
 import json
 import csv
 import re
+import copy
 import logging
+import threading
+import time
 import xml.etree.ElementTree as ET
 from glob import glob
-from typing import Dict, List, Optional, Union, Any
+from typing import Dict, Iterator, List, Optional, Union, Any
+from collections import OrderedDict
 from pathlib import Path
-from .xslt_converter import apply_xslt_to_xml
+from ..serialization import DEFAULT_INDENT, get_serializer
+from ..stats import add_time
 
 logger = logging.getLogger(__name__)
 
+# lxml.etree, imported by load_lxml the first time the lxml backend is used
+lxml_etree = None
+
+def load_lxml():
+    global lxml_etree
+    if lxml_etree is None:
+        from lxml import etree
+        lxml_etree = etree
+    return lxml_etree
+
 def set_nested_value(d, keys, value):
     # Handles nested dictionary creation with array support
     # For keys ending with '[]', creates or appends to arrays
@@ -29,269 +44,1128 @@ def set_nested_value(d, keys, value):
     else:
         d[keys[-1]] = value
 
-def parse_xml_to_json(
-    xml_file: str,
-    repeated_file: str = None,
-    field_map: Optional[Dict[str, str]] = None,
-    fields: Optional[List[str]] = None,
-    namespaces: Optional[Dict[str, str]] = None,
-    root_tag: Optional[str] = None,
-    extra_fields: Optional[Dict[str, str]] = None,
-    pairs: Optional[Dict[str, str]] = None
-) -> Dict[str, Any]:
+NS_PREFIX = 'ns'
 
-    # Parse XML and get root element
-    tree = ET.parse(xml_file)
-    root = tree.getroot()
-    
-    # Extract default namespace from root tag if present
-    default_ns = root.tag.split('}')[0].strip('{') if '}' in root.tag else None
-    
-    ns_prefix = 'ns'
-    extra_ns = namespaces
-    if default_ns:
-        namespaces = {ns_prefix: default_ns}
-        
-    def add_prefix(xpath):
-        # Adds namespace prefix to XPath expressions when default namespace is present
-        if default_ns:
-            parts = xpath.split('/')
-            new_parts = []
-            for part in parts:
-                if part and not part.startswith('.') and not part.startswith('@') and ':' not in part:
-                    if part.startswith('*'):
-                        new_parts.append(part)
-                    else:
-                        new_parts.append(f'{ns_prefix}:{part}')
-                else:
-                    new_parts.append(part)
-            return '/'.join(new_parts)
-        return xpath
-    
-    # Handle custom root tag if specified
-    if root_tag:
-        root_local = root.tag.split('}')[-1] if '}' in root.tag else root.tag
-        if root_local.strip().lower() != root_tag.strip().lower():
-            if default_ns:
-                root = root.find(f'.//{{{default_ns}}}{root_tag.strip()}')
+# Parsing backends for the Python converter
+BACKENDS = ('etree', 'lxml')
+
+# Steps whose XPath is only used for its first match
+_FIRST_MATCH_STEPS = ('attr', 'field_attr', 'field_elem')
+
+_lxml_local = threading.local()
+
+# Pieces of JSON text joined into each chunk yielded by iter_element_json
+JSON_CHUNK_PIECES = 4096
+
+# Compiled plans are reused across calls with the same arguments
+_PLAN_CACHE_SIZE = 32
+_plan_cache = OrderedDict()
+
+
+def add_prefix(xpath, ns_prefix=NS_PREFIX):
+    # Adds namespace prefix to XPath expressions when default namespace is present
+    parts = xpath.split('/')
+    new_parts = []
+    for part in parts:
+        if part and not part.startswith('.') and not part.startswith('@') and ':' not in part:
+            if part.startswith('*'):
+                new_parts.append(part)
             else:
-                root = root.find(f'.//{root_tag.strip()}')
-            if root is None:
-                return {}
-    
-    def safe_find(element, xpath):
-        # Safely find elements using XPath with namespace support
-        try:
-            xpath = add_prefix(xpath)
-            if not xpath.startswith('.') and not xpath.startswith('/'):
-                xpath = './' + xpath
-            result = element.find(xpath, namespaces)
-            return result
-        except Exception as e:
+                new_parts.append(f'{ns_prefix}:{part}')
+        else:
+            new_parts.append(part)
+    return '/'.join(new_parts)
+
+
+def prepare_xpath(xpath, prefixed):
+    # Applies the namespace prefix and makes the path relative to the context element
+    if prefixed:
+        xpath = add_prefix(xpath)
+    if not xpath.startswith('.') and not xpath.startswith('/'):
+        xpath = './' + xpath
+    return xpath
+
+
+def split_attribute_path(xpath):
+    # Splits 'path/to/element/@attr' into the element path and the attribute name
+    base_path, attr = xpath.rsplit('@', 1)
+    return base_path.rstrip('/').strip(), attr.strip()
+
+
+def keeps_document_order(xpath):
+    # Whether ElementPath gives the matches of a prepared path in document
+    # order without repeats, as XPath does. ElementPath applies each step to
+    # every match of the previous one, so steps after a descendant step
+    # (b in './/a/b') give out of order or repeated matches when matches of
+    # that step are nested in each other (an a inside an a).
+    return '//' not in xpath or '/' not in xpath.split('//', 1)[1]
+
+
+def compile_lxml_xpath(xpath, namespaces, first=False):
+    # Precompile a prepared path for the lxml backend. Paths whose matches
+    # ElementPath may order differently (see keeps_document_order) have their
+    # order checked in each document (see OrderCheckedXPath). Absolute paths,
+    # ElementPath-only syntax and other paths of that kind stay strings and go
+    # through find/findall, which keeps their results identical to the etree
+    # backend. So do paths used for their first match: find stops there,
+    # while libxml2 selects every match before taking the first.
+    if xpath.startswith('/') or first:
+        return xpath
+    etree = load_lxml()
+    try:
+        if keeps_document_order(xpath):
+            return etree.XPath(xpath, namespaces=namespaces)
+        checked = order_checked_xpath(etree.XPath(xpath, namespaces=namespaces), xpath, namespaces, single=True)
+    except (etree.XPathError, TypeError, ValueError):
+        return xpath
+    return checked if checked is not None else xpath
+
+
+def lxml_parser():
+    # Parser for the lxml backend: same security settings as the XSLT converter,
+    # and comments and processing instructions dropped like ElementTree does.
+    # lxml parsers must not be shared between threads, so keep one per thread.
+    parser = getattr(_lxml_local, 'parser', None)
+    if parser is None:
+        parser = load_lxml().XMLParser(
+            load_dtd=False,
+            no_network=True,
+            resolve_entities=False,
+            remove_comments=True,
+            remove_pis=True,
+        )
+        _lxml_local.parser = parser
+    return parser
+
+
+def _select_all(element, xpath, namespaces):
+    # Evaluate a prepared path (string) or a precompiled lxml XPath
+    if isinstance(xpath, str):
+        return element.findall(xpath, namespaces)
+    found = xpath(element)
+    if not isinstance(found, list):
+        return []
+    return [el for el in found if isinstance(el, lxml_etree._Element)]
+
+
+def safe_find(element, xpath, namespaces):
+    # Safely find elements using a prepared XPath with namespace support
+    try:
+        if isinstance(xpath, str):
+            return element.find(xpath, namespaces)
+        found = _select_all(element, xpath, namespaces)
+        return found[0] if found else None
+    except Exception as e:
+        return None
+
+
+def _distinct_matches(lst):
+    # If all elements have same text, return single element
+    lst_to_compare = [el.text.strip() for el in lst]
+    if all(txt == lst_to_compare[0] for txt in lst_to_compare):
+        lst = lst[0]
+    else:
+        # Remove duplicates while preserving order
+        s = set()
+        lst_to_ret = []
+        for el in lst:
+            if el.text.strip() not in s:
+                s.add(el.text.strip())
+                lst_to_ret.append(el)
+        lst = lst_to_ret
+    return lst
+
+
+def safe_findall(element, xpath, namespaces):
+    # Find all matching elements and handle duplicates
+    try:
+        return _distinct_matches(_select_all(element, xpath, namespaces))
+    except Exception as e:
+        logger.debug(f"No distinct matches for {xpath}: {e}")
+        return []
+
+
+def select_steps(elements, steps):
+    # Lazily apply resolved child and descendant steps (see resolve_steps) to
+    # the given elements, one step at a time as ElementPath applies them
+    for descendant, tag in steps:
+        elements = _select_descendants(elements, tag) if descendant else _select_children(elements, tag)
+    return elements
+
+
+def _select_children(elements, tag):
+    for elem in elements:
+        for e in elem:
+            if e.tag == tag:
+                yield e
+
+
+def _select_descendants(elements, tag):
+    for elem in elements:
+        for e in elem.iter(tag):
+            if e is not elem:
+                yield e
+
+
+def compile_context_xpath(xpath, namespaces, first=False):
+    # Precompile a prepared path for the lxml backend to be evaluated from the
+    # elements bound to $context instead of the context element. XPath selects
+    # from all of them at once, in document order without duplicates.
+    etree = load_lxml()
+    xpath = '$context' + xpath[1:]
+    try:
+        return etree.XPath(f'({xpath})[1]' if first else xpath, namespaces=namespaces)
+    except (etree.XPathError, TypeError, ValueError):
+        return None
+
+
+class OrderCheckedXPath:
+    # A compiled lxml XPath for all matches of a plain path (see
+    # split_path_steps) that ElementPath may order differently, called like
+    # an etree.XPath. XPath gives the matches in document order; ElementPath
+    # gives the matches of each element the path's last steps are applied to
+    # in turn, which only differs when those elements nest (an a inside an a
+    # for './/a/b'). The order is checked in each document, and the matches
+    # are selected again step by step (see select_steps) when it differs.
+    # hops counts the steps from a match up to that element: the match of
+    # the single descendant step of a path evaluated from one element, or the
+    # context element of a path of child steps.
+
+    def __init__(self, xpath, steps, hops, child_steps, first=False):
+        self.xpath = xpath
+        self.steps = steps
+        self.hops = hops
+        self.child_steps = child_steps
+        self.first = first
+        # The context elements in document order without repeats
+        self._document_order = load_lxml().XPath('$context')
+
+    def __call__(self, element, **variables):
+        found = self.xpath(element, **variables)
+        contexts = variables.get('context', [element])
+        in_order = self._in_context_order if self.child_steps else self._in_descendant_order
+        if found and not in_order(found, contexts):
+            found = list(select_steps(contexts, self.steps))
+        return found[:1] if self.first else found
+
+    def _up(self, element):
+        for _ in range(self.hops):
+            element = element.getparent()
+        return element
+
+    def _in_context_order(self, found, contexts):
+        # The contexts of the matches follow the order of contexts, which
+        # must not repeat an element. That holds for contexts in document
+        # order that do not nest, without looking at the matches.
+        if len(contexts) == 1:
+            return True
+        ordered = self._document_order(contexts[0], context=contexts)
+        if len(ordered) == len(contexts) and all(a is b for a, b in zip(ordered, contexts)):
+            known = set(contexts)
+            if not any(ancestor in known for context in contexts for ancestor in context.iterancestors()):
+                return True
+        positions = {}
+        for position, context in enumerate(contexts):
+            positions.setdefault(context, position)
+        if len(positions) < len(contexts):
+            return False
+        last = 0
+        previous = None
+        for match in found:
+            context = self._up(match)
+            if context is not previous:
+                position = positions.get(context)
+                if position is None or position < last:
+                    return False
+                last = position
+                previous = context
+        return True
+
+    def _in_descendant_order(self, found, contexts):
+        # Matches of the descendant step never go back to an ancestor of the
+        # previous one; in document order, any other one comes after it
+        previous = None
+        for match in found:
+            context = self._up(match)
+            if previous is not None and context is not previous and context.getparent() is not previous.getparent():
+                if any(ancestor is context for ancestor in previous.iterancestors()):
+                    return False
+            previous = context
+        return True
+
+
+def order_checked_xpath(xpath, path, namespaces, first=False, single=False):
+    # OrderCheckedXPath for a compiled XPath of all matches of a prepared
+    # path, or None when its order cannot be checked: the path must be plain
+    # and made of child steps, or of child steps around one descendant step
+    # when it is evaluated from a single element
+    steps = split_path_steps(path)
+    resolved = resolve_steps(path, namespaces) if steps else None
+    if xpath is None or resolved is None:
+        return None
+    descendant_steps = steps.count('')
+    if descendant_steps == 0:
+        return OrderCheckedXPath(xpath, resolved, len(resolved), True, first)
+    if descendant_steps == 1 and single:
+        return OrderCheckedXPath(xpath, resolved, len(steps) - steps.index('') - 2, False, first)
+    return None
+
+
+def select_from(contexts, path):
+    # Matches of resolved steps (see resolve_steps) or of a context XPath (see
+    # compile_context_xpath) from the given elements
+    if isinstance(path, tuple):
+        return list(select_steps(contexts, path))
+    return path(contexts[0], context=contexts) if contexts else []
+
+
+def safe_find_from(contexts, path):
+    # safe_find from several context elements: the first match
+    try:
+        if isinstance(path, tuple):
+            return next(select_steps(contexts, path), None)
+        found = select_from(contexts, path)
+        return found[0] if found else None
+    except Exception:
+        return None
+
+
+def safe_findall_from(contexts, path):
+    # safe_findall from several context elements
+    try:
+        return _distinct_matches(select_from(contexts, path))
+    except Exception as e:
+        logger.debug(f"No distinct matches for {path}: {e}")
+        return []
+
+
+# An optionally prefixed element name: a step that keeps its meaning when a
+# path is evaluated in pieces and that can be matched by tag alone
+_PLAIN_STEP = re.compile(r'^(?:[A-Za-z_][\w.-]*:)?[A-Za-z_][\w.-]*$')
+
+
+def split_path_steps(path):
+    # Steps of a prepared path made only of child and descendant steps over
+    # plain names ('.//a/b' gives ('.', '', 'a', 'b')), or None
+    steps = tuple(path.split('/'))
+    if len(steps) < 2 or steps[0] != '.':
+        return None
+    for i, step in enumerate(steps[1:], start=1):
+        if step == '':
+            if i == len(steps) - 1 or steps[i + 1] == '':
+                return None
+        elif not _PLAIN_STEP.match(step):
             return None
-    
-    def safe_findall(element, xpath):
-        # Find all matching elements and handle duplicates
-        try:
-            xpath = add_prefix(xpath)
-            if not xpath.startswith('.') and not xpath.startswith('/'):
-                xpath = './' + xpath
-            lst = element.findall(xpath, namespaces)
-            # If all elements have same text, return single element
-            lst_to_compare = [el.text.strip() for el in lst]
-            if all(txt == lst_to_compare[0] for txt in lst_to_compare):
-                lst = lst[0]
+    return steps
+
+
+def resolve_steps(path, namespaces):
+    # (descendant, tag) pairs of a plain path with the prefixes and the ''
+    # default namespace applied as ElementPath applies them, or None when a
+    # prefix is not in namespaces (ElementPath raises a SyntaxError)
+    default_ns = namespaces.get('') if namespaces else None
+    resolved = []
+    descendant = False
+    for step in split_path_steps(path)[1:]:
+        if step == '':
+            descendant = True
+            continue
+        if ':' in step:
+            prefix, name = step.split(':', 1)
+            if not namespaces or prefix not in namespaces:
+                return None
+            tag = f'{{{namespaces[prefix]}}}{name}'
+        elif default_ns:
+            tag = f'{{{default_ns}}}{step}'
+        else:
+            tag = step
+        if tag[:2] == '{}':
+            tag = tag[2:]
+        resolved.append((descendant, tag))
+        descendant = False
+    return tuple(resolved)
+
+
+def _join_relative(steps, prefix):
+    return '.' + ''.join('/' + step for step in steps[len(prefix):])
+
+
+class PrefixTrie:
+    # Prefixes shared by the prepared paths of a plan. Each path is split
+    # after the longest prefix it shares with another path; shared prefixes
+    # are resolved once per document, each relative to the nodes of its own
+    # longest shared prefix, and the paths are evaluated from those nodes.
+    # ElementPath applies a path one step at a time over the nodes found by
+    # the previous step, and an lxml XPath from all the prefix nodes at once
+    # selects the same node-set as the whole path, so the results and their
+    # order are those of the whole path evaluated from the root. (With lxml,
+    # the order of paths ElementPath may order differently is checked, see
+    # OrderCheckedXPath.) Only
+    # prefixes where paths branch (or end) are kept, so no prefix is resolved
+    # for a single path.
+
+    def __init__(self, paths: List[List[str]]):
+        split = {
+            (i, j): split_path_steps(path)
+            for i, step_paths in enumerate(paths)
+            for j, path in enumerate(step_paths)
+        }
+        split = {key: steps for key, steps in split.items() if steps}
+        counts = {}
+        for steps in split.values():
+            for prefix in self._proper_prefixes(steps):
+                counts[prefix] = counts.get(prefix, 0) + 1
+        # A shared prefix is kept unless a longer one is shared by all its paths
+        kept = sorted(
+            (prefix for prefix, count in counts.items() if count > 1 and all(
+                counts.get(steps[:len(prefix) + 1], 0) < count
+                for steps in split.values() if steps[:len(prefix)] == prefix
+            )),
+            key=len
+        )
+        index = {prefix: k for k, prefix in enumerate(kept)}
+
+        # (path, parent prefix index or None, path relative to the parent)
+        self.prefixes = []
+        for prefix in kept:
+            parent = self._longest(prefix, index)
+            if parent:
+                self.prefixes.append(('/'.join(prefix), index[parent], _join_relative(prefix, parent)))
             else:
-                # Remove duplicates while preserving order
-                s = set()
-                lst_to_ret = []
-                for el in lst:
-                    if el.text.strip() not in s:
-                        s.add(el.text.strip())
-                        lst_to_ret.append(el)
-                lst = lst_to_ret
-            return lst
-        except Exception as e:
-            print("BATATOLAS" + str(e))
-            return []
-    
-    def extract_element_data(element):
-        # Recursively extract data from XML element including attributes and nested elements
-        if element is None:
-            return None
-            
-        result = {}
-        
-        # Extract attributes
-        for key, value in element.attrib.items():
-            result[key] = value
-            
-        # Extract text content if present
-        if element.text and element.text.strip():
-            result['text'] = element.text.strip()
-            
-        # Process child elements
-        for child in element:
-            child_data = extract_element_data(child)
-            if child_data:
-                tag = child.tag.split('}')[-1] if '}' in child.tag else child.tag
-                if tag in result:
-                    if not isinstance(result[tag], list):
-                        result[tag] = [result[tag]]
-                    result[tag].append(child_data)
+                self.prefixes.append(('/'.join(prefix), None, None))
+        # (i, j) position of a step path -> (prefix index, relative path)
+        self.anchors = {}
+        for key, steps in split.items():
+            prefix = self._longest(steps, index)
+            if prefix:
+                self.anchors[key] = (index[prefix], _join_relative(steps, prefix))
+
+    @staticmethod
+    def _proper_prefixes(steps):
+        # Prefixes ending with a name step and leaving at least one step
+        return [steps[:k] for k in range(2, len(steps)) if steps[k - 1] != '']
+
+    @staticmethod
+    def _longest(steps, index):
+        for k in range(len(steps) - 1, 1, -1):
+            if steps[:k] in index:
+                return steps[:k]
+        return None
+
+    def resolve(self, root, prefix_paths):
+        # Nodes of each shared prefix in a document. prefix_paths holds the
+        # (path, relative path) of each prefix as resolved steps or context
+        # XPaths. None marks a prefix whose paths are evaluated from the root.
+        nodes = []
+        for (_, parent, _), (path, relative) in zip(self.prefixes, prefix_paths):
+            contexts, selected = (nodes[parent], relative) if parent is not None else ([root], path)
+            found = None
+            if contexts is not None and selected is not None:
+                try:
+                    found = select_from(contexts, selected)
+                except Exception:
+                    pass
+            nodes.append(found)
+        return nodes
+
+    def anchored(self, nodes, relative_paths):
+        # (context nodes, relative path) of each step path that is evaluated
+        # from the nodes of its shared prefix; the others are left out and
+        # evaluated from the root
+        anchored = {}
+        for key, (k, _) in self.anchors.items():
+            if nodes[k] is not None and relative_paths[key] is not None:
+                anchored[key] = (nodes[k], relative_paths[key])
+        return anchored
+
+
+def _local_tag(element):
+    return element.tag.split('}')[-1] if '}' in element.tag else element.tag
+
+
+def _own_data(element):
+    # Attributes and stripped text of an element
+    data = dict(element.attrib)
+    if element.text and element.text.strip():
+        data['text'] = element.text.strip()
+    return data
+
+
+def _add_child(data, tag, child_data):
+    # Repeated tags (or a tag named like an attribute) are collected in a list
+    if tag in data:
+        if not isinstance(data[tag], list):
+            data[tag] = [data[tag]]
+        data[tag].append(child_data)
+    else:
+        data[tag] = child_data
+
+
+def extract_element_data(element):
+    # Extract data from XML element including attributes and nested elements.
+    # Children without any data are left out. The tree is walked with an
+    # explicit stack, so deep documents do not hit the recursion limit.
+    if element is None:
+        return None
+
+    stack = [(element, iter(element), _own_data(element))]
+    while True:
+        current, children, data = stack[-1]
+        # lxml also yields entity nodes, which have no tag name
+        for child in children:
+            if isinstance(child.tag, str):
+                stack.append((child, iter(child), _own_data(child)))
+                break
+        else:
+            stack.pop()
+            if not stack:
+                return data
+            if data:
+                _add_child(stack[-1][2], _local_tag(current), data)
+
+
+def _empty_elements(element):
+    # Elements under element (included) for which extract_element_data gives
+    # an empty dict: no attributes or text, and only such children
+    empty = set()
+    stack = [(element, False)]
+    while stack:
+        current, visited = stack.pop()
+        children = [child for child in current if isinstance(child.tag, str)]
+        if not visited:
+            stack.append((current, True))
+            stack.extend((child, False) for child in children)
+        elif not current.attrib and not (current.text and current.text.strip()) and all(
+            child in empty for child in children
+        ):
+            empty.add(current)
+    return empty
+
+
+def _element_entries(element, empty):
+    # The items of extract_element_data(element) with child elements in place
+    # of their dicts
+    entries = _own_data(element)
+    for child in element:
+        if isinstance(child.tag, str) and child not in empty:
+            _add_child(entries, _local_tag(child), child)
+    return entries
+
+
+def iter_element_json(element, indent: Optional[int] = DEFAULT_INDENT) -> Iterator[str]:
+    # Yield the JSON text of extract_element_data(element) in chunks, exactly
+    # as json.dumps(..., indent=indent, ensure_ascii=False) writes it, or
+    # compact with indent=None like JSONSerializer. The dicts are not built:
+    # each element's items are produced when it is written, so memory holds
+    # one level of items per open element instead of the whole result.
+    if element is None:
+        yield 'null'
+        return
+    empty = _empty_elements(element)
+    if element in empty:
+        yield '{}'
+        return
+
+    encode = json.encoder.encode_basestring
+    key_separator = ':' if indent is None else ': '
+    newlines = ['' if indent is None else '\n']
+
+    def newline(depth):
+        while len(newlines) <= depth:
+            newlines.append('' if indent is None else '\n' + ' ' * (indent * len(newlines)))
+        return newlines[depth]
+
+    # One (items, closing bracket) frame per open object or array; every open
+    # container has at least one item, since empty elements are left out
+    pieces = ['{']
+    stack = [(iter(_element_entries(element, empty).items()), '}')]
+    first = True
+    while stack:
+        items, closing = stack[-1]
+        item = next(items, None)
+        if item is None:
+            stack.pop()
+            pieces.append(newline(len(stack)) + closing)
+            first = False
+            continue
+        if not first:
+            pieces.append(',')
+        pieces.append(newline(len(stack)))
+        first = False
+        if closing == '}':
+            key, value = item
+            pieces.append(encode(key) + key_separator)
+        else:
+            value = item
+        if isinstance(value, str):
+            pieces.append(encode(value))
+        elif isinstance(value, list):
+            pieces.append('[')
+            stack.append((iter(value), ']'))
+            first = True
+        else:
+            pieces.append('{')
+            stack.append((iter(_element_entries(value, empty).items()), '}'))
+            first = True
+        if len(pieces) >= JSON_CHUNK_PIECES:
+            yield ''.join(pieces)
+            pieces = []
+    yield ''.join(pieces)
+
+
+def has_element_data(element):
+    # Whether extract_element_data(element) is not empty, without building it
+    return any(
+        isinstance(el.tag, str) and (el.attrib or (el.text and el.text.strip()))
+        for el in element.iter()
+    )
+
+
+class DocumentJSON:
+    # A document converted as a whole, kept as its element and written as JSON
+    # piece by piece (see iter_element_json) instead of being built as a dict.
+    # element is None when the root tag was not found, which gives {} like
+    # ExtractionPlan.run. Tests true when the converted dict would.
+
+    def __init__(self, element):
+        self.element = element
+
+    def __bool__(self):
+        return self.element is not None and has_element_data(self.element)
+
+    def data(self) -> Dict[str, Any]:
+        return extract_element_data(self.element) if self.element is not None else {}
+
+    def iter_json(self, indent: Optional[int] = DEFAULT_INDENT) -> Iterator[str]:
+        if self.element is None:
+            return iter(('{}',))
+        return iter_element_json(self.element, indent)
+
+
+def _text_entry(el, tagg):
+    if isinstance(el, ET.Element) or (lxml_etree is not None and isinstance(el, lxml_etree._Element)):
+        return {str(tagg): el.text.strip() if el.text else None}
+    return {str(tagg): el}
+
+
+class ExtractionPlan:
+    # Compiled form of the parse_xml_to_json arguments. All string work on the
+    # field specifications (splitting dotted names and attribute paths, adding
+    # namespace prefixes) happens once here instead of once per document.
+    # With the lxml backend the paths are also compiled to etree.XPath objects,
+    # once per default namespace seen in the documents. Prefixes shared by
+    # several paths are resolved once per document (see PrefixTrie).
+
+    def __init__(
+        self,
+        field_map: Optional[Dict[str, str]] = None,
+        fields: Optional[List[str]] = None,
+        namespaces: Optional[Dict[str, str]] = None,
+        root_tag: Optional[str] = None,
+        extra_fields: Optional[Dict[str, str]] = None,
+        pairs: Optional[Dict[str, str]] = None,
+        backend: str = 'etree'
+    ):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unsupported XML backend: {backend}")
+        self.backend = backend
+
+        # Keep private copies so later changes to the caller's dicts do not leak in
+        self.field_map = copy.deepcopy(field_map)
+        self.fields = copy.deepcopy(fields)
+        self.namespaces = copy.deepcopy(namespaces)
+        self.root_tag = root_tag.strip() if root_tag else None
+        self.extra_fields = copy.deepcopy(extra_fields)
+        self.pairs = copy.deepcopy(pairs)
+
+        self._steps = self._compile_steps()
+        if backend == 'lxml' and any(
+            part.strip() == '..' for step in self._steps for path in step[3] for part in path.split('/')
+        ):
+            # lxml also selects the parent of the converted element, ElementPath does not
+            raise ValueError("Parent steps ('..') are not supported by the lxml backend")
+        self._pairs = self._compile_pairs()
+        # Prepared XPaths for documents with and without a default namespace
+        self._paths = {
+            prefixed: self._prepare_paths(prefixed) for prefixed in (False, True)
+        }
+        self._tries = {prefixed: PrefixTrie(paths) for prefixed, paths in self._paths.items()}
+        self._xpaths = {}
+        self._prefix_xpaths = {}
+
+    def __getstate__(self):
+        # Compiled XPath objects cannot be pickled; worker processes rebuild them
+        state = self.__dict__.copy()
+        state['_xpaths'] = {}
+        state['_prefix_xpaths'] = {}
+        return state
+
+    def _compile_steps(self):
+        steps = []
+        if self.field_map:
+            for field, xpath in self.field_map.items():
+                nested = field.split('.') if '.' in field else None
+                if isinstance(xpath, list):
+                    # Multiple XPath expressions for a single field
+                    steps.append(('multi', field, nested, list(xpath)))
+                elif '@' in xpath:
+                    base_path, attr = split_attribute_path(xpath)
+                    steps.append(('attr', field, nested, [base_path], attr))
+                else:
+                    steps.append(('elem', field, nested, [xpath], xpath.split('/')[-1]))
+        elif self.fields:
+            for xpath in self.fields:
+                if '@' in xpath:
+                    base_path, attr = split_attribute_path(xpath)
+                    steps.append(('field_attr', attr, None, [base_path], attr))
                 else:
-                    result[tag] = child_data
-                    
+                    steps.append(('field_elem', xpath.split('/')[-1], None, [xpath], None))
+        return steps
+
+    def _compile_pairs(self):
+        if not self.pairs:
+            return None
+        keys = list(self.pairs.keys())
+        tag = keys[0].split(".")[0]
+        tagg = [pr.split(".")[-1] for pr in keys]
+        anchors = [xpquery[0] for xpquery in self.pairs.values()]
+        leaves = []
+        for alpha in [x[-1] for x in self.pairs.values()]:
+            to_search = alpha.split("/")
+            if len(to_search) == 1:
+                leaves.append((alpha, None))
+            else:
+                leaves.append((to_search[0], to_search[1][1:]))
+        return tag, tagg, anchors, leaves
+
+    def _prepare_paths(self, prefixed):
+        return [[prepare_xpath(path, prefixed) for path in step[3]] for step in self._steps]
+
+    def _compiled_paths(self, default_ns, namespaces):
+        # Precompiled lxml XPaths for documents with this default namespace
+        compiled = self._xpaths.get(default_ns)
+        if compiled is None:
+            compiled = [
+                [compile_lxml_xpath(path, namespaces, first=step[0] in _FIRST_MATCH_STEPS) for path in step_paths]
+                for step, step_paths in zip(self._steps, self._paths[bool(default_ns)])
+            ]
+            self._xpaths[default_ns] = compiled
+        return compiled
+
+    def _prefix_paths(self, default_ns, namespaces):
+        # Paths of the shared prefixes and the paths relative to them for
+        # documents with this default namespace: context XPaths for lxml, or
+        # steps resolved against the namespaces for ElementTree
+        compiled = self._prefix_xpaths.get(default_ns)
+        if compiled is None:
+            trie = self._tries[bool(default_ns)]
+            step_paths = self._paths[bool(default_ns)]
+
+            def compile_path(path, whole_path, first=False):
+                # Context XPaths give the whole path's matches in document order,
+                # which ElementPath gives too or which is checked per document
+                if self.backend == 'lxml':
+                    if keeps_document_order(whole_path):
+                        return compile_context_xpath(path, namespaces, first)
+                    checked = order_checked_xpath(
+                        compile_context_xpath(path, namespaces), path, namespaces, first, single=path == whole_path
+                    )
+                    if checked is not None:
+                        return checked
+                return resolve_steps(path, namespaces)
+
+            prefix_paths = [
+                (compile_path(path, path), compile_path(relative, path) if relative else None)
+                for path, _, relative in trie.prefixes
+            ]
+            relative_paths = {
+                (i, j): compile_path(relative, step_paths[i][j], first=self._steps[i][0] in _FIRST_MATCH_STEPS)
+                for (i, j), (_, relative) in trie.anchors.items()
+            }
+            compiled = (prefix_paths, relative_paths)
+            self._prefix_xpaths[default_ns] = compiled
+        return compiled
+
+    @property
+    def whole_document(self) -> bool:
+        # Documents are converted as a whole when there are no field specifications
+        return not self.field_map and not self.fields
+
+    def _parse(self, xml_file):
+        if self.backend == 'lxml':
+            return load_lxml().parse(xml_file, lxml_parser())
+        return ET.parse(xml_file)
+
+    def run(self, xml_file: str, timings: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+        # Parse XML and extract the planned fields. Parse and extract times are
+        # added to timings when given.
+        start = time.perf_counter()
+        tree = self._parse(xml_file)
+        if timings is None:
+            return self.extract(tree.getroot())
+        parsed = time.perf_counter()
+        result = self.extract(tree.getroot())
+        add_time(timings, 'parse', parsed - start)
+        add_time(timings, 'extract', time.perf_counter() - parsed)
         return result
 
-    def extract_section_text(code_value):
-        # Extract text content from specific section by code value
-        for section in root.findall('.//section', extra_ns):
-            code = section.find('code', extra_ns)
-            if code is not None and code.attrib.get('code') == code_value:
-                text_elem = section.find('text', extra_ns)
-                if text_elem is not None and ''.join(text_elem.itertext()).strip():
-                    return ''.join(text_elem.itertext()).strip()
-                excerpt_elem = section.find('excerpt', extra_ns)
-                if excerpt_elem is not None:
-                    return ' '.join([t.strip() for t in excerpt_elem.itertext() if t.strip()])
-        return None
-    
-    result = {}
-    
-    # Process field mappings if provided
-    if field_map:
-        for field, xpath in field_map.items():
-            if isinstance(xpath, list):
+    def run_document(self, xml_file: str, timings: Optional[Dict[str, float]] = None) -> 'DocumentJSON':
+        # Parse XML for a whole_document plan, leaving the document as its
+        # element tree to be written with DocumentJSON.iter_json. The time to
+        # find the root tag is added to timings as extract time; extraction
+        # itself happens while the JSON is written.
+        start = time.perf_counter()
+        root = self._parse(xml_file).getroot()
+        parsed = time.perf_counter()
+        document = DocumentJSON(self._select_root(root))
+        if timings is not None:
+            add_time(timings, 'parse', parsed - start)
+            add_time(timings, 'extract', time.perf_counter() - parsed)
+        return document
+
+    def _select_root(self, root):
+        # Handle custom root tag if specified; None when it is not found
+        if self.root_tag:
+            root_local = root.tag.split('}')[-1] if '}' in root.tag else root.tag
+            if root_local.strip().lower() != self.root_tag.lower():
+                default_ns = root.tag.split('}')[0].strip('{') if '}' in root.tag else None
+                if default_ns:
+                    return root.find(f'.//{{{default_ns}}}{self.root_tag}')
+                return root.find(f'.//{self.root_tag}')
+        return root
+
+    def extract(self, root) -> Dict[str, Any]:
+        # Extract default namespace from root tag if present
+        default_ns = root.tag.split('}')[0].strip('{') if '}' in root.tag else None
+        extra_ns = self.namespaces
+        namespaces = {NS_PREFIX: default_ns} if default_ns else self.namespaces
+        if self.backend == 'lxml':
+            paths = self._compiled_paths(default_ns, namespaces)
+        else:
+            paths = self._paths[bool(default_ns)]
+
+        root = self._select_root(root)
+        if root is None:
+            return {}
+
+        if not self.field_map and not self.fields:
+            # If no field specifications, extract all data
+            return extract_element_data(root)
+
+        trie = self._tries[bool(default_ns)]
+        prefix_paths, relative_paths = self._prefix_paths(default_ns, namespaces)
+        anchored = trie.anchored(trie.resolve(root, prefix_paths), relative_paths)
+        if self.field_map:
+            return self._extract_field_map(root, namespaces, extra_ns, paths, anchored)
+        return self._extract_fields(root, namespaces, paths, anchored)
+
+    @staticmethod
+    def _find(root, namespaces, path, anchored, key):
+        anchor = anchored.get(key)
+        if anchor is None:
+            return safe_find(root, path, namespaces)
+        return safe_find_from(*anchor)
+
+    @staticmethod
+    def _findall(root, namespaces, path, anchored, key):
+        anchor = anchored.get(key)
+        if anchor is None:
+            return safe_findall(root, path, namespaces)
+        return safe_findall_from(*anchor)
+
+    def _extract_field_map(self, root, namespaces, extra_ns, paths, anchored):
+        result = {}
+        trailing = self._extract_trailing(root, extra_ns)
+        for i, (step, step_paths) in enumerate(zip(self._steps, paths)):
+            kind, field, nested = step[0], step[1], step[2]
+            if kind == 'multi':
                 # Handle multiple XPath expressions for a single field
                 values = []
-                for path in xpath:
-                    elements = safe_findall(root, path)
+                for j, path in enumerate(step_paths):
+                    elements = self._findall(root, namespaces, path, anchored, (i, j))
                     for element in elements:
                         if element is not None and element.text:
                             values.append(element.text.strip())
-                
+
                 if values:
-                    if '.' in field:
+                    if nested:
                         # Handle nested field structure
-                        parts = field.split('.')
                         current = result
-                        for part in parts[:-1]:
+                        for part in nested[:-1]:
                             if part not in current:
                                 current[part] = {}
                             current = current[part]
-                        current[parts[-1]] = values
+                        current[nested[-1]] = values
                     else:
                         result[field] = values
-            elif '@' in xpath:
+            elif kind == 'attr':
                 # Handle attribute extraction
-                base_path, attr = xpath.rsplit('@', 1)
-                base_path = base_path.rstrip('/').strip()
-                attr = attr.strip()
-                element = safe_find(root, base_path)
-
+                attr = step[4]
+                element = self._find(root, namespaces, step_paths[0], anchored, (i, 0))
                 if element is not None and attr in element.attrib:
-                    if '.' in field:
-                        tag = field.split('.')[0]
-                        tagg = field.split('.')[-1]
+                    if nested:
+                        # A single match never produces a list, so nothing is stored
                         if isinstance(element, list):
-                            result[tag] = []
-                            for el in element:
-                                if isinstance(el, ET.Element):
-                                    result[tag].append({str(tagg): el.text.strip() if el.text else None})
-                                else:
-                                    result[tag].append({str(tagg): el})
+                            result[nested[0]] = [_text_entry(el, nested[-1]) for el in element]
                     else:
                         result[field] = element.attrib[attr]
             else:
                 # Handle regular element extraction
-                element = safe_findall(root, xpath)
+                element = self._findall(root, namespaces, step_paths[0], anchored, (i, 0))
                 if element is not None:
-                    if '.' in field:
-                        tag = field.split('.')[0]
-                        tagg = field.split('.')[-1]
+                    if nested:
                         if isinstance(element, list):
-                            result[tag] = []
-                            for el in element:
-                                if isinstance(el, ET.Element):
-                                    result[tag].append({str(tagg): el.text.strip() if el.text else None})
-                                else:
-                                    result[tag].append({str(tagg): el})
+                            result[nested[0]] = [_text_entry(el, nested[-1]) for el in element]
                     else:
-                        tag = xpath.split('/')[-1]
+                        tag = step[4]
                         if isinstance(element, list):
-                            result[field] = []
-                            for el in element:
-                                result[field].append({str(tag): el.text.strip() if el.text else None})
+                            result[field] = [{str(tag): el.text.strip() if el.text else None} for el in element]
                         else:
                             result[field] = element.text.strip() if element.text else None
-            
-            # Process extra fields if specified
-            if extra_fields:
-                for field_name, code_value in extra_fields.items():
-                    section_text = extract_section_text(code_value)
-                    if section_text:
-                        result[field_name] = section_text
-
-            # Process paired fields if specified
-            if pairs:
-                tag = list(pairs.keys())[0].split(".")[0]
-                tagg = [pr.split(".")[-1] for pr in list(pairs.keys())]
-                result[tag] = []
-                for xpquery in pairs.values():
-                    generic_elem = root.findall(xpquery[0], extra_ns)
-                    for sub in generic_elem:
-                        dict_to_append = {}
-                        for alpha_i, alpha in enumerate([x[-1] for x in list(pairs.values())]):
-                            if len(alpha.split("/")) == 1:
-                                dict_to_append[tagg[alpha_i]] = ''.join(sub.find(alpha, extra_ns).itertext()).strip() if sub.find(alpha, extra_ns) is not None else None
-                            else:
-                                to_search = alpha.split("/")
-                                dict_to_append[tagg[alpha_i]] = sub.find(to_search[0], extra_ns).attrib.get(to_search[1][1:]) if sub.find(to_search[0], extra_ns) is not None else None
-                        result[tag].append(dict_to_append)
-                # Remove duplicates while preserving order
-                s = set()
-                lst_to_ret = []
-                for el in result[tag]:
-                    if el[tagg[0]] not in s:
-                        s.add(el[tagg[0]])
-                        lst_to_ret.append(el)
-                result[tag] = lst_to_ret
-
-    elif fields:
+
+            # Re-applied after every field: extra and paired fields stay right after
+            # the first mapped field and take precedence over later ones
+            result.update(trailing)
+        return result
+
+    def _extract_trailing(self, root, extra_ns):
+        # Resolve extra_fields and pairs once per document
+        trailing = {}
+        if self.extra_fields:
+            sections = index_sections(root, extra_ns)
+            for field_name, code_value in self.extra_fields.items():
+                section_text = extract_section_text(sections.get(code_value, ()), extra_ns)
+                if section_text:
+                    trailing[field_name] = section_text
+
+        if self._pairs:
+            tag, pair_items = self._extract_pairs(root, extra_ns)
+            trailing[tag] = pair_items
+        return trailing
+
+    def _extract_pairs(self, root, extra_ns):
+        tag, tagg, anchors, leaves = self._pairs
+        items = []
+        # Each distinct anchor path is searched only once
+        anchor_nodes = {}
+        for anchor in anchors:
+            if anchor not in anchor_nodes:
+                anchor_nodes[anchor] = root.findall(anchor, extra_ns)
+            for sub in anchor_nodes[anchor]:
+                dict_to_append = {}
+                for alpha_i, (path, attr) in enumerate(leaves):
+                    found = sub.find(path, extra_ns)
+                    if attr is None:
+                        dict_to_append[tagg[alpha_i]] = ''.join(found.itertext()).strip() if found is not None else None
+                    else:
+                        dict_to_append[tagg[alpha_i]] = found.attrib.get(attr) if found is not None else None
+                items.append(dict_to_append)
+        # Remove duplicates while preserving order
+        s = set()
+        lst_to_ret = []
+        for el in items:
+            if el[tagg[0]] not in s:
+                s.add(el[tagg[0]])
+                lst_to_ret.append(el)
+        return tag, lst_to_ret
+
+    def _extract_fields(self, root, namespaces, paths, anchored):
         # Process simple field list if no field map provided
-        for xpath in fields:
-            if '@' in xpath:
-                base_path, attr = xpath.rsplit('@', 1)
-                base_path = base_path.rstrip('/').strip()
-                attr = attr.strip()
-                element = safe_find(root, base_path)
+        result = {}
+        for i, (step, step_paths) in enumerate(zip(self._steps, paths)):
+            element = self._find(root, namespaces, step_paths[0], anchored, (i, 0))
+            if step[0] == 'field_attr':
+                attr = step[4]
                 if element is not None and attr in element.attrib:
                     result[attr] = element.attrib[attr]
-            else:
-                element = safe_find(root, xpath)
-                if element is not None:
-                    tag = xpath.split('/')[-1]
-                    if len(element) > 0:
-                        result[tag] = extract_element_data(element)
-                    else:
-                        result[tag] = element.text.strip() if element.text else None
-    
+            elif element is not None:
+                tag = step[1]
+                if len(element) > 0:
+                    result[tag] = extract_element_data(element)
+                else:
+                    result[tag] = element.text.strip() if element.text else None
+        return result
+
+
+def index_sections(root, namespaces=None):
+    # Group all sections by their code/@code in a single traversal
+    sections = {}
+    for section in root.findall('.//section', namespaces):
+        code = section.find('code', namespaces)
+        if code is not None:
+            sections.setdefault(code.attrib.get('code'), []).append(section)
+    return sections
+
+
+def extract_section_text(sections, namespaces=None):
+    # Extract text content from the first of the given sections that has any
+    for section in sections:
+        text_elem = section.find('text', namespaces)
+        if text_elem is not None and ''.join(text_elem.itertext()).strip():
+            return ''.join(text_elem.itertext()).strip()
+        excerpt_elem = section.find('excerpt', namespaces)
+        if excerpt_elem is not None:
+            return ' '.join([t.strip() for t in excerpt_elem.itertext() if t.strip()])
+    return None
+
+
+def _freeze(value):
+    # Builds a hashable cache key from nested dicts and lists
+    if isinstance(value, dict):
+        return ('dict', tuple((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return (type(value).__name__, tuple(_freeze(v) for v in value))
+    return value
+
+
+def get_extraction_plan(
+    field_map: Optional[Dict[str, str]] = None,
+    fields: Optional[List[str]] = None,
+    namespaces: Optional[Dict[str, str]] = None,
+    root_tag: Optional[str] = None,
+    extra_fields: Optional[Dict[str, str]] = None,
+    pairs: Optional[Dict[str, str]] = None,
+    backend: str = 'etree'
+) -> ExtractionPlan:
+    # Return a compiled plan for these arguments, reusing a cached one when possible
+    key = _freeze((field_map, fields, namespaces, root_tag, extra_fields, pairs, backend))
+    plan = _plan_cache.get(key)
+    if plan is None:
+        plan = ExtractionPlan(
+            field_map=field_map,
+            fields=fields,
+            namespaces=namespaces,
+            root_tag=root_tag,
+            extra_fields=extra_fields,
+            pairs=pairs,
+            backend=backend,
+        )
+        _plan_cache[key] = plan
+        if len(_plan_cache) > _PLAN_CACHE_SIZE:
+            _plan_cache.popitem(last=False)
     else:
-        # If no field specifications, extract all data
-        result = extract_element_data(root)
-    
-    return result
+        _plan_cache.move_to_end(key)
+    return plan
+
+
+def parse_xml_to_json(
+    xml_file: str,
+    repeated_file: str = None,
+    field_map: Optional[Dict[str, str]] = None,
+    fields: Optional[List[str]] = None,
+    namespaces: Optional[Dict[str, str]] = None,
+    root_tag: Optional[str] = None,
+    extra_fields: Optional[Dict[str, str]] = None,
+    pairs: Optional[Dict[str, str]] = None,
+    plan: Optional[ExtractionPlan] = None,
+    backend: str = 'etree',
+    timings: Optional[Dict[str, float]] = None
+) -> Dict[str, Any]:
+    # Use the given plan, or compile one from the field specifications
+    if plan is None:
+        plan = get_extraction_plan(
+            field_map=field_map,
+            fields=fields,
+            namespaces=namespaces,
+            root_tag=root_tag,
+            extra_fields=extra_fields,
+            pairs=pairs,
+            backend=backend,
+        )
+    return plan.run(xml_file, timings)
+
+def iter_xml_records(
+    xml_file: str,
+    record_tag: str,
+    field_map: Optional[Dict[str, str]] = None,
+    fields: Optional[List[str]] = None,
+    namespaces: Optional[Dict[str, str]] = None,
+    root_tag: Optional[str] = None,
+    extra_fields: Optional[Dict[str, str]] = None,
+    pairs: Optional[Dict[str, str]] = None,
+    plan: Optional[ExtractionPlan] = None,
+    backend: str = 'etree',
+    timings: Optional[Dict[str, float]] = None
+) -> Iterator[Dict[str, Any]]:
+    # Stream a file holding many repeated records, yielding one result per
+    # record_tag element. Each record is extracted as soon as it is complete and
+    # then discarded, so memory use does not grow with the file size. When
+    # timings is given, the time spent extracting records and the rest of the
+    # time spent in this generator (parsing) are added to it.
+    if plan is None:
+        plan = get_extraction_plan(
+            field_map=field_map,
+            fields=fields,
+            namespaces=namespaces,
+            root_tag=root_tag,
+            extra_fields=extra_fields,
+            pairs=pairs,
+            backend=backend,
+        )
+    # record_tag is matched against the local name, or the full '{namespace}tag'
+    match_full = record_tag.startswith('{')
+
+    if plan.backend == 'lxml':
+        events = load_lxml().iterparse(
+            xml_file,
+            events=('start', 'end'),
+            load_dtd=False,
+            no_network=True,
+            resolve_entities=False,
+            remove_comments=True,
+            remove_pis=True,
+        )
+    else:
+        events = ET.iterparse(xml_file, events=('start', 'end'))
+
+    ancestors = []
+    record_depth = 0
+    active = time.perf_counter()
+    for event, elem in events:
+        tag = elem.tag if match_full else elem.tag.rpartition('}')[2]
+        if event == 'start':
+            ancestors.append(elem)
+            if tag == record_tag:
+                record_depth += 1
+            continue
+
+        ancestors.pop()
+        if tag == record_tag:
+            record_depth -= 1
+            if record_depth == 0:
+                if timings is None:
+                    yield plan.extract(elem)
+                else:
+                    start = time.perf_counter()
+                    result = plan.extract(elem)
+                    add_time(timings, 'parse', start - active)
+                    add_time(timings, 'extract', time.perf_counter() - start)
+                    yield result
+                    active = time.perf_counter()
+        if record_depth == 0:
+            # Outside any record nothing is needed again, so free the element and
+            # detach it. The parser may already have appended later siblings, so
+            # it is not necessarily the parent's last child.
+            elem.clear()
+            if ancestors:
+                ancestors[-1].remove(elem)
+    if timings is not None:
+        add_time(timings, 'parse', time.perf_counter() - active)
+
 
 def convert_csv(
     input_file: str,
     output_dir: str,
     skiprows: int = 0,
-    field_map: Optional[Dict[str, int]] = None
+    field_map: Optional[Dict[str, int]] = None,
+    indent: Optional[int] = 4,
+    json_backend: str = 'auto',
+    verbose: bool = False
 ) -> List[str]:
     # Create output directory if it doesn't exist
     output_path = Path(output_dir)
     output_path.mkdir(parents=True, exist_ok=True)
+    serializer = get_serializer(indent=indent, backend=json_backend)
     
     created_files = []
     
@@ -321,11 +1195,11 @@ def convert_csv(
             
             if record and len(record) > 1:  # Only create file if record has multiple fields
                 output_file = output_path / f"record_{i+1}.json"
-                with open(output_file, 'w', encoding='utf-8') as out_f:
-                    json.dump(record, out_f, indent=4, ensure_ascii=False)
+                serializer.write_file(record, output_file)
                 created_files.append(str(output_file))
     
-    print(f"Created {len(created_files)} JSON files in {output_dir}")
+    if verbose:
+        print(f"Created {len(created_files)} JSON files in {output_dir}")
     return created_files
 
 def check_null_fields(json_data: Dict) -> List[str]:
@@ -347,10 +1221,19 @@ def check_null_fields(json_data: Dict) -> List[str]:
     return null_fields
 
 class PythonConverter:
-    def convert_xml_structured(self, input_file: str, output_dir: str, field_map: Dict[str, str], namespaces: Optional[Dict[str, str]] = None) -> None:
+    def convert_xml_structured(self, input_file: str, output_dir: str, field_map: Dict[str, str], namespaces: Optional[Dict[str, str]] = None,
+                               indent: Optional[int] = 4, json_backend: str = 'auto') -> None:
         # Convert XML to JSON and save to file
         result = parse_xml_to_json(input_file, field_map=field_map, namespaces=namespaces)
         os.makedirs(output_dir, exist_ok=True)
         output_file = os.path.join(output_dir, os.path.splitext(os.path.basename(input_file))[0] + '.json')
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(result, f, indent=4, ensure_ascii=False)
\ No newline at end of file
+        get_serializer(indent=indent, backend=json_backend).write_file(result, output_file)
+
+def __getattr__(name):
+    # apply_xslt_to_xml is still reachable from here, but lxml is only loaded
+    # on first access
+    if name == 'apply_xslt_to_xml':
+        from .xslt_converter import apply_xslt_to_xml
+        globals()[name] = apply_xslt_to_xml
+        return apply_xslt_to_xml
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,77 +1,235 @@
 import os
+import copy
 import json
 import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from lxml import etree
 from glob import glob
+from typing import Optional
+from ..serialization import get_serializer
+from ..stats import add_time
 
-# Configure logging for the module
+# Level and output are left to the application
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-if not logger.hasHandlers():
-    handler = logging.StreamHandler()
-    handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
-    logger.addHandler(handler)
+logger.addHandler(logging.NullHandler())
 
+# Processing instruction of FDA labels pointing at their online stylesheet
+FDA_STYLESHEET_PI = b'<?xml-stylesheet type="text/xsl" href="https://www.accessdata.fda.gov/spl/stylesheet/spl.xsl"?>'
 
-def apply_xslt_to_xml(xml_file: str, repeated_file: str, xslt_file: str) -> dict:
+# Bytes of an XML file handed to the parser at a time
+PARSE_BLOCK_SIZE = 1024 * 1024
+
+# Compiled stylesheets keyed by (path, mtime, size), least recently used first
+TRANSFORM_CACHE_SIZE = 16
+_transform_cache = OrderedDict()
+_transform_cache_lock = threading.Lock()
+
+# lxml parsers must not be shared between threads, so each keeps its own;
+# threads applying transforms concurrently also get their own copies
+_parser_local = threading.local()
+_transform_local = threading.local()
+
+
+def get_transform(xslt_file) -> etree.XSLT:
+    # Return a compiled XSLT transform, compiling the stylesheet only when it
+    # is not cached yet or has changed on disk since it was compiled
+    if isinstance(xslt_file, etree.XSLT):
+        return xslt_file
+
+    path = os.path.abspath(xslt_file)
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+
+    with _transform_cache_lock:
+        transform = _transform_cache.get(key)
+        if transform is not None:
+            _transform_cache.move_to_end(key)
+            return transform
+
+    transform = etree.XSLT(etree.parse(path))
+
+    with _transform_cache_lock:
+        # Drop stale compilations of the same stylesheet
+        for stale in [k for k in _transform_cache if k[0] == path]:
+            del _transform_cache[stale]
+        _transform_cache[key] = transform
+        while len(_transform_cache) > TRANSFORM_CACHE_SIZE:
+            _transform_cache.popitem(last=False)
+    return transform
+
+
+def clear_transform_cache():
+    with _transform_cache_lock:
+        _transform_cache.clear()
+
+
+def get_thread_transform(xslt_file) -> etree.XSLT:
+    # Compiled transform private to the calling thread: a copy of the shared
+    # one from get_transform, made once per thread and stylesheet
+    shared = get_transform(xslt_file)
+    copies = getattr(_transform_local, 'copies', None)
+    if copies is None:
+        copies = _transform_local.copies = {}
+    entry = copies.get(id(shared))
+    if entry is None or entry[0] is not shared:
+        entry = copies[id(shared)] = (shared, copy.copy(shared))
+    return entry[1]
+
+
+def xml_parser() -> etree.XMLParser:
+    # This thread's parser, with the security settings of the converter
+    parser = getattr(_parser_local, 'parser', None)
+    if parser is None:
+        parser = etree.XMLParser(load_dtd=False, no_network=True, resolve_entities=False)
+        _parser_local.parser = parser
+    return parser
+
+
+def parse_xml_file(xml_file):
+    # Parse a file block by block into its root element, without holding a
+    # copy of the whole text. The FDA stylesheet reference is dropped from the
+    # first block, where the prolog is, so no external stylesheet is named.
+    parser = xml_parser()
+    try:
+        with open(xml_file, 'rb') as f:
+            parser.feed(f.read(PARSE_BLOCK_SIZE).replace(FDA_STYLESHEET_PI, b'', 1))
+            for block in iter(lambda: f.read(PARSE_BLOCK_SIZE), b''):
+                parser.feed(block)
+    except BaseException:
+        # Discard the partial document so the parser can be reused
+        try:
+            parser.close()
+        except etree.XMLSyntaxError:
+            pass
+        raise
+    return parser.close()
+
+
+def _transform_xml(xml_file: str, xslt_file, timings=None):
+    # Parse xml_file and apply the stylesheet. Returns the result tree, or
+    # None when a file is missing or parsing or the transform fails. Parse and
+    # transform (extract) times are added to timings when given.
+    start = time.perf_counter()
     try:
         # Verify input files exist
-        if not os.path.exists(xml_file) or not os.path.exists(xslt_file):
-            return {}
+        precompiled = isinstance(xslt_file, etree.XSLT)
+        if not os.path.exists(xml_file) or not (precompiled or os.path.exists(xslt_file)):
+            return None
 
         try:
-            # Configure XML parser with security settings
-            parser = etree.XMLParser(load_dtd=False, no_network=True, resolve_entities=False)
-            
-            # Read and preprocess XML content
-            with open(xml_file, 'r', encoding='utf-8') as f:
-                xml_content = f.read()
-            
-            # Remove XML stylesheet reference to prevent external dependencies
-            xml_content = xml_content.replace('<?xml-stylesheet type="text/xsl" href="https://www.accessdata.fda.gov/spl/stylesheet/spl.xsl"?>', '')
-            xml_doc = etree.fromstring(xml_content.encode('utf-8'), parser)
+            xml_doc = parse_xml_file(xml_file)
 
             # Log first 5 elements for debugging
-            for child in xml_doc[:5]:
-                logger.info(f"  {child.tag}: {child.attrib}")
+            if logger.isEnabledFor(logging.DEBUG):
+                for child in xml_doc[:5]:
+                    logger.debug(f"  {child.tag}: {child.attrib}")
                 
         except Exception as e:
-            return {}
-            
-        try:
-            # Load XSLT transformation file
-            xslt_doc = etree.parse(xslt_file)
-        except Exception as e:
-            return {}
-            
+            return None
+
+        parsed = time.perf_counter()
+        if timings is not None:
+            add_time(timings, 'parse', parsed - start)
         try:
-            # Create XSLT transformer
-            transform = etree.XSLT(xslt_doc)
+            # Load the compiled XSLT transformer, compiling it on first use
+            transform = get_transform(xslt_file)
         except Exception as e:
-            return {}
+            return None
             
-        try:
-            # Define namespace for HL7 v3
-            ns = {'v3': 'urn:hl7-org:v3'}
-            # Apply transformation
-            result_tree = transform(xml_doc)
-            
-            try:
-                # Convert transformed XML to JSON
-                result_dict = json.loads(str(result_tree))
-                return result_dict
-            except json.JSONDecodeError as e:
-                return {}
-                
-        except Exception as e:
-            return {}
+        # Apply transformation
+        result_tree = transform(xml_doc)
+        if timings is not None:
+            add_time(timings, 'extract', time.perf_counter() - parsed)
+        return result_tree
             
+    except Exception as e:
+        return None
+
+
+def apply_xslt_to_xml(xml_file: str, repeated_file: str, xslt_file, timings=None) -> dict:
+    # xslt_file is a stylesheet path or an already compiled etree.XSLT. When
+    # timings is given, parse and transform (extract) times are added to it.
+    result_tree = _transform_xml(xml_file, xslt_file, timings)
+    if result_tree is None:
+        return {}
+    start = time.perf_counter()
+    try:
+        # Convert transformed XML to JSON
+        result_dict = json.loads(str(result_tree))
     except Exception as e:
         return {}
+    if timings is not None:
+        add_time(timings, 'extract', time.perf_counter() - start)
+    return result_dict
+
+
+def looks_like_json(data: bytes) -> bool:
+    # Cheap check that data holds one JSON object or array: only its first
+    # and last non-blank bytes are looked at
+    data = data.strip()
+    return len(data) >= 2 and (data[:1], data[-1:]) in ((b'{', b'}'), (b'[', b']'))
+
+
+def apply_xslt_raw(xml_file: str, xslt_file, timings=None, validate: bool = False) -> Optional[bytes]:
+    # Pass-through variant of apply_xslt_to_xml for stylesheets that emit
+    # JSON: returns the transform output as bytes, encoded as the stylesheet's
+    # xsl:output declares (it should declare UTF-8), without parsing it. None
+    # when the conversion fails or, with validate, when the output does not
+    # look like a JSON object or array.
+    result_tree = _transform_xml(xml_file, xslt_file, timings)
+    if result_tree is None:
+        return None
+    start = time.perf_counter()
+    data = bytes(result_tree)
+    if timings is not None:
+        add_time(timings, 'extract', time.perf_counter() - start)
+    if validate and not looks_like_json(data):
+        return None
+    return data
 
 # ----------------------------------------------------------------------------------------
 
-def process_folder_with_xslt(input_folder, output_folder, log_file, unconverted_log_file, xslt_path):
+def _convert_folder_file(xml_file, output_folder, transform, serializer, passthrough=False, validate=False, threaded=False):
+    # Convert and save one file of process_folder_with_xslt. Returns the
+    # output file, the missing fields (None when not checked) and the error
+    # that stopped the conversion, if any.
+    output_file = os.path.join(output_folder, os.path.basename(xml_file).replace('.xml', '.json'))
+    try:
+        if threaded:
+            try:
+                transform = get_thread_transform(transform)
+            except Exception:
+                pass
+        if passthrough:
+            # Failed documents are written as {} like in the parsed mode
+            data = apply_xslt_raw(xml_file, transform, validate=validate)
+            with open(output_file, 'wb') as f:
+                f.write(data if data is not None else serializer.dumps({}))
+            return output_file, None, None
+
+        # Convert XML to JSON using XSLT
+        json_data = apply_xslt_to_xml(xml_file, None, transform)
+
+        # Save JSON output
+        serializer.write_file(json_data, output_file)
+
+        # Check for missing or null fields
+        return output_file, check_null_and_empty_fields(json_data), None
+    except Exception as e:
+        return output_file, None, e
+
+
+def process_folder_with_xslt(input_folder, output_folder, log_file, unconverted_log_file, xslt_path, indent=4, json_backend='auto',
+                             passthrough=False, validate=False, threads=None):
+    # With passthrough the stylesheet output is written as it is (see
+    # apply_xslt_raw) and documents are not checked for missing fields. With
+    # threads above 1 files are converted by a thread pool, each thread with
+    # its own copy of the transform (libxslt runs without the GIL); results
+    # and logs keep the order of the sequential run.
     # Create output directory
     os.makedirs(output_folder, exist_ok=True)
     # Get all XML files in input folder
@@ -80,31 +238,39 @@ def process_folder_with_xslt(input_folder, output_folder, log_file, unconverted_
     unconverted_files = []
     converted_count = 0
 
-    # Process each XML file
-    for xml_file in xml_files:
-        try:
-            # Convert XML to JSON using XSLT
-            json_data = apply_xslt_to_xml(xml_file, xslt_path)
-            output_file = os.path.join(output_folder, os.path.basename(xml_file).replace('.xml', '.json'))
+    # Compile the stylesheet once for the whole folder; on failure each file
+    # reports it as before, like convert_xml
+    try:
+        transform = get_transform(xslt_path)
+    except Exception:
+        transform = xslt_path
+    serializer = get_serializer(indent=indent, backend=json_backend)
+    threaded = bool(threads and threads > 1)
+    convert_one = partial(
+        _convert_folder_file, output_folder=output_folder, transform=transform, serializer=serializer,
+        passthrough=passthrough, validate=validate, threaded=threaded
+    )
 
-            # Save JSON output
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(json_data, f, indent=4, ensure_ascii=False)
+    executor = ThreadPoolExecutor(max_workers=threads) if threaded else None
+    try:
+        results = executor.map(convert_one, xml_files) if executor else map(convert_one, xml_files)
+        # Process each XML file
+        for xml_file, (output_file, null_or_empty_fields, error) in zip(xml_files, results):
+            if error is not None:
+                logger.warning("Error processing %s: %s", xml_file, error)
+                unconverted_files.append(os.path.basename(xml_file))
+                continue
 
-            print(f"Converted: {xml_file} -> {output_file}")
+            logger.info("Converted: %s -> %s", xml_file, output_file)
             converted_count += 1
-
-            # Check for missing or null fields
-            null_or_empty_fields = check_null_and_empty_fields(json_data)
             if null_or_empty_fields:
                 missing_fields_log.append({
                     "file": os.path.basename(xml_file),
                     "missing_fields": null_or_empty_fields
                 })
-
-        except Exception as e:
-            print(f"Error processing {xml_file}: {e}")
-            unconverted_files.append(os.path.basename(xml_file))
+    finally:
+        if executor is not None:
+            executor.shutdown()
 
     # Write missing fields log
     with open(log_file, 'w', encoding='utf-8') as log:
@@ -112,6 +278,8 @@ def process_folder_with_xslt(input_folder, output_folder, log_file, unconverted_
         log.write(f"Total JSON files converted: {converted_count}\n")
         log.write(f"-------------------------------------------------------------------------\n\n")
 
+        if passthrough:
+            log.write("Missing fields are not checked in pass-through mode\n\n")
         log.write("Files with missing fields:\n")
         for entry in missing_fields_log:
             log.write(f"File: {entry['file']}\n")
@@ -128,11 +296,11 @@ def process_folder_with_xslt(input_folder, output_folder, log_file, unconverted_
         for file in unconverted_files:
             unconverted_log.write(f"  - {file}\n")
     
-    # Print summary
-    print(f"Missing fields in {log_file}")
-    print(f"Unconverted files in {unconverted_log_file}")
-    print(f"Total of JSON files converted: {converted_count}")
-    print(f"Total of unconverted files: {len(unconverted_files)}")
+    # Log summary
+    logger.info("Missing fields in %s", log_file)
+    logger.info("Unconverted files in %s", unconverted_log_file)
+    logger.info("Total of JSON files converted: %d", converted_count)
+    logger.info("Total of unconverted files: %d", len(unconverted_files))
 
 
 
@@ -0,0 +1,321 @@
+import hashlib
+import os
+import sqlite3
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Iterable, Optional, Set
+from .sinks import BackgroundSink
+
+# File extensions treated as a standalone SQLite dedup database
+SQLITE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+
+# Backends accepted by open_dedup_store
+DEDUP_BACKENDS = ('sqlite', 'text')
+
+# Bytes hashed at each end of the imported part of a text file to tell a
+# rewritten file from one that was appended to
+FINGERPRINT_BLOCK = 64 * 1024
+
+
+def strip_id(value):
+    return value.strip()
+
+
+class DedupStore:
+    # Persistent set of already processed ids. Membership checks see ids added
+    # in the current run immediately; new ids are written in batches.
+
+    def __contains__(self, item) -> bool:
+        raise NotImplementedError
+
+    def add(self, item: str) -> None:
+        raise NotImplementedError
+
+    def contains_many(self, items: Iterable[str]) -> Set[str]:
+        # Return the subset of items already in the store
+        return {item for item in items if item in self}
+
+    def add_many(self, items: Iterable[str]) -> None:
+        for item in items:
+            self.add(item)
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class TextFileDedupStore(DedupStore):
+    # Original format: one id per line, loaded fully into memory on open and
+    # appended to the file on flush
+
+    def __init__(self, path: str, normalize: Callable[[str], str] = strip_id):
+        self.path = path
+        self.normalize = normalize
+        self._ids = set()
+        self._pending = []
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    item = normalize(line)
+                    if item:
+                        self._ids.add(item)
+
+    def __contains__(self, item) -> bool:
+        return item in self._ids
+
+    def add(self, item: str) -> None:
+        if item not in self._ids:
+            self._ids.add(item)
+            self._pending.append(item)
+
+    def flush(self) -> None:
+        if self._pending:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.writelines(f"{item}\n" for item in self._pending)
+            self._pending = []
+
+
+class SQLiteDedupStore(DedupStore):
+    # Ids indexed in a SQLite table. When text_path is given the database is a
+    # sidecar index of that text file: lines appended to the file since the last
+    # run are imported on open, and new ids are appended to both on flush, so
+    # the text file stays usable by other tools.
+
+    def __init__(
+        self,
+        db_path: str,
+        text_path: Optional[str] = None,
+        normalize: Callable[[str], str] = strip_id,
+        batch_size: int = 10000
+    ):
+        self.db_path = db_path
+        self.text_path = text_path
+        self.normalize = normalize
+        self.batch_size = batch_size
+        self._pending = []
+        self._pending_set = set()
+
+        self._conn = sqlite3.connect(db_path)
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS ids (id TEXT PRIMARY KEY) WITHOUT ROWID")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+        if text_path:
+            self._sync_text_file()
+
+    def _get_meta(self, key, default=None):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, key, value):
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def _fingerprint(self, size):
+        # The inode and a hash of the first and last blocks of the first size
+        # bytes, which change when the file is replaced or rewritten
+        if not size:
+            return ''
+        digest = hashlib.sha1()
+        with open(self.text_path, 'rb') as f:
+            digest.update(f.read(min(size, FINGERPRINT_BLOCK)))
+            if size > FINGERPRINT_BLOCK:
+                f.seek(max(FINGERPRINT_BLOCK, size - FINGERPRINT_BLOCK))
+                digest.update(f.read(size - f.tell()))
+            return f"{os.fstat(f.fileno()).st_ino}:{digest.hexdigest()}"
+
+    def _mark_synced(self, size):
+        self._set_meta('text_offset', size)
+        self._set_meta('text_fingerprint', self._fingerprint(size))
+
+    def _sync_text_file(self):
+        # Import whatever the text file gained since the index was last updated
+        size = os.path.getsize(self.text_path) if os.path.exists(self.text_path) else 0
+        offset = int(self._get_meta('text_offset', 0))
+        normalizer = getattr(self.normalize, '__name__', repr(self.normalize))
+        if (size < offset or self._get_meta('normalize', normalizer) != normalizer
+                or self._fingerprint(offset) != self._get_meta('text_fingerprint', '')):
+            # The file was rewritten or is read differently: rebuild the index
+            with self._conn:
+                self._conn.execute("DELETE FROM ids")
+            offset = 0
+        if size > offset:
+            self.import_text(self.text_path, offset=offset)
+        with self._conn:
+            self._mark_synced(size)
+            self._set_meta('normalize', normalizer)
+
+    def import_text(self, path: str, offset: int = 0) -> int:
+        # Import a text file with one id per line, starting at a byte offset
+        imported = 0
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            batch = []
+            for raw in f:
+                item = self.normalize(raw.decode('utf-8'))
+                if item:
+                    batch.append((item,))
+                if len(batch) >= self.batch_size:
+                    imported += self._insert(batch)
+                    batch = []
+            if batch:
+                imported += self._insert(batch)
+        return imported
+
+    def _insert(self, rows):
+        with self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany("INSERT OR IGNORE INTO ids (id) VALUES (?)", rows)
+            return self._conn.total_changes - before
+
+    def __contains__(self, item) -> bool:
+        if item in self._pending_set:
+            return True
+        row = self._conn.execute("SELECT 1 FROM ids WHERE id = ?", (item,)).fetchone()
+        return row is not None
+
+    def contains_many(self, items: Iterable[str]) -> Set[str]:
+        # Query in chunks that stay below SQLite's bound parameter limit
+        items = list(dict.fromkeys(items))
+        found = {item for item in items if item in self._pending_set}
+        chunk_size = 500
+        for start in range(0, len(items), chunk_size):
+            chunk = items[start:start + chunk_size]
+            placeholders = ','.join('?' * len(chunk))
+            rows = self._conn.execute(f"SELECT id FROM ids WHERE id IN ({placeholders})", chunk)
+            found.update(row[0] for row in rows)
+        return found
+
+    def add(self, item: str) -> None:
+        if item in self:
+            return
+        self._pending.append(item)
+        self._pending_set.add(item)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def add_many(self, items: Iterable[str]) -> None:
+        # One membership query per chunk instead of one per item
+        items = list(dict.fromkeys(items))
+        known = self.contains_many(items)
+        self._pending.extend(item for item in items if item not in known)
+        self._pending_set.update(item for item in items if item not in known)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        if self.text_path:
+            # Pick up lines other writers appended before adding ours
+            self._sync_text_file()
+            with open(self.text_path, 'a', encoding='utf-8') as f:
+                f.writelines(f"{item}\n" for item in self._pending)
+        with self._conn:
+            self._conn.executemany("INSERT OR IGNORE INTO ids (id) VALUES (?)", [(item,) for item in self._pending])
+            if self.text_path:
+                self._mark_synced(os.path.getsize(self.text_path))
+        self._pending = []
+        self._pending_set = set()
+
+    def close(self) -> None:
+        try:
+            self.flush()
+        finally:
+            self._conn.close()
+
+
+class DeferredDedupStore(DedupStore):
+    # View of a store for records written by a background writer (see
+    # BackgroundSink). Ids added after records were handed to the sink only
+    # reach the store once the sink has written those records, so the ids of
+    # records lost to a failed write are never stored and a rerun converts
+    # them again. Waiting ids count as known for the rest of the run. flush
+    # moves the ids of written records to the store; closing the view leaves
+    # the store open.
+
+    def __init__(self, store: DedupStore, sink):
+        self.store = store
+        self.sink = sink
+        # (records queued when the ids were added, ids)
+        self._waiting = deque()
+        self._waiting_set = set()
+
+    def __contains__(self, item) -> bool:
+        return item in self._waiting_set or item in self.store
+
+    def contains_many(self, items: Iterable[str]) -> Set[str]:
+        items = list(items)
+        return {item for item in items if item in self._waiting_set} | self.store.contains_many(items)
+
+    def add(self, item: str) -> None:
+        self.add_many([item])
+
+    def add_many(self, items: Iterable[str]) -> None:
+        items = [item for item in items if item not in self._waiting_set]
+        if items:
+            self._waiting.append((self.sink.records_queued, items))
+            self._waiting_set.update(items)
+        self.flush()
+
+    def flush(self) -> None:
+        written = self.sink.records_written
+        while self._waiting and self._waiting[0][0] <= written:
+            _, items = self._waiting.popleft()
+            self._waiting_set.difference_update(items)
+            self.store.add_many(items)
+
+    def close(self) -> None:
+        self.flush()
+
+
+def defer_until_written(store: Optional[DedupStore], sink) -> Optional[DedupStore]:
+    # Ids of records written through a background writer wait for the writes
+    if store is not None and isinstance(sink, BackgroundSink):
+        return DeferredDedupStore(store, sink)
+    return store
+
+
+def open_dedup_store(
+    path: str,
+    backend: str = 'sqlite',
+    normalize: Callable[[str], str] = strip_id
+) -> DedupStore:
+    # 'sqlite' uses path directly when it has a database extension, otherwise
+    # it keeps a '<path>.sqlite' index next to the text file. 'text' reads the
+    # whole text file into memory like earlier versions did.
+    if backend == 'text':
+        return TextFileDedupStore(path, normalize=normalize)
+    if backend != 'sqlite':
+        raise ValueError(f"Unsupported dedup backend: {backend}")
+    if path.lower().endswith(SQLITE_EXTENSIONS):
+        return SQLiteDedupStore(path, normalize=normalize)
+    return SQLiteDedupStore(f"{path}.sqlite", text_path=path, normalize=normalize)
+
+
+@contextmanager
+def dedup_session(repeated_path, backend: str = 'sqlite', normalize: Callable[[str], str] = strip_id):
+    # Yield a store for repeated_path (a path or an open DedupStore), or None
+    # when dedup is disabled. Stores opened here are closed on exit; stores
+    # passed in by the caller are only flushed.
+    if not repeated_path:
+        yield None
+    elif isinstance(repeated_path, DedupStore):
+        try:
+            yield repeated_path
+        finally:
+            repeated_path.flush()
+    else:
+        store = open_dedup_store(os.fspath(repeated_path), backend=backend, normalize=normalize)
+        try:
+            yield store
+        finally:
+            store.close()
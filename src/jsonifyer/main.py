@@ -1,6 +1,19 @@
 import os
+import sys
 import json
+import argparse
 import datetime
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from .dedup import DEDUP_BACKENDS, dedup_session
+from .serialization import JSON_BACKENDS
+from .sinks import OUTPUT_FORMATS
+
+# Output files read per round by clean_repeated_items_batched
+CLEAN_BATCH_SIZE = 1000
+
+# JSON key holding the item name of each output type
+NAME_KEYS = {"csv": "Proper Name", "xml": "name"}
 
 def normalize_name(name):
     return name.lower().strip() if name else None
@@ -15,48 +28,278 @@ def load_processed_names(file_path):
                     processed.add(item_name)
     return processed
 
+def read_top_level_value(file_path, key):
+    # Value of one key of a JSON object file, None when it is missing. In
+    # indented files, as the converters write them, a top-level key is the
+    # only one starting a line at the first indentation level (strings cannot
+    # hold raw newlines) and the object closes on the last line, so only the
+    # value is decoded. Other files, truncated ones included, are parsed whole.
+    with open(file_path, 'rb') as f:
+        data = f.read()
+    indent_end = 2
+    while data[indent_end:indent_end + 1] == b' ':
+        indent_end += 1
+    indented = (
+        data.startswith(b'{\n ') and data[indent_end:indent_end + 1] == b'"'
+        and data.rstrip().endswith(b'\n}') and key.isascii()
+    )
+    if not indented:
+        return json.loads(data.decode('utf-8')).get(key)
+
+    prefix = data[1:indent_end] + json.dumps(key).encode('ascii') + b': '
+    start = data.find(prefix)
+    if start < 0:
+        return None
+    start += len(prefix)
+    end = data.find(b'\n', start)
+    line = data[start:end if end >= 0 else len(data)]
+    if line.endswith(b','):
+        line = line[:-1]
+    try:
+        return json.loads(line.decode('utf-8'))
+    except ValueError:
+        # Objects and lists span several lines
+        return json.JSONDecoder().raw_decode(data[start:].decode('utf-8'))[0]
+
 def extract_name_from_csv(file_path):
-    with open(file_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-        return normalize_name(data.get('Proper Name'))
-    return None
+    return normalize_name(read_top_level_value(file_path, NAME_KEYS["csv"]))
 
 def extract_name_from_xml(file_path):
-    with open(file_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-        return normalize_name(data.get('name'))
-    return None
+    return normalize_name(read_top_level_value(file_path, NAME_KEYS["xml"]))
 
-def append_to_log(log_file_path, message):
+def log_line(message):
     timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return f"[{timestamp}] {message}\n"
+
+def append_to_log(log_file_path, message):
     with open(log_file_path, 'a', encoding='utf-8') as f:
-        f.write(f"[{timestamp}] {message}\n")
-
-def clean_repeated_items(processed_names_file, output_folder, file_type, log_file):
-    processed_names = load_processed_names(processed_names_file)
-    removed_count = 0
-
-    for file in os.listdir(output_folder):
-        if not file.endswith('.json'):
-            continue
-
-        file_path = os.path.join(output_folder, file)
-        try:
-            if file_type == "csv":
-                item_name = extract_name_from_csv(file_path)
-            else:
-                item_name = extract_name_from_xml(file_path)
-
-            if item_name and (item_name in processed_names):
-                os.remove(file_path)
-                removed_count += 1
-                append_to_log(log_file, f"Removed duplicate: {file_path} - Name: {item_name}")
-            elif item_name:
-                with open(processed_names_file, 'a', encoding='utf-8') as f:
-                    f.write(f"{item_name}\n")
-                processed_names.add(item_name)
-
-        except Exception as e:
-            append_to_log(log_file, f"Error processing {file_path}: {str(e)}")
-
-    return removed_count
+        f.write(log_line(message))
+
+def _read_item_name(file_path, key):
+    # Normalized name of one output file, or the error raised reading it
+    try:
+        return normalize_name(read_top_level_value(file_path, key)), None
+    except Exception as e:
+        return None, e
+
+def clean_repeated_items_batched(processed_names_file, output_folder, file_type, log_file,
+                                 dedup_backend="sqlite", workers=None, batch_size=CLEAN_BATCH_SIZE):
+    # Remove output files whose name was already processed, making the same
+    # decisions as one pass in directory order. Files are listed with
+    # os.scandir and handled batch_size at a time: their names are read by a
+    # pool of workers threads when workers is above 1, then checked in order,
+    # and the log lines of the batch are appended in one write. New names are
+    # buffered by the dedup store. Returns counts of the files scanned,
+    # removed, kept with a new name, kept without a name and that failed.
+    key = NAME_KEYS["csv"] if file_type == "csv" else NAME_KEYS["xml"]
+    summary = {"scanned": 0, "removed": 0, "added": 0, "unnamed": 0, "errors": 0}
+    executor = ThreadPoolExecutor(max_workers=workers) if workers and workers > 1 else None
+
+    try:
+        # Processed names are kept in a dedup store, normalized like the JSON names
+        with dedup_session(processed_names_file, backend=dedup_backend, normalize=normalize_name) as processed_names, \
+                os.scandir(output_folder) as entries:
+            paths = (entry.path for entry in entries if entry.name.endswith('.json'))
+            for batch in iter(lambda: list(itertools.islice(paths, batch_size)), []):
+                if executor is not None:
+                    names = executor.map(_read_item_name, batch, itertools.repeat(key))
+                else:
+                    names = (_read_item_name(file_path, key) for file_path in batch)
+
+                lines = []
+                for file_path, (item_name, error) in zip(batch, names):
+                    summary["scanned"] += 1
+                    try:
+                        if error is not None:
+                            raise error
+                        if item_name and (item_name in processed_names):
+                            os.remove(file_path)
+                            summary["removed"] += 1
+                            lines.append(log_line(f"Removed duplicate: {file_path} - Name: {item_name}"))
+                        elif item_name:
+                            processed_names.add(item_name)
+                            summary["added"] += 1
+                        else:
+                            summary["unnamed"] += 1
+                    except Exception as e:
+                        summary["errors"] += 1
+                        lines.append(log_line(f"Error processing {file_path}: {str(e)}"))
+
+                if lines:
+                    with open(log_file, 'a', encoding='utf-8') as f:
+                        f.writelines(lines)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    return summary
+
+def clean_repeated_items(processed_names_file, output_folder, file_type, log_file, dedup_backend="sqlite",
+                         workers=None):
+    summary = clean_repeated_items_batched(
+        processed_names_file, output_folder, file_type, log_file, dedup_backend=dedup_backend, workers=workers
+    )
+    return summary["removed"]
+
+def _key_value(text):
+    # NAME=VALUE command line argument
+    name, sep, value = text.partition('=')
+    if not sep or not name:
+        raise argparse.ArgumentTypeError(f"expected NAME=VALUE, got {text!r}")
+    return name, value
+
+def _json_file(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        raise argparse.ArgumentTypeError(f"cannot read {path}: {e}")
+
+def _indent(text):
+    return None if text.lower() == 'none' else int(text)
+
+def _add_output_options(parser):
+    group = parser.add_argument_group('output')
+    group.add_argument('-o', '--output', dest='output_path', help='output directory')
+    group.add_argument('--output-format', choices=OUTPUT_FORMATS, default='files',
+                       help='one file per record, or NDJSON / JSON array shards')
+    group.add_argument('--max-records-per-shard', type=int)
+    group.add_argument('--max-bytes-per-shard', type=int)
+    group.add_argument('--indent', type=_indent, default=4, help="indentation of per-record files, or 'none'")
+    group.add_argument('--json-backend', choices=JSON_BACKENDS, default='auto')
+    group.add_argument('--writer-queue-size', type=int, help='write records from a background thread')
+    group.add_argument('--cache-dir', help='reuse conversions of unchanged inputs')
+
+    group = parser.add_argument_group('deduplication')
+    group.add_argument('--repeated-path', help='file of already processed ids')
+    group.add_argument('--repeated-item', help='field holding the id of each record')
+    group.add_argument('--dedup-backend', choices=DEDUP_BACKENDS, default='sqlite')
+
+    group = parser.add_argument_group('reporting')
+    group.add_argument('--no-progress', action='store_true', help='never show a progress bar')
+    group.add_argument('--stats', action='store_true', help='print the run statistics as JSON')
+    group.add_argument('-v', '--verbose', action='store_true', help='print every converted document')
+
+def _add_table_options(parser, delimiter):
+    parser.add_argument('file', help='input file')
+    parser.add_argument('--fields', nargs='+', help='columns to convert')
+    parser.add_argument('--delimiter', default=delimiter)
+    parser.add_argument('--skiprows', type=int, default=0)
+    parser.add_argument('--chunksize', type=int, help='read the file in chunks of this many rows')
+    parser.add_argument('--engine', choices=('auto', 'c', 'python', 'pyarrow'), default='c', help='pandas parser')
+    parser.add_argument('--dtype', dest='dtypes', type=_key_value, action='append', metavar='COLUMN=TYPE',
+                        help='pandas dtype of a column; may be repeated')
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='jsonify', description="Convert XML, CSV and TXT files to JSON.")
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    commands.required = True
+
+    xml = commands.add_parser('xml', help='convert a directory of XML files')
+    xml.add_argument('directory', help='input directory')
+    xml.add_argument('--converter', choices=('python', 'xslt'), default='python')
+    xml.add_argument('--xslt', dest='xslt_path', help='stylesheet for the xslt converter')
+    xml.add_argument('--passthrough', action='store_true', help='write the JSON emitted by the stylesheet as it is')
+    xml.add_argument('--validate-output', action='store_true',
+                     help='with --passthrough, count output that is not a JSON object or array as failed')
+    xml.add_argument('--fields', nargs='+', help='elements to convert')
+    xml.add_argument('--field-map', type=_json_file, metavar='JSON_FILE', help='output field to path mapping')
+    xml.add_argument('--extra-fields', type=_json_file, metavar='JSON_FILE')
+    xml.add_argument('--pairs', type=_json_file, metavar='JSON_FILE')
+    xml.add_argument('--namespace', dest='namespaces', type=_key_value, action='append', metavar='PREFIX=URI',
+                     help='namespace used in the paths; may be repeated')
+    xml.add_argument('--root-tag')
+    xml.add_argument('--record-tag', help='stream records with this tag out of bulk files')
+    xml.add_argument('--backend', choices=('etree', 'lxml'), default='etree')
+    xml.add_argument('-j', '--workers', type=int, help='worker processes')
+    xml.add_argument('--threads', type=int, help='threads running the xslt converter')
+    xml.add_argument('--chunksize', type=int, help='files handed to a worker at a time')
+    _add_output_options(xml)
+
+    csv = commands.add_parser('csv', help='convert a CSV file')
+    _add_table_options(csv, ',')
+    _add_output_options(csv)
+
+    txt = commands.add_parser('txt', help='convert a delimited text file')
+    _add_table_options(txt, '~')
+    txt.add_argument('-j', '--workers', type=int, help='worker processes parsing byte ranges of the file')
+    _add_output_options(txt)
+
+    clean = commands.add_parser('clean', help='remove output files whose name was already processed')
+    clean.add_argument('processed_names_file')
+    clean.add_argument('output_folder')
+    clean.add_argument('--file-type', choices=('csv', 'xml'), default='xml')
+    clean.add_argument('--log-file', default='clean_repeated_items.log')
+    clean.add_argument('--dedup-backend', choices=DEDUP_BACKENDS, default='sqlite')
+    clean.add_argument('-j', '--workers', type=int, help='threads reading the output files')
+    return parser
+
+def _progress_bar(args):
+    # tqdm bar fed by the stats passed to the progress callback. It is left
+    # out when stderr is not a terminal, such as under cron.
+    if args.no_progress:
+        return None, None
+    from tqdm import tqdm
+    bar = tqdm(unit='doc' if args.command == 'xml' else 'row', disable=None)
+
+    def progress(stats):
+        if bar.total is None and stats.total is not None:
+            bar.total = stats.total
+        bar.update(stats.seen - bar.n)
+    return bar, progress
+
+def _run_conversion(args):
+    from . import api
+    options = vars(args).copy()
+    command = options.pop('command')
+    show_stats = options.pop('stats')
+    options.pop('no_progress')
+    for name in ('namespaces', 'dtypes'):
+        if options.get(name) is not None:
+            options[name] = dict(options[name])
+    if command == 'xml':
+        convert = api.convert_xml
+        options['directory_path'] = options.pop('directory')
+    else:
+        convert = api.convert_csv if command == 'csv' else api.convert_txt
+        options['file_path'] = options.pop('file')
+
+    bar, options['progress'] = _progress_bar(args)
+    try:
+        result = convert(**options)
+    finally:
+        if bar is not None:
+            bar.close()
+    print(result['message'])
+    if show_stats:
+        print(json.dumps(result['stats'].as_dict()))
+
+def _run_clean(args):
+    summary = clean_repeated_items_batched(
+        args.processed_names_file,
+        args.output_folder,
+        args.file_type,
+        args.log_file,
+        dedup_backend=args.dedup_backend,
+        workers=args.workers,
+    )
+    print(f"Removed {summary['removed']} of {summary['scanned']} files; {summary['errors']} errors logged to {args.log_file}")
+
+def main(argv=None):
+    # Command line entry point; returns the exit status
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        if args.command == 'clean':
+            _run_clean(args)
+        else:
+            _run_conversion(args)
+    except Exception as e:
+        # Converters wrap their failures in plain exceptions; report them all
+        # without a traceback
+        print(f"{parser.prog}: error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,73 @@
+import json
+from typing import Any, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Encoder backends accepted by get_serializer
+JSON_BACKENDS = ('auto', 'json', 'orjson')
+
+# Indentation used for per-record files unless the caller asks otherwise
+DEFAULT_INDENT = 4
+
+# Indentation levels orjson can produce (None is compact)
+ORJSON_INDENTS = (None, 2)
+
+
+class JSONSerializer:
+    # Encodes records to UTF-8 JSON bytes. indent=None gives compact output.
+    # orjson is used when it is importable and supports the indentation
+    # ('auto'), or always ('orjson'); anything orjson rejects, such as integers
+    # wider than 64 bits, falls back to the standard library encoder.
+
+    def __init__(self, indent: Optional[int] = DEFAULT_INDENT, backend: str = 'auto'):
+        if backend not in JSON_BACKENDS:
+            raise ValueError(f"Unsupported JSON backend: {backend}")
+        if backend == 'orjson':
+            if orjson is None:
+                raise ImportError("The orjson backend requires the orjson package")
+            if indent not in ORJSON_INDENTS:
+                raise ValueError("The orjson backend only supports indent=None or indent=2")
+
+        self.indent = indent
+        self.backend = backend
+        self.use_orjson = orjson is not None and backend != 'json' and indent in ORJSON_INDENTS
+        if self.use_orjson:
+            self._options = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+            if indent == 2:
+                self._options |= orjson.OPT_INDENT_2
+
+    def dumps(self, obj: Any) -> bytes:
+        if self.use_orjson:
+            try:
+                return orjson.dumps(obj, option=self._options)
+            except TypeError:
+                pass
+        if self.indent is None:
+            text = json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+        else:
+            text = json.dumps(obj, indent=self.indent, ensure_ascii=False)
+        return text.encode('utf-8')
+
+    def dump(self, obj: Any, fp) -> None:
+        # fp is a file opened in binary mode
+        fp.write(self.dumps(obj))
+
+    def write_file(self, obj: Any, path) -> None:
+        with open(path, 'wb') as f:
+            f.write(self.dumps(obj))
+
+
+_serializers = {}
+
+
+def get_serializer(indent: Optional[int] = DEFAULT_INDENT, backend: str = 'auto') -> JSONSerializer:
+    # Serializers hold no per-call state, so one per configuration is shared
+    key = (indent, backend)
+    serializer = _serializers.get(key)
+    if serializer is None:
+        serializer = JSONSerializer(indent=indent, backend=backend)
+        _serializers[key] = serializer
+    return serializer
@@ -0,0 +1,326 @@
+import os
+import queue
+import threading
+import time
+from typing import Any, Iterable, List, Optional
+from .serialization import JSONSerializer, get_serializer
+
+# Output formats accepted by open_sink
+OUTPUT_FORMATS = ('files', 'ndjson', 'json_array')
+
+# Size of the write buffer for shard files
+SHARD_BUFFER_SIZE = 1024 * 1024
+
+
+class OutputSink:
+    # Destination for converted records. name identifies the record (the
+    # record_N or file stem used for per-record files). Sinks keep the time
+    # spent serializing and writing records, the number of bytes written and
+    # the number of records written.
+
+    def __init__(self):
+        self.seconds = {'serialize': 0.0, 'write': 0.0}
+        self.bytes_written = 0
+        self.records_written = 0
+
+    def write(self, name: str, record: Any) -> None:
+        raise NotImplementedError
+
+    def write_raw(self, name: str, data: bytes) -> None:
+        # Write a record that is already UTF-8 encoded JSON, as it is
+        raise NotImplementedError
+
+    def write_chunks(self, name: str, chunks: Iterable[str]) -> None:
+        # Write a record given as pieces of JSON text, such as those of
+        # iter_element_json. Sinks that can write the pieces as they come
+        # override this; here they are joined and written raw.
+        start = time.perf_counter()
+        data = ''.join(chunks).encode('utf-8')
+        self.seconds['serialize'] += time.perf_counter() - start
+        self.write_raw(name, data)
+
+    @property
+    def paths(self) -> List[str]:
+        # Files written so far
+        return []
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class FilesSink(OutputSink):
+    # One '<name>.json' file per record, as earlier versions wrote them
+
+    def __init__(self, output_dir: str, serializer: Optional[JSONSerializer] = None):
+        super().__init__()
+        self.output_dir = output_dir
+        self.serializer = serializer or get_serializer()
+        self.files = []
+        os.makedirs(output_dir, exist_ok=True)
+
+    @property
+    def paths(self) -> List[str]:
+        return self.files
+
+    def write(self, name: str, record: Any) -> None:
+        start = time.perf_counter()
+        data = self.serializer.dumps(record)
+        self.seconds['serialize'] += time.perf_counter() - start
+        self.write_raw(name, data)
+
+    def write_raw(self, name: str, data: bytes) -> None:
+        start = time.perf_counter()
+        path = os.path.join(self.output_dir, f"{name}.json")
+        with open(path, 'wb') as f:
+            f.write(data)
+        self.seconds['write'] += time.perf_counter() - start
+        self.bytes_written += len(data)
+        self.records_written += 1
+        self.files.append(path)
+
+    def write_chunks(self, name: str, chunks: Iterable[str]) -> None:
+        # Producing and writing the pieces interleave, so all of the time is
+        # counted as serialize time
+        start = time.perf_counter()
+        size = 0
+        path = os.path.join(self.output_dir, f"{name}.json")
+        with open(path, 'wb') as f:
+            for chunk in chunks:
+                data = chunk.encode('utf-8')
+                f.write(data)
+                size += len(data)
+        self.seconds['serialize'] += time.perf_counter() - start
+        self.bytes_written += size
+        self.records_written += 1
+        self.files.append(path)
+
+
+class ShardedSink(OutputSink):
+    # Many records per file, written through a buffered binary stream. A new
+    # shard is started when the current one reaches max_records or would grow
+    # past max_bytes. Records are always encoded compactly.
+    extension = ''
+
+    def __init__(
+        self,
+        output_dir: str,
+        max_records: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        prefix: str = 'part',
+        json_backend: str = 'auto'
+    ):
+        super().__init__()
+        self.output_dir = output_dir
+        self.serializer = get_serializer(indent=None, backend=json_backend)
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.prefix = prefix
+        self.shards = []
+        self._stream = None
+        self._records = 0
+        self._bytes = 0
+        os.makedirs(output_dir, exist_ok=True)
+
+    @property
+    def paths(self) -> List[str]:
+        return self.shards
+
+    def _open_shard(self):
+        path = os.path.join(self.output_dir, f"{self.prefix}-{len(self.shards):05d}{self.extension}")
+        self._stream = open(path, 'wb', buffering=SHARD_BUFFER_SIZE)
+        self.shards.append(path)
+        self._records = 0
+        self._bytes = 0
+        self._start_shard()
+
+    def _close_shard(self):
+        if self._stream is not None:
+            self._end_shard()
+            self._stream.close()
+            self._stream = None
+
+    def _needs_rollover(self, size):
+        if self._stream is None:
+            return True
+        if self.max_records and self._records >= self.max_records:
+            return True
+        return bool(self.max_bytes and self._records and self._bytes + size > self.max_bytes)
+
+    def write(self, name: str, record: Any) -> None:
+        start = time.perf_counter()
+        data = self._encode(record)
+        self.seconds['serialize'] += time.perf_counter() - start
+        self._append(data)
+
+    def write_raw(self, name: str, data: bytes) -> None:
+        # Raw records keep their own formatting, apart from what the shard
+        # format requires
+        self._append(self._raw_record(data.strip()))
+
+    def _append(self, data):
+        start = time.perf_counter()
+        if self._needs_rollover(len(data)):
+            self._close_shard()
+            self._open_shard()
+        self._write_record(data)
+        self._records += 1
+        self._bytes += len(data)
+        self.seconds['write'] += time.perf_counter() - start
+        self.bytes_written += len(data)
+        self.records_written += 1
+
+    def close(self) -> None:
+        self._close_shard()
+
+    def _encode(self, record):
+        return self.serializer.dumps(record)
+
+    def _raw_record(self, data):
+        return data
+
+    def _start_shard(self):
+        pass
+
+    def _write_record(self, data):
+        self._stream.write(data)
+
+    def _end_shard(self):
+        pass
+
+
+class NDJSONSink(ShardedSink):
+    # One compact JSON document per line
+    extension = '.ndjson'
+
+    def _raw_record(self, data):
+        # Line breaks in valid JSON can only be whitespace between tokens
+        return data.replace(b'\r', b'').replace(b'\n', b' ') if b'\n' in data else data
+
+    def _write_record(self, data):
+        self._stream.write(data)
+        self._stream.write(b'\n')
+
+
+class JSONArraySink(ShardedSink):
+    # Each shard is a single JSON array of records
+    extension = '.json'
+
+    def _start_shard(self):
+        self._stream.write(b'[\n')
+
+    def _write_record(self, data):
+        if self._records:
+            self._stream.write(b',\n')
+        self._stream.write(data)
+
+    def _end_shard(self):
+        self._stream.write(b'\n]\n')
+
+
+class BackgroundSink(OutputSink):
+    # Hands records to a writer thread through a bounded queue, so the caller
+    # can parse the next input while earlier records are serialized and
+    # written. write blocks while queue_size records are waiting. The first
+    # error raised by the wrapped sink stops further writes and is raised by
+    # the next write or by close. close always drains the queue and closes the
+    # wrapped sink. Records must not be changed after they are written.
+    # records_queued counts the records handed over; records_written, those
+    # the wrapped sink has written so far.
+
+    def __init__(self, sink: OutputSink, queue_size: int):
+        # Timings and byte counts are those of the wrapped sink
+        self.sink = sink
+        self.records_queued = 0
+        self._queue = queue.Queue(maxsize=max(1, queue_size))
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name='jsonifyer-writer', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            # After an error the queue is still drained so write never blocks
+            if self._error is None:
+                try:
+                    write, name, record = item
+                    write(name, record)
+                except BaseException as e:
+                    self._error = e
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise self._error
+
+    def write(self, name: str, record: Any) -> None:
+        self._raise_error()
+        self._queue.put((self.sink.write, name, record))
+        self.records_queued += 1
+
+    def write_raw(self, name: str, data: bytes) -> None:
+        self._raise_error()
+        self._queue.put((self.sink.write_raw, name, data))
+        self.records_queued += 1
+
+    def write_chunks(self, name: str, chunks: Iterable[str]) -> None:
+        # The pieces are produced by the writer thread
+        self._raise_error()
+        self._queue.put((self.sink.write_chunks, name, chunks))
+        self.records_queued += 1
+
+    def close(self) -> None:
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        try:
+            self.sink.close()
+        finally:
+            self._raise_error()
+
+    @property
+    def paths(self) -> List[str]:
+        return self.sink.paths
+
+    def __getattr__(self, name):
+        # Expose attributes of the wrapped sink, such as shards and seconds
+        if name == 'sink':
+            raise AttributeError(name)
+        return getattr(self.sink, name)
+
+
+def open_sink(
+    output_format: str,
+    output_dir: str,
+    max_records: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+    prefix: str = 'part',
+    indent: Optional[int] = 4,
+    json_backend: str = 'auto',
+    writer_queue_size: Optional[int] = None
+) -> OutputSink:
+    # Create the sink for an output format. indent only applies to per-record
+    # files; shards hold one compact record per entry. With writer_queue_size
+    # records are written by a background thread.
+    if output_format == 'files':
+        sink = FilesSink(output_dir, serializer=get_serializer(indent=indent, backend=json_backend))
+    elif output_format in ('ndjson', 'json_array'):
+        sink_class = NDJSONSink if output_format == 'ndjson' else JSONArraySink
+        sink = sink_class(output_dir, max_records=max_records, max_bytes=max_bytes, prefix=prefix, json_backend=json_backend)
+    else:
+        raise ValueError(f"Unsupported output format: {output_format}")
+    if writer_queue_size:
+        sink = BackgroundSink(sink, writer_queue_size)
+    return sink
+
+
+def completion_message(count: int, output_dir: str, output_format: str = 'files') -> str:
+    if output_format == 'files':
+        return f"Conversion completed: {count} files created in {output_dir}"
+    return f"Conversion completed: {count} records written to {output_dir}"
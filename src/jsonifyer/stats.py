@@ -0,0 +1,77 @@
+import heapq
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# Stages timed during a conversion
+STAGES = ('parse', 'extract', 'serialize', 'write')
+
+# Number of slowest inputs kept by default
+SLOWEST_COUNT = 10
+
+
+def add_time(timings: Dict[str, float], stage: str, seconds: float) -> None:
+    timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+class ConversionStats:
+    # Counters and timings of one conversion run. seen counts the documents,
+    # records or rows read; converted those that gave data, failed those that
+    # did not; duplicates those skipped by the dedup store and written those
+    # handed to the output. total is the number of inputs when it is known
+    # up front. seconds holds the time spent in each stage (summed over worker
+    # processes, so it can exceed the elapsed time); slowest lists the inputs
+    # that took longest to parse and extract.
+
+    def __init__(self, total: Optional[int] = None, slowest_count: int = SLOWEST_COUNT):
+        self.total = total
+        self.seen = 0
+        self.converted = 0
+        self.failed = 0
+        self.duplicates = 0
+        self.written = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.seconds = dict.fromkeys(STAGES, 0.0)
+        self.elapsed = 0.0
+        self.slowest_count = slowest_count
+        self._slowest = []
+        self._start = time.perf_counter()
+
+    def add_timings(self, timings: Dict[str, float]) -> None:
+        for stage, seconds in timings.items():
+            add_time(self.seconds, stage, seconds)
+
+    def add_input_time(self, name: str, seconds: float) -> None:
+        # Keep the slowest_count slowest inputs in a min-heap
+        if len(self._slowest) < self.slowest_count:
+            heapq.heappush(self._slowest, (seconds, name))
+        elif self._slowest and seconds > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, (seconds, name))
+
+    @property
+    def slowest(self) -> List[Tuple[str, float]]:
+        return [(name, seconds) for seconds, name in sorted(self._slowest, reverse=True)]
+
+    def finish(self) -> None:
+        self.elapsed = time.perf_counter() - self._start
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'total': self.total,
+            'seen': self.seen,
+            'converted': self.converted,
+            'failed': self.failed,
+            'duplicates': self.duplicates,
+            'written': self.written,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'seconds': dict(self.seconds),
+            'elapsed': self.elapsed,
+            'slowest': [{'name': name, 'seconds': seconds} for name, seconds in self.slowest],
+        }
+
+    def __repr__(self):
+        return (
+            f"ConversionStats(seen={self.seen}, converted={self.converted}, failed={self.failed}, "
+            f"duplicates={self.duplicates}, written={self.written}, elapsed={self.elapsed:.3f})"
+        )
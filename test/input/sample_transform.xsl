@@ -0,0 +1,18 @@
+<?xml version="1.0" encoding="UTF-8"?>
+<xsl:stylesheet version="1.0"
+    xmlns:xsl="http://www.w3.org/1999/XSL/Transform"
+    xmlns:v3="urn:hl7-org:v3">
+   <xsl:output method="text" encoding="UTF-8"/>
+   <xsl:variable name="product" select="//v3:manufacturedProduct/v3:manufacturedProduct"/>
+   <xsl:template match="/">
+      <xsl:text>{"id": "</xsl:text><xsl:value-of select="v3:document/v3:id/@root"/>
+      <xsl:text>", "title": "</xsl:text><xsl:value-of select="v3:document/v3:title"/>
+      <xsl:text>", "name": "</xsl:text><xsl:value-of select="$product/v3:name"/>
+      <xsl:text>", "ingredients": [</xsl:text>
+      <xsl:for-each select="$product/v3:ingredient">
+         <xsl:if test="position() &gt; 1"><xsl:text>, </xsl:text></xsl:if>
+         <xsl:text>{"name": "</xsl:text><xsl:value-of select="v3:ingredientSubstance/v3:name"/><xsl:text>"}</xsl:text>
+      </xsl:for-each>
+      <xsl:text>]}</xsl:text>
+   </xsl:template>
+</xsl:stylesheet>
@@ -0,0 +1,69 @@
+import unittest
+import json
+import shutil
+import tempfile
+from pathlib import Path
+from src.jsonifyer.main import clean_repeated_items, clean_repeated_items_batched, read_top_level_value
+
+class TestCleanRepeatedItems(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+
+    def write_outputs(self, run):
+        # Names are nested under the same key before the top-level one
+        output_dir = self.temp_dir / run
+        output_dir.mkdir()
+        documents = [
+            {'Proper Name': 'Aspirin', 'id': 1},
+            {'labeler': {'Proper Name': 'Other'}, 'Proper Name': ' ASPIRIN '},
+            {'Proper Name': 'Ibuprofen'},
+            {'id': 4},
+            {'Proper Name': ['not', 'a', 'name']},
+        ]
+        for i, document in enumerate(documents):
+            with open(output_dir / f'item_{i}.json', 'w', encoding='utf-8') as f:
+                json.dump(document, f, indent=4)
+        with open(output_dir / 'item_5.json', 'w', encoding='utf-8') as f:
+            json.dump({'Proper Name': 'ibuprofen'}, f)
+        with open(output_dir / 'broken.json', 'w', encoding='utf-8') as f:
+            f.write('{\n    "Proper Name": "Paracetamol",\n')
+        return output_dir
+
+    def test_batched_summary(self):
+        for workers in (None, 3):
+            output_dir = self.write_outputs(f'run_{workers}')
+            ids_path = str(self.temp_dir / f'ids_{workers}.txt')
+            log_file = str(self.temp_dir / f'clean_{workers}.log')
+            summary = clean_repeated_items_batched(ids_path, str(output_dir), 'csv', log_file,
+                                                   workers=workers, batch_size=2)
+            self.assertEqual(summary, {'scanned': 7, 'removed': 2, 'added': 2, 'unnamed': 1, 'errors': 2})
+            # One of each pair of repeated names is kept, whichever is listed first
+            remaining = {p.name for p in output_dir.iterdir()}
+            self.assertEqual(len(remaining), 5)
+            self.assertLessEqual({'broken.json', 'item_3.json', 'item_4.json'}, remaining)
+            with open(log_file, 'r', encoding='utf-8') as f:
+                log = f.read()
+            self.assertEqual(log.count('Removed duplicate'), 2)
+            self.assertEqual(log.count('Error processing'), 2)
+            with open(ids_path, 'r', encoding='utf-8') as f:
+                self.assertEqual(sorted(f.read().split()), ['aspirin', 'ibuprofen'])
+
+    def test_matches_count(self):
+        output_dir = self.write_outputs('count')
+        removed = clean_repeated_items(str(self.temp_dir / 'ids.txt'), str(output_dir), 'csv',
+                                       str(self.temp_dir / 'clean.log'))
+        self.assertEqual(removed, 2)
+
+    def test_read_top_level_value(self):
+        path = self.temp_dir / 'item.json'
+        document = {'nested': {'name': 'inner'}, 'list': [{'name': 'x'}], 'name': 'outer, "quoted"', 'last': None}
+        for indent in (None, 2, 4):
+            path.write_text(json.dumps(document, indent=indent), encoding='utf-8')
+            self.assertEqual(read_top_level_value(str(path), 'name'), 'outer, "quoted"')
+            self.assertEqual(read_top_level_value(str(path), 'nested'), {'name': 'inner'})
+            self.assertIsNone(read_top_level_value(str(path), 'last'))
+            self.assertIsNone(read_top_level_value(str(path), 'missing'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+import io
+import json
+import shutil
+import tempfile
+import unittest.mock
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+from src.jsonifyer.main import main
+
+class FakeBar:
+    # Records what the CLI reports to tqdm
+    instances = []
+
+    def __init__(self, **options):
+        self.options = options
+        self.total = None
+        self.n = 0
+        self.closed = False
+        FakeBar.instances.append(self)
+
+    def update(self, n):
+        self.n += n
+
+    def close(self):
+        self.closed = True
+
+class TestCommandLine(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        FakeBar.instances = []
+
+    def run_main(self, *argv):
+        with io.StringIO() as out, io.StringIO() as err, redirect_stdout(out), redirect_stderr(err):
+            status = main([str(arg) for arg in argv])
+            return status, out.getvalue(), err.getvalue()
+
+    def test_xml_with_progress(self):
+        field_map = self.temp_dir / 'fields.json'
+        field_map.write_text(json.dumps({'name': './/manufacturedProduct/manufacturedProduct/name'}))
+        output_dir = self.temp_dir / 'xml'
+        with unittest.mock.patch('tqdm.tqdm', FakeBar):
+            status, out, _ = self.run_main(
+                'xml', 'test/input', '-o', output_dir, '--field-map', field_map,
+                '--namespace', 'ns=urn:hl7-org:v3', '--output-format', 'ndjson', '--stats'
+            )
+        self.assertEqual(status, 0)
+        message, stats = out.splitlines()
+        self.assertEqual(message, f"Conversion completed: 1 records written to {output_dir}")
+        self.assertEqual(json.loads(stats)['written'], 1)
+        bar, = FakeBar.instances
+        self.assertEqual((bar.total, bar.n, bar.closed), (1, 1, True))
+        with open(output_dir / 'documents-00000.ndjson', 'r', encoding='utf-8') as f:
+            self.assertEqual(json.loads(f.readline()), {'name': 'TestMed'})
+
+    def test_csv_dedup_and_clean(self):
+        ids_path = self.temp_dir / 'ids.txt'
+        output_dir = self.temp_dir / 'csv'
+        options = ['--repeated-path', ids_path, '--repeated-item', 'Name', '--chunksize', 2, '--no-progress']
+        status, out, _ = self.run_main('csv', 'test/input/sample_data.csv', '-o', output_dir, *options)
+        self.assertEqual((status, out), (0, f"Conversion completed: 3 files created in {output_dir}\n"))
+        self.assertEqual(FakeBar.instances, [])
+
+        # The CSV files have no 'Proper Name' key, so nothing is removed
+        log_file = self.temp_dir / 'clean.log'
+        status, out, _ = self.run_main('clean', self.temp_dir / 'names.txt', output_dir,
+                                       '--file-type', 'csv', '--log-file', log_file)
+        self.assertEqual((status, out), (0, f"Removed 0 of 3 files; 0 errors logged to {log_file}\n"))
+
+    def test_errors(self):
+        status, _, err = self.run_main('txt', self.temp_dir / 'missing.txt', '--no-progress')
+        self.assertEqual(status, 1)
+        self.assertIn("Input file not found", err)
+        status, out, err = self.run_main('csv', 'test/input/sample_data.csv', '-o', self.temp_dir / 'csv',
+                                         '--fields', 'nope', '--no-progress')
+        self.assertEqual((status, out), (1, ''))
+        self.assertTrue(err.startswith("jsonify: error: Error converting test/input/sample_data.csv"), err)
+        with self.assertRaises(SystemExit) as raised:
+            self.run_main('xml', 'test/input', '--namespace', 'no-value')
+        self.assertEqual(raised.exception.code, 2)
+        with self.assertRaises(SystemExit) as raised:
+            self.run_main('csv', 'test/input/sample_data.csv', '--engine', 'fast')
+        self.assertEqual(raised.exception.code, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import unittest
+import io
+import shutil
+import tempfile
+import unittest.mock
+from pathlib import Path
+from src.jsonifyer.api import convert_xml, convert_csv
+from src.jsonifyer.cache import ConversionCache
+
+class TestConversionCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        self.cache_dir = self.temp_dir / 'cache'
+        self.input_dir = self.temp_dir / 'input'
+        self.input_dir.mkdir()
+        with open('test/input/sample_data.xml', 'r', encoding='utf-8') as f:
+            self.content = f.read()
+        for name in ['TestMed', 'OtherMed', 'ThirdMed']:
+            self.write_label(name, name)
+
+    def write_label(self, file_name, name):
+        with open(self.input_dir / f'{file_name}.xml', 'w', encoding='utf-8') as f:
+            f.write(self.content.replace('<name>TestMed</name>', f'<name>{name}</name>'))
+
+    def convert(self, run, **options):
+        output_dir = self.temp_dir / run
+        with io.StringIO() as buf, unittest.mock.patch('sys.stdout', buf):
+            result = convert_xml(
+                directory_path=str(self.input_dir),
+                output_path=str(output_dir),
+                namespaces={'ns': 'urn:hl7-org:v3'},
+                root_tag='document',
+                cache_dir=str(self.cache_dir),
+                **options
+            )
+        files = {p.name: p.read_bytes() for p in output_dir.glob('*.json')}
+        return result, files
+
+    def test_xml_unchanged_files_are_reused(self):
+        field_map = {'id': './/id/@root', 'name': './/manufacturedProduct/manufacturedProduct/name'}
+        result, first = self.convert('first', field_map=field_map)
+        self.assertEqual(result['cache'], {'hits': 0, 'misses': 3})
+
+        result, second = self.convert('second', field_map=field_map)
+        self.assertEqual(result['cache'], {'hits': 3, 'misses': 0})
+        self.assertIn("Conversion completed: 3 files", result['message'])
+        self.assertEqual(second, first)
+
+        # Changing one file or the configuration only misses what changed
+        self.write_label('OtherMed', 'ChangedMed')
+        result, third = self.convert('third', field_map=field_map)
+        self.assertEqual(result['cache'], {'hits': 2, 'misses': 1})
+        self.assertIn(b'ChangedMed', third['OtherMed.json'])
+        result, _ = self.convert('fourth', field_map={'id': './/id/@root'})
+        self.assertEqual(result['cache'], {'hits': 0, 'misses': 3})
+
+    def test_xml_records_are_reused(self):
+        with open(self.input_dir / 'TestMed.xml', 'r', encoding='utf-8') as f:
+            document = f.read().split('?>', 1)[1].replace(' xmlns="urn:hl7-org:v3"', '')
+        with open(self.input_dir / 'bulk.xml', 'w', encoding='utf-8') as f:
+            f.write('<documents xmlns="urn:hl7-org:v3">' + document * 3 + '</documents>')
+        options = dict(field_map={'name': './/manufacturedProduct/manufacturedProduct/name'}, record_tag='document')
+        _, first = self.convert('first', **options)
+        result, second = self.convert('second', **options)
+        self.assertEqual(result['cache'], {'hits': 4, 'misses': 0})
+        self.assertEqual(second, first)
+        self.assertIn('bulk_3.json', second)
+
+    def test_file_hashes_are_remembered(self):
+        with ConversionCache(str(self.cache_dir), {'converter': 'python'}) as cache:
+            path = self.input_dir / 'TestMed.xml'
+            key = cache.key(path)
+            with unittest.mock.patch('src.jsonifyer.cache.file_digest') as file_digest:
+                self.assertEqual(cache.key(path), key)
+                file_digest.assert_not_called()
+
+    def test_csv_unchanged_file_is_skipped(self):
+        csv_path = self.temp_dir / 'people.csv'
+        shutil.copy('test/input/sample_data.csv', csv_path)
+        options = dict(file_path=str(csv_path), output_path=str(self.temp_dir / 'csv'), cache_dir=str(self.cache_dir))
+        with io.StringIO() as buf, unittest.mock.patch('sys.stdout', buf):
+            first = convert_csv(**options)
+            second = convert_csv(**options)
+            with open(csv_path, 'a', encoding='utf-8') as f:
+                f.write('\nAna Costa,41,Faro,Nurse,Care')
+            third = convert_csv(**options)
+        self.assertIn("Conversion completed: 3 files", first['message'])
+        self.assertIn("Conversion skipped", second['message'])
+        self.assertEqual(second['cache'], {'hits': 1, 'misses': 0})
+        self.assertIn("Conversion completed: 4 files", third['message'])
+
+    def test_csv_missing_or_changed_outputs_are_written_again(self):
+        csv_path = self.temp_dir / 'people.csv'
+        shutil.copy('test/input/sample_data.csv', csv_path)
+        for output_format, name in (('files', 'record_2.json'), ('ndjson', 'records-00000.ndjson')):
+            with self.subTest(output_format=output_format):
+                output_dir = self.temp_dir / output_format
+                options = dict(file_path=str(csv_path), output_path=str(output_dir),
+                               cache_dir=str(self.cache_dir), output_format=output_format)
+                with io.StringIO() as buf, unittest.mock.patch('sys.stdout', buf):
+                    convert_csv(**options)
+                    expected = (output_dir / name).read_bytes()
+                    self.assertIn("Conversion skipped", convert_csv(**options)['message'])
+
+                    (output_dir / name).unlink()
+                    result = convert_csv(**options)
+                    self.assertIn("Conversion completed: 3", result['message'])
+                    self.assertEqual(result['cache'], {'hits': 0, 'misses': 1})
+                    self.assertEqual((output_dir / name).read_bytes(), expected)
+
+                    (output_dir / name).write_bytes(b'{}')
+                    self.assertIn("Conversion completed: 3", convert_csv(**options)['message'])
+                    self.assertEqual((output_dir / name).read_bytes(), expected)
+                    self.assertIn("Conversion skipped", convert_csv(**options)['message'])
+
+if __name__ == '__main__':
+    unittest.main()
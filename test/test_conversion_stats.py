@@ -0,0 +1,75 @@
+import unittest
+import io
+import shutil
+import tempfile
+import unittest.mock
+from pathlib import Path
+from src.jsonifyer.api import convert_xml, convert_csv
+from src.jsonifyer.stats import ConversionStats, STAGES
+
+class TestConversionStats(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        self.input_dir = self.temp_dir / 'input'
+        self.input_dir.mkdir()
+        with open('test/input/sample_data.xml', 'r', encoding='utf-8') as f:
+            content = f.read()
+        for i, name in enumerate(['TestMed', 'OtherMed', 'TestMed', 'ThirdMed']):
+            with open(self.input_dir / f'label_{i}.xml', 'w', encoding='utf-8') as f:
+                f.write(content.replace('<name>TestMed</name>', f'<name>{name}</name>'))
+
+    def test_xml_stats_and_progress(self):
+        seen = []
+        with io.StringIO() as buf, unittest.mock.patch('sys.stdout', buf):
+            result = convert_xml(
+                directory_path=str(self.input_dir),
+                repeated_path=str(self.temp_dir / 'ids.txt'),
+                repeated_item='name',
+                output_path=str(self.temp_dir / 'output'),
+                field_map={'name': './/manufacturedProduct/manufacturedProduct/name'},
+                progress=lambda stats: seen.append(stats.seen)
+            )
+            output = buf.getvalue()
+
+        # Results are only printed when verbose is set
+        self.assertEqual(output, '')
+        self.assertEqual(seen, [1, 2, 3, 4])
+        stats = result['stats']
+        self.assertEqual((stats.total, stats.seen, stats.converted, stats.failed), (4, 4, 4, 0))
+        self.assertEqual((stats.duplicates, stats.written), (1, 3))
+        self.assertEqual(stats.bytes_in, sum(p.stat().st_size for p in self.input_dir.iterdir()))
+        self.assertEqual(stats.bytes_out, sum(p.stat().st_size for p in (self.temp_dir / 'output').iterdir()))
+        self.assertEqual(set(stats.seconds), set(STAGES))
+        self.assertGreater(stats.seconds['parse'], 0)
+        self.assertEqual(len(stats.slowest), 4)
+        self.assertIn("Conversion completed: 3 files", result['message'])
+
+        with io.StringIO() as buf, unittest.mock.patch('sys.stdout', buf):
+            convert_xml(directory_path=str(self.input_dir), fields=['title'], verbose=True)
+            self.assertEqual(buf.getvalue().count('Test Medication Label'), 4)
+
+    def test_csv_stats(self):
+        csv_path = self.temp_dir / 'people.csv'
+        csv_path.write_text('Id,Name\n1,Ana\n2,Rui\n1,Ana again\n\n3,Eva\n', encoding='utf-8')
+        result = convert_csv(
+            file_path=str(csv_path),
+            repeated_path=str(self.temp_dir / 'ids.txt'),
+            repeated_item='Id',
+            output_path=str(self.temp_dir / 'csv'),
+            output_format='ndjson',
+            chunksize=2
+        )
+        stats = result['stats'].as_dict()
+        self.assertEqual((stats['seen'], stats['duplicates'], stats['converted'], stats['written']), (4, 1, 3, 3))
+        self.assertEqual(stats['bytes_in'], csv_path.stat().st_size)
+        self.assertEqual(stats['bytes_out'], len((self.temp_dir / 'csv' / 'records-00000.ndjson').read_bytes()) - 3)
+
+    def test_slowest_inputs(self):
+        stats = ConversionStats(slowest_count=2)
+        for name, seconds in (('a', 0.3), ('b', 0.1), ('c', 0.5), ('d', 0.2)):
+            stats.add_input_time(name, seconds)
+        self.assertEqual(stats.slowest, [('c', 0.5), ('a', 0.3)])
+
+if __name__ == '__main__':
+    unittest.main()
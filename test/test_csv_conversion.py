@@ -1,7 +1,15 @@
 import unittest
+import unittest.mock
+import io
 import json
+import shutil
+import tempfile
+import tracemalloc
 from pathlib import Path
+import pandas as pd
 from src.jsonifyer.api import convert_csv
+from src.jsonifyer.converter.csv_converter import _read_frame
+from src.jsonifyer.converter.python_converter import convert_csv as python_convert_csv
 
 class TestCSVConversion(unittest.TestCase):
     def setUp(self):
@@ -78,5 +86,128 @@ class TestCSVConversion(unittest.TestCase):
                 output_path=self.output_dir
             )
 
+    def test_csv_chunked_conversion(self):
+        temp_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, temp_dir, ignore_errors=True)
+        input_file = temp_dir / 'people.csv'
+        with open(self.csv_path, 'r', encoding='utf-8') as f:
+            header, *rows = f.read().splitlines()
+        # Add an empty column and rows that are only filled in some chunks
+        rows = [row + ',' for row in rows] * 4
+        rows[1] = ',' * 5
+        rows[5] = ',,Faro,,,'
+        with open(input_file, 'w', encoding='utf-8') as f:
+            f.write('\n'.join([header + ',Notes'] + rows) + '\n')
+
+        outputs = {}
+        for chunksize in (None, 2, 5):
+            output_dir = temp_dir / f'output_{chunksize}'
+            result = convert_csv(
+                file_path=str(input_file),
+                output_path=str(output_dir),
+                delimiter=",",
+                chunksize=chunksize
+            )
+            self.assertIn("Conversion completed: 11 files", result["message"])
+            outputs[chunksize] = {p.name: p.read_bytes() for p in output_dir.glob('*.json')}
+
+        self.assertEqual(outputs[2], outputs[None])
+        self.assertEqual(outputs[5], outputs[None])
+        with open(temp_dir / 'output_2' / 'record_5.json', 'r', encoding='utf-8') as f:
+            record = f.read()
+        self.assertNotIn('Notes', record)
+        self.assertIn('Faro', record)
+
+    def test_csv_dedup_keeps_first_occurrence(self):
+        temp_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, temp_dir, ignore_errors=True)
+        input_file = temp_dir / 'ids.csv'
+        rows = ['A7,first', 'A8,second', 'A7,repeat', ',no id', 'A9,third', 'A8,repeat']
+        with open(input_file, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(['Id,Label'] + rows) + '\n')
+
+        outputs = {}
+        for chunksize in (None, 2):
+            output_dir = temp_dir / f'output_{chunksize}'
+            repeated_path = temp_dir / f'processed_{chunksize}.txt'
+            repeated_path.write_text('A9\n', encoding='utf-8')
+            result = convert_csv(
+                file_path=str(input_file),
+                repeated_path=str(repeated_path),
+                repeated_item="Id",
+                output_path=str(output_dir),
+                chunksize=chunksize
+            )
+            outputs[chunksize] = {p.name: json.loads(p.read_text(encoding='utf-8')) for p in output_dir.glob('*.json')}
+
+        self.assertIn("Conversion completed: 2 files", result["message"])
+        self.assertEqual(outputs[2], outputs[None])
+        self.assertEqual(outputs[None], {
+            'record_1.json': {"Id": "A7", "Label": "first"},
+            'record_2.json': {"Id": "A8", "Label": "second"}
+        })
+        self.assertEqual(repeated_path.read_text(encoding='utf-8').split(), ['A9', 'A7', 'A8'])
+
+    def test_csv_dtypes_and_missing_values(self):
+        temp_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, temp_dir, ignore_errors=True)
+        input_file = temp_dir / 'codes.csv'
+        input_file.write_text('Code,Score,Label\n007,1.5,a\n010,,\n', encoding='utf-8')
+        result = convert_csv(
+            file_path=str(input_file),
+            output_path=str(temp_dir / 'output'),
+            dtypes={"Code": str}
+        )
+        self.assertIn("Conversion completed: 2 files", result["message"])
+        with open(temp_dir / 'output' / 'record_2.json', 'r', encoding='utf-8') as f:
+            record = json.load(f)
+        # Missing values are written as null, not NaN
+        self.assertEqual(record, {"Code": "010", "Score": None, "Label": None})
+
+    def test_csv_invalid_engine(self):
+        with self.assertRaises(ValueError):
+            convert_csv(file_path=self.csv_path, output_path=self.output_dir, engine="fast")
+        with self.assertRaises(ValueError):
+            convert_csv(file_path=self.csv_path, output_path=self.output_dir, engine="pyarrow", chunksize=2)
+
+    def test_csv_column_projection_memory(self):
+        temp_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, temp_dir, ignore_errors=True)
+        input_file = temp_dir / 'wide.csv'
+        columns = [f"col{i}" for i in range(20)]
+        with open(input_file, 'w', encoding='utf-8') as f:
+            f.write(','.join(columns) + '\n')
+            for row in range(5000):
+                f.write(','.join(f"value {row} {i}" for i in range(20)) + '\n')
+        fields = ["col3", "col1"]
+
+        def peak(read):
+            tracemalloc.start()
+            try:
+                frame = read()
+                return frame, tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        full, full_peak = peak(lambda: pd.read_csv(input_file)[fields])
+        projected, projected_peak = peak(lambda: _read_frame(str(input_file), fields))
+        self.assertEqual(list(projected.columns), fields)
+        self.assertTrue(projected.equals(full))
+        # Only the requested columns are parsed
+        self.assertLess(projected_peak, full_peak / 4)
+
+    def test_python_convert_csv_verbose(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for verbose in (False, True):
+                output_dir = Path(tmp) / str(verbose)
+                with io.StringIO() as buf, unittest.mock.patch('sys.stdout', buf):
+                    created = python_convert_csv(self.csv_path, str(output_dir), skiprows=1, verbose=verbose)
+                    printed = buf.getvalue()
+                self.assertEqual(len(created), 3)
+                if verbose:
+                    self.assertIn("Created 3 JSON files", printed)
+                else:
+                    self.assertEqual(printed, "")
+
 if __name__ == '__main__':
     unittest.main()
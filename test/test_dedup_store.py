@@ -0,0 +1,119 @@
+import unittest
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from src.jsonifyer.api import convert_csv
+from src.jsonifyer.dedup import open_dedup_store, SQLiteDedupStore, TextFileDedupStore
+from src.jsonifyer.main import clean_repeated_items, normalize_name
+
+class TestDedupStore(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.ids_path = os.path.join(self.temp_dir, 'ids.txt')
+        with open(self.ids_path, 'w', encoding='utf-8') as f:
+            f.write('first\nsecond\n\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_sqlite_sidecar_imports_text_file(self):
+        with open_dedup_store(self.ids_path) as store:
+            self.assertIsInstance(store, SQLiteDedupStore)
+            self.assertIn('first', store)
+            self.assertNotIn('third', store)
+            store.add('third')
+            self.assertIn('third', store)
+            self.assertEqual(store.contains_many(['first', 'third', 'fourth']), {'first', 'third'})
+
+        self.assertTrue(os.path.exists(self.ids_path + '.sqlite'))
+        with open(self.ids_path, 'r', encoding='utf-8') as f:
+            self.assertEqual(f.read().split(), ['first', 'second', 'third'])
+
+        # Lines appended by other tools are picked up on the next open
+        with open(self.ids_path, 'a', encoding='utf-8') as f:
+            f.write('fourth\n')
+        with open_dedup_store(self.ids_path) as store:
+            self.assertIn('third', store)
+            self.assertIn('fourth', store)
+
+    def test_sqlite_sidecar_rebuilds_rewritten_text_file(self):
+        # Rewritten with content at least as long as what was imported
+        with open(self.ids_path, 'w', encoding='utf-8') as f:
+            f.write('alpha\n')
+        open_dedup_store(self.ids_path).close()
+        with open(self.ids_path, 'w', encoding='utf-8') as f:
+            f.write('beta-long-id\n')
+        with open_dedup_store(self.ids_path) as store:
+            self.assertEqual(store.contains_many(['alpha', 'beta-long-id', 'ong-id']), {'beta-long-id'})
+
+        # Only the end of a long file changed
+        lines = [f'id-{i:06d}' for i in range(20000)]
+        with open(self.ids_path, 'w', encoding='utf-8') as f:
+            f.write(''.join(f'{line}\n' for line in lines))
+        with open_dedup_store(self.ids_path) as store:
+            store.add('added')
+        lines[-1] = 'id-rewritten'
+        with open(self.ids_path, 'w', encoding='utf-8') as f:
+            f.write(''.join(f'{line}\n' for line in lines + ['added']))
+        with open_dedup_store(self.ids_path) as store:
+            self.assertEqual(store.contains_many(['id-019999', 'id-rewritten', 'added', 'id-000000']),
+                             {'id-rewritten', 'added', 'id-000000'})
+
+    def test_sqlite_database_path(self):
+        db_path = os.path.join(self.temp_dir, 'ids.sqlite')
+        with open_dedup_store(db_path) as store:
+            self.assertEqual(store.import_text(self.ids_path), 2)
+            store.add('third')
+        with open_dedup_store(db_path) as store:
+            self.assertEqual(store.contains_many(['first', 'second', 'third', 'x']), {'first', 'second', 'third'})
+
+    def test_text_backend(self):
+        with open_dedup_store(self.ids_path, backend='text') as store:
+            self.assertIsInstance(store, TextFileDedupStore)
+            self.assertIn('second', store)
+            store.add('third')
+        with open(self.ids_path, 'r', encoding='utf-8') as f:
+            self.assertEqual(f.read().split(), ['first', 'second', 'third'])
+
+    def test_csv_conversion_skips_known_ids(self):
+        output_dir = os.path.join(self.temp_dir, 'output')
+        with open(self.ids_path, 'w', encoding='utf-8') as f:
+            f.write('Maria Silva\n')
+        result = convert_csv(
+            file_path='test/input/sample_data.csv',
+            repeated_path=self.ids_path,
+            repeated_item='Name',
+            output_path=output_dir
+        )
+        self.assertIn("Conversion completed: 2 files", result["message"])
+        with open(self.ids_path, 'r', encoding='utf-8') as f:
+            self.assertEqual(f.read().splitlines(), ['Maria Silva', 'John Doe', 'Pedro Santos'])
+
+        # A second run finds every name already processed
+        result = convert_csv(
+            file_path='test/input/sample_data.csv',
+            repeated_path=self.ids_path,
+            repeated_item='Name',
+            output_path=output_dir
+        )
+        self.assertIn("Conversion completed: 0 files", result["message"])
+
+    def test_clean_repeated_items(self):
+        output_dir = Path(self.temp_dir) / 'output'
+        output_dir.mkdir()
+        for i, name in enumerate(['First', 'Other', ' other ', 'New']):
+            with open(output_dir / f'item_{i}.json', 'w', encoding='utf-8') as f:
+                json.dump({'name': name}, f)
+        log_file = os.path.join(self.temp_dir, 'clean.log')
+
+        removed = clean_repeated_items(self.ids_path, str(output_dir), 'xml', log_file)
+        self.assertEqual(removed, 2)
+        remaining = sorted(normalize_name(json.loads(p.read_text())['name']) for p in output_dir.glob('*.json'))
+        self.assertEqual(remaining, ['new', 'other'])
+        with open(self.ids_path, 'r', encoding='utf-8') as f:
+            self.assertEqual(sorted(f.read().split()), ['first', 'new', 'other', 'second'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import unittest
+import io
+import json
+import shutil
+import tempfile
+import unittest.mock
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from src.jsonifyer.api import convert_xml
+from src.jsonifyer.converter.python_converter import (
+    DocumentJSON, ExtractionPlan, extract_element_data, iter_element_json, load_lxml
+)
+
+# Repeated tags, a child named like an attribute or like 'text', and children
+# without any data
+ODD_XML = (
+    '<r a="1"><!--comment--><text>t<a>x</a></text><a/><b><c/></b>'
+    '<a z=""/><d> </d><a>y<e k="v"/></a></r>'
+)
+
+def dumps(data, indent):
+    if indent is None:
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    return json.dumps(data, indent=indent, ensure_ascii=False)
+
+class TestElementJSON(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+
+    def roots(self):
+        with open('test/input/sample_data.xml', 'rb') as f:
+            sample = f.read()
+        etree = load_lxml()
+        for content in (sample, ODD_XML.encode('utf-8')):
+            yield ET.fromstring(content)
+            yield etree.fromstring(content)
+
+    def test_matches_json_dumps(self):
+        for root in self.roots():
+            data = extract_element_data(root)
+            for indent in (4, 2, 0, None):
+                with self.subTest(root=root.tag, backend=type(root).__module__, indent=indent):
+                    self.assertEqual(''.join(iter_element_json(root, indent)), dumps(data, indent))
+
+        root = ET.fromstring(ODD_XML)
+        self.assertEqual(extract_element_data(root), {
+            'a': ['1', {'z': ''}, {'text': 'y', 'e': {'k': 'v'}}],
+            'text': {'text': 't', 'a': {'text': 'x'}}
+        })
+        self.assertEqual(''.join(iter_element_json(ET.fromstring('<r><x/></r>'))), '{}')
+        self.assertEqual(''.join(DocumentJSON(None).iter_json()), '{}')
+
+    def test_deep_document(self):
+        depth = 5000
+        root = ET.fromstring('<a>' * depth + 'x' + '</a>' * depth)
+        data = extract_element_data(root)
+        for _ in range(depth - 1):
+            data = data['a']
+        self.assertEqual(data, {'text': 'x'})
+        text = ''.join(iter_element_json(root, None))
+        self.assertEqual(text, '{"a":' * (depth - 1) + '{"text":"x"}' + '}' * (depth - 1))
+
+    def test_convert_xml_streams_whole_documents(self):
+        input_dir = self.temp_dir / 'input'
+        input_dir.mkdir()
+        shutil.copy('test/input/sample_data.xml', input_dir / 'label.xml')
+        (input_dir / 'odd.xml').write_text(ODD_XML, encoding='utf-8')
+        (input_dir / 'empty.xml').write_text('<r><x/></r>', encoding='utf-8')
+
+        # Whole documents are written without building their dicts
+        with unittest.mock.patch.object(ExtractionPlan, 'run', side_effect=AssertionError):
+            result = convert_xml(directory_path=str(input_dir), output_path=str(self.temp_dir / 'output'))
+        stats = result['stats']
+        self.assertEqual((stats.converted, stats.failed, stats.written), (2, 1, 3))
+        for path in input_dir.iterdir():
+            expected = dumps(extract_element_data(ET.parse(path).getroot()), 4).encode('utf-8')
+            self.assertEqual((self.temp_dir / 'output' / f'{path.stem}.json').read_bytes(), expected)
+        self.assertEqual(stats.bytes_out, sum(p.stat().st_size for p in (self.temp_dir / 'output').iterdir()))
+
+        # Converted dicts are still built when they are needed
+        with io.StringIO() as buf, unittest.mock.patch('sys.stdout', buf):
+            convert_xml(directory_path=str(input_dir), output_path=str(self.temp_dir / 'verbose'), verbose=True)
+            self.assertIn("'a': ['1'", buf.getvalue())
+        for path in (self.temp_dir / 'output').iterdir():
+            self.assertEqual((self.temp_dir / 'verbose' / path.name).read_bytes(), path.read_bytes())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+# Generous bound for importing the package and its API; the heavy converter
+# dependencies alone take several times longer
+IMPORT_BUDGET_SECONDS = 0.25
+
+def run_python(code):
+    # Run code in a fresh interpreter, which prints a JSON result
+    script = f"import sys, json, time\nsys.path.insert(0, {SRC_DIR!r})\n{code}"
+    output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True).stdout
+    return json.loads(output)
+
+def loaded(names):
+    return f"[name for name in {names!r} if name in sys.modules]"
+
+class TestLazyImports(unittest.TestCase):
+    def test_import_time_budget(self):
+        result = run_python(
+            "start = time.perf_counter()\n"
+            "from jsonifyer import convert_xml, convert_csv, convert_txt\n"
+            "elapsed = time.perf_counter() - start\n"
+            f"print(json.dumps({{'elapsed': elapsed, 'loaded': {loaded(['pandas', 'lxml', 'numpy'])}}}))"
+        )
+        self.assertEqual(result['loaded'], [])
+        self.assertLess(result['elapsed'], IMPORT_BUDGET_SECONDS)
+
+    def test_xml_conversion_does_not_load_pandas(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            result = run_python(
+                "import jsonifyer\n"
+                f"jsonifyer.convert_xml(directory_path='test/input', output_path={temp_dir!r}, fields=['title'])\n"
+                f"print(json.dumps({loaded(['pandas', 'lxml'])}))"
+            )
+            self.assertEqual(result, [])
+            self.assertTrue(os.path.exists(os.path.join(temp_dir, 'sample_data.json')))
+
+    def test_xslt_logger_level_is_kept(self):
+        # Importing the converter on first use leaves the caller's logging alone
+        with tempfile.TemporaryDirectory() as temp_dir:
+            result = run_python(
+                "import logging, jsonifyer\n"
+                "logger = logging.getLogger('jsonifyer.converter.xslt_converter')\n"
+                "logger.setLevel(logging.WARNING)\n"
+                f"jsonifyer.convert_xml(directory_path='test/input', output_path={temp_dir!r}, "
+                "converter='xslt', xslt_path='test/input/sample_transform.xsl')\n"
+                "print(json.dumps([logger.level, [type(h).__name__ for h in logger.handlers]]))"
+            )
+            self.assertEqual(result, [logging.WARNING, ['NullHandler']])
+
+    def test_python_converter_xslt_reexport(self):
+        result = run_python(
+            "from jsonifyer.converter import python_converter\n"
+            f"before = {loaded(['lxml'])}\n"
+            "from jsonifyer.converter.python_converter import apply_xslt_to_xml\n"
+            "from jsonifyer.converter import xslt_converter\n"
+            "print(json.dumps([before, apply_xslt_to_xml is xslt_converter.apply_xslt_to_xml]))"
+        )
+        self.assertEqual(result, [[], True])
+
+    def test_unknown_attribute(self):
+        import src.jsonifyer as jsonifyer
+        self.assertIn('convert_xml', dir(jsonifyer))
+        with self.assertRaises(AttributeError):
+            jsonifyer.convert_json
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+import unittest
+import io
+import json
+import shutil
+import tempfile
+import threading
+import unittest.mock
+from pathlib import Path
+from src.jsonifyer.api import convert_csv, convert_txt, convert_xml
+from src.jsonifyer.sinks import open_sink, OutputSink, BackgroundSink, NDJSONSink, JSONArraySink
+
+class TestOutputSinks(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.records = [{'id': i, 'name': f'Item {i}', 'note': 'çã'} for i in range(7)]
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_ndjson_rollover_by_records(self):
+        with open_sink('ndjson', str(self.temp_dir), max_records=3) as sink:
+            self.assertIsInstance(sink, NDJSONSink)
+            for record in self.records:
+                sink.write(f"record_{record['id']}", record)
+        self.assertEqual([Path(p).name for p in sink.shards], ['part-00000.ndjson', 'part-00001.ndjson', 'part-00002.ndjson'])
+
+        loaded = []
+        for shard in sink.shards:
+            with open(shard, 'r', encoding='utf-8') as f:
+                loaded.extend(json.loads(line) for line in f)
+        self.assertEqual(loaded, self.records)
+
+    def test_json_array_rollover_by_bytes(self):
+        record_size = len(json.dumps(self.records[0], ensure_ascii=False).encode('utf-8'))
+        with open_sink('json_array', str(self.temp_dir), max_bytes=record_size * 2) as sink:
+            self.assertIsInstance(sink, JSONArraySink)
+            for record in self.records:
+                sink.write(f"record_{record['id']}", record)
+        self.assertEqual(len(sink.shards), 4)
+
+        loaded = []
+        for shard in sink.shards:
+            with open(shard, 'r', encoding='utf-8') as f:
+                loaded.extend(json.load(f))
+        self.assertEqual(loaded, self.records)
+
+    def test_invalid_format(self):
+        with self.assertRaises(ValueError):
+            open_sink('xml', str(self.temp_dir))
+
+    def test_csv_and_txt_to_ndjson(self):
+        for convert, path, delimiter in ((convert_csv, 'test/input/sample_data.csv', ','), (convert_txt, 'test/input/sample_data.txt', '~')):
+            output_dir = self.temp_dir / delimiter
+            result = convert(file_path=path, output_path=str(output_dir), delimiter=delimiter, output_format='ndjson')
+            self.assertIn("Conversion completed: 3 records", result["message"])
+            with open(output_dir / 'records-00000.ndjson', 'r', encoding='utf-8') as f:
+                names = [json.loads(line)['Name'] for line in f]
+            self.assertEqual(names, ['John Doe', 'Maria Silva', 'Pedro Santos'])
+
+    def test_xml_to_json_array(self):
+        input_dir = self.temp_dir / 'input'
+        input_dir.mkdir()
+        for name in ('a.xml', 'b.xml', 'c.xml'):
+            shutil.copy('test/input/sample_data.xml', input_dir / name)
+        output_dir = self.temp_dir / 'output'
+        with io.StringIO() as buf, unittest.mock.patch('sys.stdout', buf):
+            result = convert_xml(
+                directory_path=str(input_dir),
+                output_path=str(output_dir),
+                fields=['title'],
+                output_format='json_array',
+                max_records_per_shard=2
+            )
+        self.assertIn("Conversion completed: 3 records", result["message"])
+        documents = []
+        for shard in sorted(output_dir.glob('documents-*.json')):
+            with open(shard, 'r', encoding='utf-8') as f:
+                documents.extend(json.load(f))
+        self.assertEqual(documents, [{'title': 'Test Medication Label'}] * 3)
+
+    def test_background_writer_matches_synchronous(self):
+        outputs = {}
+        for queue_size in (None, 2):
+            output_dir = self.temp_dir / f'ndjson_{queue_size}'
+            with open_sink('ndjson', str(output_dir), max_records=3, writer_queue_size=queue_size) as sink:
+                for record in self.records:
+                    sink.write(f"record_{record['id']}", record)
+            self.assertEqual(len(sink.shards), 3)
+            outputs[queue_size] = {p.name: p.read_bytes() for p in output_dir.iterdir()}
+        self.assertEqual(outputs[2], outputs[None])
+
+        for convert, path in ((convert_csv, 'test/input/sample_data.csv'), (convert_txt, 'test/input/sample_data.txt')):
+            written = []
+            for queue_size in (None, 1):
+                output_dir = self.temp_dir / f'{Path(path).suffix[1:]}_{queue_size}'
+                with io.StringIO() as buf, unittest.mock.patch('sys.stdout', buf):
+                    result = convert(file_path=path, output_path=str(output_dir), writer_queue_size=queue_size)
+                self.assertIn("Conversion completed: 3 files", result["message"])
+                written.append({p.name: p.read_bytes() for p in output_dir.iterdir()})
+            self.assertEqual(written[1], written[0])
+
+    def test_background_writer_backpressure_and_errors(self):
+        release = threading.Event()
+
+        class BlockingSink(OutputSink):
+            def __init__(self):
+                self.written = []
+                self.closed = False
+
+            def write(self, name, record):
+                release.wait()
+                if record['id'] == 3:
+                    raise OSError("disk full")
+                self.written.append(name)
+
+            def close(self):
+                self.closed = True
+
+        inner = BlockingSink()
+        sink = BackgroundSink(inner, queue_size=2)
+        sink.write('record_0', self.records[0])
+        sink.write('record_1', self.records[1])
+        sink.write('record_2', self.records[2])
+        # The writer holds one record and the queue is full
+        self.assertTrue(sink._queue.full())
+        release.set()
+        with self.assertRaises(OSError):
+            for record in self.records[3:]:
+                sink.write(f"record_{record['id']}", record)
+            sink.close()
+        with self.assertRaises(OSError):
+            sink.close()
+        self.assertEqual(inner.written, ['record_0', 'record_1', 'record_2'])
+        self.assertTrue(inner.closed)
+
+    def test_background_writer_failure_keeps_ids_unrecorded(self):
+        csv_path = self.temp_dir / 'items.csv'
+        csv_path.write_text('id,name\n' + ''.join(f'{i},Item {i}\n' for i in range(1, 6)), encoding='utf-8')
+        for backend in ('text', 'sqlite'):
+            with self.subTest(backend=backend):
+                output_dir = self.temp_dir / f'output_{backend}'
+                ids_path = self.temp_dir / f'ids_{backend}.txt'
+                options = dict(file_path=str(csv_path), output_path=str(output_dir), repeated_path=str(ids_path),
+                               repeated_item='id', dedup_backend=backend, writer_queue_size=8)
+                # record_2.json cannot be written
+                (output_dir / 'record_2.json').mkdir(parents=True)
+                with self.assertRaises(Exception):
+                    convert_csv(**options)
+                self.assertFalse(ids_path.exists() and ids_path.read_text().split())
+
+                # The next run converts the records again
+                (output_dir / 'record_2.json').rmdir()
+                result = convert_csv(**options)
+                self.assertIn("Conversion completed: 5 files", result["message"])
+                self.assertEqual(ids_path.read_text().split(), ['1', '2', '3', '4', '5'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+import json
+from src.jsonifyer.serialization import JSONSerializer, get_serializer, orjson
+
+class TestSerialization(unittest.TestCase):
+    def setUp(self):
+        self.record = {
+            'Name': 'João Silva',
+            'Age': 30,
+            'Score': 4.5,
+            'Active': True,
+            'Skills': ['Python', 'SQL'],
+            'Manager': None,
+            'Address': {'City': 'Lisbon'}
+        }
+
+    def test_default_matches_previous_output(self):
+        expected = json.dumps(self.record, indent=4, ensure_ascii=False).encode('utf-8')
+        self.assertEqual(get_serializer().dumps(self.record), expected)
+        self.assertEqual(JSONSerializer(backend='auto').dumps(self.record), expected)
+
+    def test_compact_output(self):
+        data = get_serializer(indent=None, backend='json').dumps(self.record)
+        self.assertNotIn(b'\n', data)
+        self.assertNotIn(b', ', data)
+        self.assertEqual(json.loads(data), self.record)
+
+    @unittest.skipIf(orjson is None, "orjson is not installed")
+    def test_orjson_backend_matches_stdlib(self):
+        for indent in (None, 2):
+            with self.subTest(indent=indent):
+                fast = JSONSerializer(indent=indent, backend='orjson')
+                self.assertTrue(fast.use_orjson)
+                self.assertEqual(fast.dumps(self.record), JSONSerializer(indent=indent, backend='json').dumps(self.record))
+
+        # Values orjson cannot encode fall back to the standard library
+        self.assertEqual(json.loads(get_serializer(indent=None).dumps({'big': 2 ** 70})), {'big': 2 ** 70})
+        with self.assertRaises(ValueError):
+            JSONSerializer(indent=4, backend='orjson')
+
+    def test_invalid_backend(self):
+        with self.assertRaises(ValueError):
+            JSONSerializer(backend='yaml')
+
+if __name__ == '__main__':
+    unittest.main()
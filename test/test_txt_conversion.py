@@ -1,5 +1,8 @@
 import unittest
+import unittest.mock
 import json
+import shutil
+import tempfile
 from pathlib import Path
 from src.jsonifyer.api import convert_txt
 
@@ -78,5 +81,92 @@ class TestTXTConversion(unittest.TestCase):
                 output_path=self.output_dir
             )
 
+    def test_txt_chunked_conversion(self):
+        temp_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, temp_dir, ignore_errors=True)
+        input_file = temp_dir / 'people.txt'
+        with open(self.txt_path, 'r', encoding='utf-8') as f:
+            header, *rows = f.read().splitlines()
+        # Add an empty column and rows that are only filled in some chunks
+        rows = [row + '~' for row in rows] * 4
+        rows[1] = '~' * 5
+        rows[5] = '~~Faro~~~'
+        with open(input_file, 'w', encoding='utf-8') as f:
+            f.write('\n'.join([header + '~Notes'] + rows) + '\n')
+
+        outputs = {}
+        for chunksize in (None, 2, 5):
+            output_dir = temp_dir / f'output_{chunksize}'
+            result = convert_txt(
+                file_path=str(input_file),
+                output_path=str(output_dir),
+                delimiter="~",
+                chunksize=chunksize
+            )
+            self.assertIn("Conversion completed: 11 files", result["message"])
+            outputs[chunksize] = {p.name: p.read_bytes() for p in output_dir.glob('*.json')}
+
+        self.assertEqual(outputs[2], outputs[None])
+        self.assertEqual(outputs[5], outputs[None])
+        with open(temp_dir / 'output_2' / 'record_5.json', 'r', encoding='utf-8') as f:
+            record = f.read()
+        self.assertNotIn('Notes', record)
+        self.assertIn('Faro', record)
+
+    def test_txt_parallel_byte_ranges(self):
+        temp_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, temp_dir, ignore_errors=True)
+        input_file = temp_dir / 'export.txt'
+        with open(input_file, 'w', encoding='utf-8') as f:
+            f.write('Exported by the test\n\nId~Name~Score~Active~Notes\n')
+            for i in range(60):
+                # Columns whose type differs between ranges, a repeated id and an empty row
+                score = 'n/a' if i == 50 else ('' if i < 20 else str(i * 1.5))
+                active = '' if i < 30 else ('True' if i % 2 else 'False')
+                f.write(f"{i % 45}~Name {i}~{score}~{active}~\n" if i != 10 else '~~~~\n')
+
+        outputs = {}
+        for workers in (None, 3):
+            output_dir = temp_dir / f'output_{workers}'
+            with unittest.mock.patch('src.jsonifyer.converter.csv_converter.PARALLEL_RANGE_BYTES', 64):
+                result = convert_txt(
+                    file_path=str(input_file),
+                    repeated_path=str(temp_dir / f'ids_{workers}.txt'),
+                    repeated_item='Id',
+                    output_path=str(output_dir),
+                    skiprows=1,
+                    workers=workers
+                )
+            self.assertIn("Conversion completed: 45 files", result["message"])
+            outputs[workers] = (
+                {p.name: p.read_bytes() for p in output_dir.glob('*.json')},
+                (temp_dir / f'ids_{workers}.txt').read_text(encoding='utf-8')
+            )
+        self.assertEqual(outputs[3], outputs[None])
+
+        with self.assertRaises(ValueError):
+            convert_txt(file_path=str(input_file), output_path=str(temp_dir), workers=2, chunksize=10)
+
+    def test_txt_parallel_multiline_quoted_values(self):
+        temp_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, temp_dir, ignore_errors=True)
+        input_file = temp_dir / 'notes.txt'
+        with open(input_file, 'w', encoding='utf-8') as f:
+            f.write('Id~Note~Score\n')
+            for i in range(40):
+                note = f'"line one {i}\nline~two\n""quoted"""' if i % 3 == 0 else f'plain {i}'
+                f.write(f'{i}~{note}~{i * 2}\n')
+
+        outputs = {}
+        for workers in (None, 3):
+            output_dir = temp_dir / f'output_{workers}'
+            with unittest.mock.patch('src.jsonifyer.converter.csv_converter.PARALLEL_RANGE_BYTES', 64):
+                result = convert_txt(file_path=str(input_file), output_path=str(output_dir), workers=workers)
+            self.assertIn("Conversion completed: 40 files", result["message"])
+            outputs[workers] = {p.name: p.read_bytes() for p in output_dir.glob('*.json')}
+        self.assertEqual(outputs[3], outputs[None])
+        with open(temp_dir / 'output_3' / 'record_1.json', 'r', encoding='utf-8') as f:
+            self.assertEqual(json.load(f)['Note'], 'line one 0\nline~two\n"quoted"')
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,7 +1,12 @@
 import unittest
 import json
+import shutil
+import tempfile
 from pathlib import Path
 from src.jsonifyer.api import convert_xml
+from src.jsonifyer.converter.python_converter import (
+    parse_xml_to_json, get_extraction_plan, iter_xml_records, compile_lxml_xpath
+)
 import sys
 import io
 import unittest.mock
@@ -211,5 +216,210 @@ class TestXMLConversion(unittest.TestCase):
             self.assertEqual(data['code_displayName'], 'TABLET')
             self.assertEqual(data['organization'], 'Test Pharmaceutical Company')
 
+    def test_xml_extraction_plan_reuse(self):
+        field_map = {
+            'id': './/id/@root',
+            'name': './/component/structuredBody/component/section/subject/manufacturedProduct/manufacturedProduct/name',
+            'ingredient_name': './/ingredient/ingredientSubstance/name'
+        }
+        plan = get_extraction_plan(field_map=field_map, namespaces=self.namespaces, root_tag='document')
+        self.assertIs(plan, get_extraction_plan(field_map=dict(field_map), namespaces=self.namespaces, root_tag='document'))
+
+        expected = parse_xml_to_json(self.xml_path, field_map=field_map, namespaces=self.namespaces, root_tag='document')
+        self.assertEqual(parse_xml_to_json(self.xml_path, plan=plan), expected)
+        self.assertEqual(plan.run(self.xml_path), expected)
+        self.assertEqual(expected['name'], 'TestMed')
+
+    def test_xml_parallel_matches_sequential(self):
+        field_map = {
+            'id': './/id/@root',
+            'name': './/component/structuredBody/component/section/subject/manufacturedProduct/manufacturedProduct/name'
+        }
+        temp_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, temp_dir, ignore_errors=True)
+        input_dir = temp_dir / 'input'
+        input_dir.mkdir()
+        with open(self.xml_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        for i, name in enumerate(['TestMed', 'OtherMed', 'TestMed', 'ThirdMed', 'OtherMed', 'TestMed']):
+            with open(input_dir / f'label_{i}.xml', 'w', encoding='utf-8') as f:
+                f.write(content.replace('<name>TestMed</name>', f'<name>{name}</name>'))
+
+        outputs = {}
+        for run, workers in (('sequential', None), ('parallel', 2)):
+            repeated_path = temp_dir / f'{run}_ids.txt'
+            with open(repeated_path, 'w', encoding='utf-8') as f:
+                f.write('ThirdMed\n')
+            output_dir = temp_dir / run
+            with io.StringIO() as buf, unittest.mock.patch('sys.stdout', buf):
+                result = convert_xml(
+                    directory_path=str(input_dir),
+                    repeated_path=str(repeated_path),
+                    repeated_item='name',
+                    output_path=str(output_dir),
+                    namespaces=self.namespaces,
+                    root_tag='document',
+                    field_map=field_map,
+                    workers=workers,
+                    chunksize=1
+                )
+            self.assertIn("Conversion completed: 2 files", result["message"])
+            files = {p.name: p.read_bytes() for p in output_dir.glob('*.json')}
+            outputs[run] = (files, repeated_path.read_text(encoding='utf-8'))
+
+        self.assertEqual(outputs['sequential'], outputs['parallel'])
+        self.assertEqual(sorted(outputs['parallel'][1].split()), ['OtherMed', 'TestMed', 'ThirdMed'])
+
+    def test_xml_record_streaming(self):
+        field_map = {
+            'id': './/id/@root',
+            'name': './/manufacturedProduct/manufacturedProduct/name',
+            'ingredient_name': './/ingredient/ingredientSubstance/name'
+        }
+        temp_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, temp_dir, ignore_errors=True)
+        input_dir = temp_dir / 'input'
+        input_dir.mkdir()
+        with open(self.xml_path, 'r', encoding='utf-8') as f:
+            document = f.read().split('?>', 1)[1].replace(' xmlns="urn:hl7-org:v3"', '')
+        names = ['TestMed', 'OtherMed', 'ThirdMed']
+        with open(input_dir / 'bulk.xml', 'w', encoding='utf-8') as f:
+            f.write('<?xml version="1.0" encoding="UTF-8"?>\n<documents xmlns="urn:hl7-org:v3">')
+            for name in names:
+                f.write(document.replace('<name>TestMed</name>', f'<name>{name}</name>'))
+            f.write('</documents>')
+
+        expected = parse_xml_to_json(self.xml_path, field_map=field_map)
+        records = list(iter_xml_records(str(input_dir / 'bulk.xml'), 'document', field_map=field_map))
+        self.assertEqual([record['name'] for record in records], names)
+        self.assertEqual(records[0], expected)
+
+        output_dir = temp_dir / 'output'
+        with io.StringIO() as buf, unittest.mock.patch('sys.stdout', buf):
+            result = convert_xml(
+                directory_path=str(input_dir),
+                output_path=str(output_dir),
+                field_map=field_map,
+                record_tag='document'
+            )
+        self.assertIn("Conversion completed: 3 files", result["message"])
+        for i, name in enumerate(names, start=1):
+            with open(output_dir / f'bulk_{i}.json', 'r', encoding='utf-8') as f:
+                self.assertEqual(json.load(f)['name'], name)
+
+    def test_xml_extra_fields_and_pairs(self):
+        temp_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, temp_dir, ignore_errors=True)
+        xml_file = temp_dir / 'sections.xml'
+        with open(xml_file, 'w', encoding='utf-8') as f:
+            f.write(
+                '<document><id root="abc"/><component><structuredBody>'
+                '<component><section><code code="34067-9"/><text>Indicated for <b>pain</b>.</text></section></component>'
+                '<component><section><code code="34084-4"/><text> </text><excerpt><p>First</p><p>second</p></excerpt></section></component>'
+                '<component><section><code code="34084-4"/><text>Ignored</text></section></component>'
+                '<component><section><subject><manufacturedProduct>'
+                '<ingredient><ingredientSubstance><name>A</name><code code="c1"/></ingredientSubstance></ingredient>'
+                '<ingredient><ingredientSubstance><name>B</name><code code="c2"/></ingredientSubstance></ingredient>'
+                '<ingredient><ingredientSubstance><name>A</name><code code="c3"/></ingredientSubstance></ingredient>'
+                '</manufacturedProduct></subject></section></component>'
+                '</structuredBody></component></document>'
+            )
+
+        result = parse_xml_to_json(
+            str(xml_file),
+            field_map={'id': './/id/@root', 'missing': './/nothing'},
+            extra_fields={'indications': '34067-9', 'warnings': '34084-4', 'other': '0000'},
+            pairs={
+                'ingredients.name': ['.//ingredientSubstance', 'name'],
+                'ingredients.code': ['.//ingredientSubstance', 'code/@code']
+            }
+        )
+        self.assertEqual(list(result), ['id', 'indications', 'warnings', 'ingredients', 'missing'])
+        self.assertEqual(result['indications'], 'Indicated for pain.')
+        self.assertEqual(result['warnings'], 'First second')
+        self.assertEqual(result['ingredients'], [{'name': 'A', 'code': 'c1'}, {'name': 'B', 'code': 'c2'}])
+
+    def test_xml_lxml_backend(self):
+        field_map = {
+            'id': './/id/@root',
+            'code_code': './/code/@code',
+            'organization': './/author/assignedEntity/representedOrganization/name',
+            'name': './/component/structuredBody/component/section/subject/manufacturedProduct/manufacturedProduct/name',
+            'ingredient_name': './/component/structuredBody/component/section/subject/manufacturedProduct/manufacturedProduct/ingredient/ingredientSubstance/name',
+            'ingredients.name': './/ingredientSubstance/name',
+            'missing': './/nothing'
+        }
+        for spec in ({'field_map': field_map}, {'fields': ['id', 'title', 'author', './/code/@code']}, {}):
+            with self.subTest(spec=list(spec)):
+                expected = parse_xml_to_json(self.xml_path, root_tag='document', **spec)
+                result = parse_xml_to_json(self.xml_path, root_tag='document', backend='lxml', **spec)
+                self.assertEqual(result, expected)
+
+        # Same-name elements nested in each other, where XPath and ElementPath
+        # order the matches of a step after a descendant step differently
+        temp_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, temp_dir, ignore_errors=True)
+        xml_path = temp_dir / 'nested.xml'
+        xml_path.write_text('<doc><a><a><b>inner</b></a><b>outer</b><c><a><b>last</b></a></c></a></doc>', encoding='utf-8')
+        for spec in ({'field_map': {'first': './/a/b'}}, {'field_map': {'all': ['.//a/b', './/a//b']}},
+                     {'fields': ['.//a/b']}, {'field_map': {'b': './/a/b', 'c': './/a/c/a/b', 'ab': './/a//b'}}):
+            with self.subTest(spec=spec):
+                expected = parse_xml_to_json(str(xml_path), **spec)
+                self.assertEqual(parse_xml_to_json(str(xml_path), backend='lxml', **spec), expected)
+        self.assertEqual(parse_xml_to_json(str(xml_path), fields=['.//a/b']), {'b': 'outer'})
+        # Such paths stay compiled, and only documents like this one fall back
+        self.assertNotIsInstance(compile_lxml_xpath('.//a/b', None), str)
+
+        with self.assertRaises(ValueError):
+            parse_xml_to_json(self.xml_path, field_map=field_map, backend='sax')
+        # lxml would find the parent of the root tag element
+        self.assertEqual(parse_xml_to_json(self.xml_path, root_tag='section', fields=['./..']), {})
+        with self.assertRaises(ValueError):
+            parse_xml_to_json(self.xml_path, root_tag='section', fields=['./..'], backend='lxml')
+
+    def test_xml_shared_prefixes(self):
+        # Two products, the second with a nested product of its own, so the
+        # shared prefix matches several elements at different depths
+        temp_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, temp_dir, ignore_errors=True)
+        with open(self.xml_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        start = content.index('<manufacturedProduct>')
+        end = content.rindex('</manufacturedProduct>') + len('</manufacturedProduct>')
+        product = content[start:end]
+        other = product.replace('TestMed', 'OtherMed').replace('LACTOSE', 'SUCROSE')
+        nested = other.replace('<ingredient classCode="IACT">', product + '<ingredient classCode="IACT">', 1)
+        xml_path = temp_dir / 'products.xml'
+        xml_path.write_text(content[:start] + product + nested + content[end:], encoding='utf-8')
+
+        prefix = './/manufacturedProduct/manufacturedProduct/'
+        field_map = {
+            'name': prefix + 'name',
+            'code': prefix + 'code/@code',
+            'form': prefix + 'formCode/@displayName',
+            'ingredients.name': prefix + 'ingredient/ingredientSubstance/name',
+            'classes': prefix + 'ingredient/@classCode',
+            'units': [prefix + 'ingredient/quantity/numerator/@unit', prefix + 'ingredient//name'],
+            'all_names': './/manufacturedProduct//name'
+        }
+        results = {}
+        for backend in ('etree', 'lxml'):
+            with self.subTest(backend=backend):
+                plan = get_extraction_plan(field_map=field_map, root_tag='document', backend=backend)
+                self.assertTrue(plan._tries[True].prefixes)
+                # Each path on its own shares no prefix and is evaluated from the root
+                expected = {}
+                for field, xpath in field_map.items():
+                    expected.update(parse_xml_to_json(str(xml_path), field_map={field: xpath}, root_tag='document', backend=backend))
+                result = parse_xml_to_json(str(xml_path), plan=plan)
+                self.assertEqual(result, expected)
+                self.assertEqual(list(result), list(expected))
+                results[backend] = result
+        self.assertEqual(results['lxml'], results['etree'])
+        self.assertEqual(
+            [item['name'] for item in result['ingredients']],
+            ['TESTAMIN', 'LACTOSE', 'STARCH', 'SUCROSE']
+        )
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,224 @@
+import unittest
+import json
+import os
+import shutil
+import tempfile
+import unittest.mock
+from pathlib import Path
+from lxml import etree
+from src.jsonifyer.api import convert_xml
+from src.jsonifyer.converter.xslt_converter import (
+    apply_xslt_to_xml, apply_xslt_raw, get_transform, clear_transform_cache, process_folder_with_xslt,
+    parse_xml_file, FDA_STYLESHEET_PI, logger as xslt_logger
+)
+
+class TestXSLTConversion(unittest.TestCase):
+    def setUp(self):
+        self.xml_path = 'test/input/sample_data.xml'
+        self.xslt_path = 'test/input/sample_transform.xsl'
+        self.temp_dir = tempfile.mkdtemp()
+        self.expected_data = {
+            'id': 'test-123-456-789',
+            'title': 'Test Medication Label',
+            'name': 'TestMed',
+            'ingredients': [
+                {'name': 'TESTAMIN'},
+                {'name': 'LACTOSE'},
+                {'name': 'STARCH'}
+            ]
+        }
+        clear_transform_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+        clear_transform_cache()
+
+    def test_xslt_conversion(self):
+        result = apply_xslt_to_xml(self.xml_path, None, self.xslt_path)
+        self.assertEqual(result, self.expected_data)
+
+    def test_xslt_transform_cache(self):
+        transform = get_transform(self.xslt_path)
+        self.assertIs(get_transform(self.xslt_path), transform)
+
+        # A modified stylesheet is compiled again
+        xslt_copy = os.path.join(self.temp_dir, 'copy.xsl')
+        shutil.copy(self.xslt_path, xslt_copy)
+        first = get_transform(xslt_copy)
+        with open(xslt_copy, 'a', encoding='utf-8') as f:
+            f.write('\n')
+        self.assertIsNot(get_transform(xslt_copy), first)
+
+    def test_xslt_precompiled_transform(self):
+        transform = etree.XSLT(etree.parse(self.xslt_path))
+        self.assertIs(get_transform(transform), transform)
+        self.assertEqual(apply_xslt_to_xml(self.xml_path, None, transform), self.expected_data)
+
+    def test_xslt_convert_xml_directory(self):
+        input_dir = Path(self.temp_dir) / 'input'
+        output_dir = Path(self.temp_dir) / 'output'
+        input_dir.mkdir()
+        for name in ('first.xml', 'second.xml'):
+            shutil.copy(self.xml_path, input_dir / name)
+
+        result = convert_xml(
+            directory_path=str(input_dir),
+            output_path=str(output_dir),
+            converter='xslt',
+            xslt_path=self.xslt_path
+        )
+        self.assertIn("Conversion completed: 2 files", result["message"])
+        for name in ('first.json', 'second.json'):
+            with open(output_dir / name, 'r', encoding='utf-8') as f:
+                self.assertEqual(json.load(f), self.expected_data)
+
+    def test_parse_xml_file(self):
+        with open(self.xml_path, 'rb') as f:
+            declaration, body = f.read().split(b'\n', 1)
+        label = os.path.join(self.temp_dir, 'label.xml')
+        with open(label, 'wb') as f:
+            f.write(declaration + b'\n' + FDA_STYLESHEET_PI + b'\n<?other keep?>\n' + body)
+        broken = os.path.join(self.temp_dir, 'broken.xml')
+        with open(broken, 'wb') as f:
+            f.write(body[:len(body) // 2])
+
+        # Only the FDA stylesheet reference is dropped from the prolog
+        root = parse_xml_file(label)
+        self.assertEqual([str(pi) for pi in root.itersiblings(preceding=True)], ['<?other keep?>'])
+        with unittest.mock.patch('src.jsonifyer.converter.xslt_converter.PARSE_BLOCK_SIZE', 64):
+            self.assertEqual(etree.tostring(parse_xml_file(label)), etree.tostring(root))
+            # A failed parse leaves the thread's parser ready for the next file
+            with self.assertRaises(etree.XMLSyntaxError):
+                parse_xml_file(broken)
+            self.assertEqual(etree.tostring(parse_xml_file(label)), etree.tostring(root))
+        self.assertEqual(apply_xslt_to_xml(label, None, self.xslt_path), self.expected_data)
+
+    def test_xslt_raw_output(self):
+        raw = apply_xslt_raw(self.xml_path, self.xslt_path, validate=True)
+        self.assertEqual(raw, str(get_transform(self.xslt_path)(etree.parse(self.xml_path))).encode('utf-8'))
+        self.assertEqual(json.loads(raw), self.expected_data)
+
+        # The cheap validation only rejects output that is not an object or array
+        text_xslt = os.path.join(self.temp_dir, 'text.xsl')
+        with open(self.xslt_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        with open(text_xslt, 'w', encoding='utf-8') as f:
+            f.write(content.replace('<xsl:text>{"id": "</xsl:text>', '<xsl:text>"id": "</xsl:text>'))
+        self.assertIsNotNone(apply_xslt_raw(self.xml_path, text_xslt))
+        self.assertIsNone(apply_xslt_raw(self.xml_path, text_xslt, validate=True))
+        self.assertIsNone(apply_xslt_raw('missing.xml', self.xslt_path))
+
+    def test_xslt_passthrough(self):
+        input_dir = Path(self.temp_dir) / 'input'
+        input_dir.mkdir()
+        with open(self.xml_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        for name in ('TestMed', 'OtherMed', 'TestMed2'):
+            with open(input_dir / f'{name}.xml', 'w', encoding='utf-8') as f:
+                f.write(content.replace('<name>TestMed</name>', f"<name>{name.rstrip('2')}</name>"))
+        raw = apply_xslt_raw(str(input_dir / 'TestMed.xml'), self.xslt_path)
+
+        options = dict(directory_path=str(input_dir), converter='xslt', xslt_path=self.xslt_path, passthrough=True)
+        output_dir = Path(self.temp_dir) / 'files'
+        convert_xml(output_path=str(output_dir), **options)
+        # The stylesheet output is written as it is, not re-indented
+        self.assertEqual((output_dir / 'TestMed.json').read_bytes(), raw)
+
+        # Records are parsed for dedup only, and stay one per line in NDJSON
+        output_dir = Path(self.temp_dir) / 'ndjson'
+        result = convert_xml(
+            output_path=str(output_dir), output_format='ndjson', workers=2,
+            repeated_path=os.path.join(self.temp_dir, 'ids.txt'), repeated_item='name', **options
+        )
+        self.assertEqual((result['stats'].written, result['stats'].duplicates), (2, 1))
+        with open(output_dir / 'documents-00000.ndjson', 'r', encoding='utf-8') as f:
+            names = sorted(json.loads(line)['name'] for line in f)
+        self.assertEqual(names, ['OtherMed', 'TestMed'])
+
+        with self.assertRaises(ValueError):
+            convert_xml(directory_path=str(input_dir), passthrough=True)
+
+    def test_process_folder_passthrough(self):
+        output_dir = os.path.join(self.temp_dir, 'output')
+        log_file = os.path.join(self.temp_dir, 'missing.log')
+        unconverted_log = os.path.join(self.temp_dir, 'unconverted.log')
+        process_folder_with_xslt('test/input', output_dir, log_file, unconverted_log, self.xslt_path, passthrough=True)
+        with open(os.path.join(output_dir, 'sample_data.json'), 'rb') as f:
+            self.assertEqual(f.read(), apply_xslt_raw(self.xml_path, self.xslt_path))
+        with open(log_file, 'r', encoding='utf-8') as f:
+            self.assertIn("Total JSON files converted: 1", f.read())
+
+    def test_xslt_threads(self):
+        input_dir = Path(self.temp_dir) / 'input'
+        input_dir.mkdir()
+        with open(self.xml_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        for i in range(12):
+            with open(input_dir / f'label_{i:02d}.xml', 'w', encoding='utf-8') as f:
+                f.write(content.replace('<name>TestMed</name>', f'<name>Med {i % 5}</name>'))
+
+        outputs = []
+        for threads in (None, 4):
+            output_dir = Path(self.temp_dir) / f'output_{threads}'
+            result = convert_xml(
+                directory_path=str(input_dir), output_path=str(output_dir), converter='xslt',
+                xslt_path=self.xslt_path, threads=threads, output_format='ndjson',
+                repeated_path=os.path.join(self.temp_dir, f'ids_{threads}.txt'), repeated_item='name'
+            )
+            stats = result['stats']
+            self.assertEqual((stats.seen, stats.failed, stats.duplicates, stats.written), (12, 0, 7, 5))
+            outputs.append((output_dir / 'documents-00000.ndjson').read_bytes())
+        self.assertEqual(outputs[0], outputs[1])
+
+        with self.assertRaises(ValueError):
+            convert_xml(directory_path=str(input_dir), threads=2)
+
+    def test_process_folder_threads(self):
+        input_dir = os.path.join(self.temp_dir, 'input')
+        os.mkdir(input_dir)
+        for i in range(8):
+            shutil.copy(self.xml_path, os.path.join(input_dir, f'label_{i}.xml'))
+        logs = []
+        for threads in (None, 3):
+            run_dir = os.path.join(self.temp_dir, f'run_{threads}')
+            output_dir = os.path.join(run_dir, 'output')
+            log_file = os.path.join(run_dir, 'missing.log')
+            unconverted_log = os.path.join(run_dir, 'unconverted.log')
+            # A directory in place of an output file makes that conversion fail
+            os.makedirs(os.path.join(output_dir, 'label_3.json'))
+            with self.assertLogs(xslt_logger, level='INFO') as captured:
+                process_folder_with_xslt(input_dir, output_dir, log_file, unconverted_log, self.xslt_path, threads=threads)
+            printed = [line.replace(run_dir, 'RUN') for line in captured.output]
+            with open(log_file, 'r', encoding='utf-8') as f, open(unconverted_log, 'r', encoding='utf-8') as g:
+                logs.append((printed, f.read(), g.read()))
+        self.assertEqual(logs[0], logs[1])
+        self.assertIn("Total JSON files converted: 7", logs[0][1])
+        self.assertIn("  - label_3.xml", logs[0][2])
+
+    def test_process_folder_missing_stylesheet(self):
+        # A stylesheet that cannot be compiled fails each file, not the run
+        missing = os.path.join(self.temp_dir, 'missing.xsl')
+        for threads in (None, 2):
+            run_dir = os.path.join(self.temp_dir, f'run_{threads}')
+            output_dir = os.path.join(run_dir, 'output')
+            log_file = os.path.join(run_dir, 'missing.log')
+            unconverted_log = os.path.join(run_dir, 'unconverted.log')
+            with self.assertLogs(xslt_logger, level='INFO'):
+                process_folder_with_xslt('test/input', output_dir, log_file, unconverted_log, missing, threads=threads)
+            with open(os.path.join(output_dir, 'sample_data.json'), 'r', encoding='utf-8') as f:
+                self.assertEqual(json.load(f), {})
+
+    def test_convert_xml_missing_stylesheet(self):
+        missing = os.path.join(self.temp_dir, 'missing.xsl')
+        for threads in (None, 2):
+            output_dir = Path(self.temp_dir) / f'output_{threads}'
+            result = convert_xml(
+                directory_path='test/input', output_path=str(output_dir), converter='xslt',
+                xslt_path=missing, threads=threads
+            )
+            self.assertIn("Conversion completed", result["message"])
+            with open(output_dir / 'sample_data.json', 'r', encoding='utf-8') as f:
+                self.assertEqual(json.load(f), {})
+
+if __name__ == '__main__':
+    unittest.main()